@@ -0,0 +1,46 @@
+import sys
+import time
+
+from benchmarks.fake_webdriver import (
+    FakeChat, FakeWebDriver, generated_pane_html
+)
+from wspdriver.driver import WhatsappDriver
+
+
+def run(count, batch, latency):
+
+    chat = FakeChat('Chat', '1', generated_pane_html('Chat', count))
+    web_driver = FakeWebDriver([chat], latency=latency)
+    driver = WhatsappDriver(web_driver)
+    web_driver.open_chat(chat)
+    web_driver.reset_counters()
+
+    start = time.perf_counter()
+    messages = list(driver.get_current_chat_messages(batch=batch))
+    for message in messages:
+        message.to_dict()  # Messages are lazy; extract every field
+    elapsed = time.perf_counter() - start
+
+    return messages, web_driver.round_trips, elapsed
+
+
+def main(latency=0.0):
+
+    print('{:>8} {:>8} {:>12} {:>14} {:>10}'.format(
+        'messages', 'mode', 'round-trips', 'per message', 'seconds'
+    ))
+    for count in (10, 100, 300):
+        for batch in (False, True):
+            messages, round_trips, elapsed = run(count, batch, latency)
+            assert len(messages) == count
+            print('{:>8} {:>8} {:>12} {:>14.2f} {:>10.4f}'.format(
+                count,
+                'batch' if batch else 'element',
+                round_trips,
+                round_trips / count,
+                elapsed
+            ))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.0)
@@ -0,0 +1,32 @@
+import time
+
+from benchmarks.bench_unread_sweep import backlog
+
+
+# Chats open instantly in the fake, so this measures what batching saves:
+# the WebDriver round-trips around each chat. A real browser adds the same
+# render time per chat to every row.
+
+
+def main(chat_count=30, history=100, unread=10, latency=0.005,
+         batches=(None, 2, 4, 8, 14)):
+
+    print('{:>8} {:>10} {:>12} {:>10} {:>12}'.format(
+        'batch', 'messages', 'round-trips', 'seconds', 'messages/s'
+    ))
+    for batch in batches:
+        web_driver, driver = backlog(chat_count, history, unread, latency)
+        start = time.perf_counter()
+        sweep = driver.sweep_unread(batch=batch)
+        messages = sum(1 for _ in sweep)
+        assert messages == sweep.unread
+        # Wall time of the driver plus the simulated WebDriver latency
+        seconds = time.perf_counter() - start + web_driver.simulated_seconds
+        print('{:>8} {:>10} {:>12} {:>10.2f} {:>12.1f}'.format(
+            batch or 1, messages, web_driver.round_trips, seconds,
+            messages / seconds
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import time
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_pane_html
+from wspdriver.chat import WhatsAppChat
+from wspdriver.driver import WhatsappDriver
+
+
+def scan_by_name(driver, name):
+
+    # What finding a chat cost before the index: one round-trip per title
+    elements = driver.web_driver.find_elements_by_css_selector(
+        driver.selectors.CHAT_SELECTOR
+    )
+    for element in elements:
+        chat = WhatsAppChat(element, driver)
+        if chat.name == name:
+            return chat
+    return None
+
+
+def main(chat_count=200, lookups=20):
+
+    pane = generated_pane_html('Chat', 5)
+    chats = [
+        FakeChat('Chat {}'.format(i), str(56900000000 + i), pane)
+        for i in range(chat_count)
+    ]
+    web_driver = FakeWebDriver(chats, sleep=False)
+    driver = WhatsappDriver(web_driver)
+    driver.is_logged_in()
+    names = [chats[i * chat_count // lookups].title for i in range(lookups)]
+
+    print('{:>6} {:>20} {:>10}'.format('mode', 'round-trips/lookup', 'ms'))
+    for mode, find in (
+            ('scan', lambda name: scan_by_name(driver, name)),
+            ('index', driver.find_chat)
+    ):
+        web_driver.reset_counters()
+        start = time.perf_counter()
+        for name in names:
+            assert find(name).name == name
+        elapsed = time.perf_counter() - start
+        print('{:>6} {:>20.1f} {:>10.1f}'.format(
+            mode,
+            web_driver.round_trips / lookups,
+            elapsed / lookups * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import json
+import os
+import timeit
+
+from bs4 import BeautifulSoup
+
+from wspdriver.message import WSPTextMessage
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'bubbles.json')
+
+
+def reference_text(html):
+
+    # The BeautifulSoup implementation this replaced
+    dom = BeautifulSoup(html, 'html.parser')
+    for img in dom.find_all('img'):
+        img.replace_with(img['data-plain-text'])
+    return dom.text
+
+
+def read_bubbles():
+    with open(FIXTURES, encoding='utf-8') as fixtures:
+        return json.load(fixtures)
+
+
+def main(repeat=200):
+
+    # tests/test_emoji_text.py checks both give the same text
+    bubbles = read_bubbles()
+    transform = WSPTextMessage.transform_emojis_to_text
+    reference = timeit.timeit(
+        lambda: [reference_text(html) for html in bubbles], number=repeat
+    )
+    fast = timeit.timeit(
+        lambda: [transform(html) for html in bubbles], number=repeat
+    )
+    calls = repeat * len(bubbles)
+    print('beautifulsoup: {:.1f} us/bubble'.format(reference / calls * 1e6))
+    print('regex:         {:.1f} us/bubble'.format(fast / calls * 1e6))
+    print('speedup:       {:.1f}x'.format(reference / fast))
+
+
+if __name__ == '__main__':
+    main()
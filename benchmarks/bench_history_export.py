@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_messages_html, pane_html
+from wspdriver.driver import WhatsappDriver
+
+
+class Interrupted(Exception):
+    pass
+
+
+def long_chat(title, count, rendered=50):
+
+    # The app renders the newest messages; the rest load on scrolling up
+    messages = generated_messages_html(title, count)
+    return FakeChat(
+        title,
+        '56900000000',
+        pane_html(title, messages[-rendered:]),
+        history=messages[:-rendered]
+    )
+
+
+def open_chat(count):
+
+    web_driver = FakeWebDriver([long_chat('History', count)], sleep=False)
+    driver = WhatsappDriver(web_driver)
+    driver.is_logged_in()
+    driver.find_chat('History').select()
+    return web_driver, driver
+
+
+def exported_ids(path):
+    with open(path, encoding='utf-8') as exported:
+        return [json.loads(line)['id'] for line in exported]
+
+
+def interrupt_after(pages):
+
+    def progress(export):
+        if export.pages == pages:
+            raise Interrupted()
+    return progress
+
+
+def main(count=1000):
+
+    directory = tempfile.mkdtemp()
+    full_path = os.path.join(directory, 'full.jsonl')
+    resumed_path = os.path.join(directory, 'resumed.jsonl')
+
+    web_driver, driver = open_chat(count)
+    web_driver.reset_counters()
+    tracemalloc.start()
+    start = time.perf_counter()
+    summary = driver.export_history(full_path, page_timeout=0.05)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ids = exported_ids(full_path)
+    assert summary['messages'] == len(ids) == len(set(ids)) == count
+
+    print('{} messages in {} pages, {:.2f}s ({:.0f}/s), {} round-trips, '
+          'peak {:.1f} MB traced'.format(
+              summary['messages'], summary['pages'], elapsed, count / elapsed,
+              web_driver.round_trips, peak / 2 ** 20
+          ))
+
+    # An export cut short, then resumed from the last line it wrote
+    web_driver, driver = open_chat(count)
+    try:
+        driver.export_history(
+            resumed_path,
+            page_timeout=0.05,
+            progress=interrupt_after(10)
+        )
+    except Interrupted:
+        pass
+    written = len(exported_ids(resumed_path))
+    web_driver, driver = open_chat(count)
+    summary = driver.export_history(resumed_path, resume=True,
+                                    page_timeout=0.05)
+    assert exported_ids(resumed_path) == ids
+    print('resumed after {} messages: skipped {}, wrote {}'.format(
+        written, summary['skipped'], summary['messages']
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import time
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_pane_html
+from wspdriver.driver import WhatsappDriver
+from wspdriver.instrumentation import Collector
+
+
+def run(hooks, count=300, repeat=5):
+
+    elapsed = 0.0
+    for _ in range(repeat):
+        chat = FakeChat('Chat', '1', generated_pane_html('Chat', count))
+        web_driver = FakeWebDriver([chat], sleep=False)
+        driver = WhatsappDriver(web_driver, hooks=hooks)
+        web_driver.open_chat(chat)
+
+        if hooks is None:
+            # Disabled drivers keep the plain methods
+            assert 'execute' not in vars(web_driver)
+            assert 'get_current_chat_messages' not in vars(driver)
+
+        start = time.perf_counter()
+        for message in driver.get_current_chat_messages():
+            message.to_dict()
+        elapsed += time.perf_counter() - start
+    return elapsed / repeat
+
+
+def main():
+
+    disabled = run(None)
+    collector = Collector()
+    enabled = run(collector)
+    # Message classes stay wrapped once any driver enabled hooks
+    after = run(None)
+
+    print('disabled:               {:.2f} ms'.format(disabled * 1000))
+    print('enabled:                {:.2f} ms ({:+.1%})'.format(
+        enabled * 1000, enabled / disabled - 1
+    ))
+    print('disabled after enabled: {:.2f} ms ({:+.1%})'.format(
+        after * 1000, after / disabled - 1
+    ))
+    print('{} series collected'.format(len(collector.summary())))
+
+
+if __name__ == '__main__':
+    main()
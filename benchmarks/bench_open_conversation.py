@@ -0,0 +1,50 @@
+import sys
+import time
+
+from benchmarks.fake_webdriver import (
+    FakeChat, FakeWebDriver, generated_pane_html
+)
+from wspdriver.driver import WhatsappDriver
+
+
+def run(direct_open, sends, recipients, latency):
+
+    chats = [
+        FakeChat(
+            'Contact {}'.format(i),
+            str(56900000000 + i),
+            generated_pane_html('Contact {}'.format(i), 5)
+        )
+        for i in range(recipients)
+    ]
+    web_driver = FakeWebDriver(chats, latency=latency)
+    driver = WhatsappDriver(web_driver, direct_open=direct_open)
+    web_driver.reset_counters()
+
+    start = time.perf_counter()
+    for i in range(sends):
+        driver.send_message(
+            chats[i % recipients].phone, 'Message {}'.format(i)
+        )
+    elapsed = time.perf_counter() - start
+
+    return web_driver.round_trips, elapsed
+
+
+def main(latency=0.005):
+
+    sends, recipients = 50, 5
+    print('{:>8} {:>16} {:>18}'.format(
+        'mode', 'round-trips/send', 'ms/send'
+    ))
+    for direct_open in (False, True):
+        round_trips, elapsed = run(direct_open, sends, recipients, latency)
+        print('{:>8} {:>16.1f} {:>18.1f}'.format(
+            'direct' if direct_open else 'search',
+            round_trips / sends,
+            elapsed / sends * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.005)
@@ -0,0 +1,67 @@
+import pickle
+import time
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_pane_html
+from wspdriver.driver import WhatsappDriver
+from wspdriver.record import decode_records, encode_records
+
+
+def timed(function, repeat):
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(count=1000, repeat=20):
+
+    web_driver = FakeWebDriver(
+        [FakeChat('Chat', '56900000000', generated_pane_html('Chat', count))],
+        sleep=False
+    )
+    driver = WhatsappDriver(web_driver)
+    driver.is_logged_in()
+    driver.find_chat('Chat').select()
+    messages = list(driver.get_current_chat_messages())
+    for message in messages:
+        message.to_dict()  # Parse every field up front
+    try:
+        pickle.dumps(messages[0])
+    except Exception as e:
+        print('pickling a message: {}'.format(type(e).__name__))
+
+    records = [message.to_record('Chat') for message in messages]
+    assert len(set(record.id for record in records)) == len(records)
+    dicts = [record.to_dict() for record in records]
+    encoded = encode_records(records)
+    assert list(decode_records(encoded)) == records
+
+    print('{:>24} {:>12} {:>10}'.format('', 'us/message', 'bytes'))
+    for name, function, size in (
+            ('md5 id', lambda: [
+                type(message).id.function(message) for message in messages
+            ], None),
+            ('to_record', lambda: [
+                message.to_record('Chat').id for message in messages
+            ], None),
+            ('pickle to_dict', lambda: pickle.dumps(dicts, -1),
+             len(pickle.dumps(dicts, -1))),
+            ('pickle records', lambda: pickle.dumps(records, -1),
+             len(pickle.dumps(records, -1))),
+            ('encode_records', lambda: encode_records(records),
+             len(encoded)),
+            ('decode_records', lambda: list(decode_records(encoded)),
+             None),
+    ):
+        seconds, _ = timed(function, repeat)
+        print('{:>24} {:>12.2f} {:>10}'.format(
+            name,
+            seconds / count * 1e6,
+            '' if size is None else '{:.0f}'.format(size / count)
+        ))
+
+
+if __name__ == '__main__':
+    main()
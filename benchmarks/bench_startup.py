@@ -0,0 +1,52 @@
+import time
+
+from benchmarks.fake_webdriver import FakeWebDriver
+from wspdriver.driver import WhatsappDriver
+
+
+# Simulated costs of a cold start: launching Chrome and chromedriver, then
+# loading and booting WhatsApp Web
+CHROME_LAUNCH = 1.5
+LATENCY = {'get': 6.0, 'default': 0.005}
+
+
+def run(web_driver, reuse_page, launch):
+
+    web_driver.reset_counters()
+    start = time.perf_counter()
+    driver = WhatsappDriver(web_driver, reuse_page=reuse_page)
+    ready = web_driver.simulated_seconds + launch
+    ready_round_trips = web_driver.round_trips
+
+    # Time to the first message handled, paying for whatever was deferred
+    next(iter(driver.get_unread_messages()))
+    first = web_driver.simulated_seconds + launch
+    elapsed = time.perf_counter() - start
+    return ready_round_trips, ready, first, elapsed
+
+
+def main():
+
+    print('{:>8} {:>12} {:>10} {:>15} {:>10}'.format(
+        'mode', 'round-trips', 'ready s', 'first message s', 'wall ms'
+    ))
+
+    # The same fake browser stands in for the Chrome left running by the
+    # cold start, with WhatsApp Web still loaded
+    web_driver = FakeWebDriver(latency=LATENCY, sleep=False)
+    cold = run(web_driver, False, CHROME_LAUNCH)
+    for chat in web_driver.chats:
+        chat.unread = 1
+    web_driver.load_app()
+    warm = run(web_driver, True, 0.0)
+
+    for mode, (round_trips, ready, first, elapsed) in (
+            ('cold', cold), ('attach', warm)
+    ):
+        print('{:>8} {:>12} {:>10.2f} {:>15.2f} {:>10.1f}'.format(
+            mode, round_trips, ready, first, elapsed * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import time
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_pane_html
+from wspdriver.driver import WhatsappDriver
+
+
+def backlog(chat_count, history, unread, latency):
+
+    # Chats with a long history and an unread tail, as after downtime
+    chats = [
+        FakeChat(
+            'Chat {}'.format(i),
+            str(56900000000 + i),
+            generated_pane_html('Chat {}'.format(i), history),
+            unread=unread + i % 5
+        )
+        for i in range(chat_count)
+    ]
+    web_driver = FakeWebDriver(chats, latency=latency, sleep=False)
+    driver = WhatsappDriver(web_driver)
+    driver.is_logged_in()
+    web_driver.reset_counters()
+    return web_driver, driver
+
+
+def drain_one_by_one(driver):
+
+    # The loop get_unread_chats used to be: one list query per chat, and
+    # every rendered message of it
+    messages = 0
+    chat = driver.get_unread_chat()
+    while chat:
+        messages += sum(1 for _ in chat.get_messages())
+        chat = driver.get_unread_chat()
+    return messages
+
+
+def drain_sweep(driver):
+
+    return sum(1 for _ in driver.sweep_unread())
+
+
+def main(chat_count=20, history=100, unread=10, latency=0.005):
+
+    # Rate of the backlog cleared, however much else was extracted
+    print('{:>8} {:>10} {:>10} {:>12} {:>10} {:>10}'.format(
+        'mode', 'unread', 'extracted', 'round-trips', 'seconds', 'unread/s'
+    ))
+    for mode, drain in (('loop', drain_one_by_one), ('sweep', drain_sweep)):
+        web_driver, driver = backlog(chat_count, history, unread, latency)
+        pending = sum(chat.unread for chat in web_driver.chats)
+        start = time.perf_counter()
+        messages = drain(driver)
+        # Wall time of the driver plus the simulated WebDriver latency
+        seconds = time.perf_counter() - start + web_driver.simulated_seconds
+        print('{:>8} {:>10} {:>10} {:>12} {:>10.2f} {:>10.1f}'.format(
+            mode, pending, messages, web_driver.round_trips, seconds,
+            pending / seconds
+        ))
+
+
+if __name__ == '__main__':
+    main()
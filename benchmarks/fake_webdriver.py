@@ -0,0 +1,832 @@
+import base64
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from bs4 import BeautifulSoup
+from PIL import Image
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+from wspdriver.chat_index import ChatIndex
+from wspdriver.driver import WhatsappDriver
+from wspdriver.export import HistoryExport
+from wspdriver.lean import NO_ANIMATIONS_SCRIPT
+from wspdriver.message import WhatsappMessage
+from wspdriver.selectors import DEFAULT_PROFILE
+from wspdriver.session import SessionState, LOADING, LOGGED_IN, LOGGED_OUT
+from wspdriver.sweep import BatchedSweep
+from wspdriver.wait import AnimationsFinished, ChatHeaderMatches, \
+    ElementCountAbove, ScrollSettled
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES, *path), encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+# The recorded profile screen is addressed by XPath, which BeautifulSoup
+# can't evaluate; these CSS selectors find the same nodes in the fixture.
+XPATHS = {
+    DEFAULT_PROFILE.USER_NAME_XPATH: '.drawer div.selectable-text',
+    DEFAULT_PROFILE.USER_AVATAR_XPATH: '.drawer div[style="width: 200px; '
+                                       'height: 200px; top: 0px; left: 0px; '
+                                       'position: absolute;"] > img',
+    DEFAULT_PROFILE.USER_VIEW_PICTURE_BUTTON_XPATH:
+        '.drawer li:first-child > div',
+    DEFAULT_PROFILE.USER_PHONE_XPATH: '.drawer span[dir="auto"]',
+    DEFAULT_PROFILE.CLOSE_USER_PROFILE_XPATH:
+        '.drawer span[data-icon="back-light"]',
+}
+
+
+def text_message_html(author, minute, bubble_html, outbound=False):
+
+    # Minutes from noon on the fixtures' date, so long histories get
+    # distinct timestamps (and message ids)
+    sent = datetime(2017, 10, 18, 12) + timedelta(minutes=minute)
+    return (
+        '<div class="msg"><div class="message message-chat message-{} tail">'
+        '<div class="bubble bubble-text copyable-text" '
+        'data-pre-plain-text="[{:%H:%M, %d/%m/%Y}] {}: ">'
+        '<div class="message-text">{}</div>'
+        '<div class="bubble-text-meta"><span class="message-datetime">'
+        '{:%H:%M}</span></div></div></div></div>'
+    ).format('out' if outbound else 'in', sent, author, bubble_html, sent)
+
+
+def image_message_html(minute, thumbnail, outbound=False):
+
+    sent = datetime(2017, 10, 18, 12) + timedelta(minutes=minute)
+    return (
+        '<div class="msg"><div class="message message-image message-{}">'
+        '<div class="bubble bubble-image"><div class="image-thumb">'
+        '<img src="{}" class="image-thumb-body"></div>'
+        '<div class="bubble-image-meta">{:%H:%M}</div></div></div></div>'
+    ).format('out' if outbound else 'in', thumbnail, sent)
+
+
+def system_message_html(text):
+
+    return (
+        '<div class="msg msg-system"><div class="message message-system">'
+        '<span class="emojitext selectable-text">{}</span></div></div>'
+    ).format(text)
+
+
+def pane_html(title, messages_html):
+
+    return read_fixture('pane.html').format(
+        title=title,
+        messages=''.join(messages_html)
+    )
+
+
+def generated_messages_html(title, count, author='Someone', start=0):
+
+    # `count` messages built from the recorded bubbles, with an image every
+    # tenth message
+    bubbles = json.loads(read_fixture('bubbles.json'))
+    messages = []
+    for i in range(start, start + count):
+        if i % 10 == 9:
+            messages.append(image_message_html(
+                i, 'blob:https://web.whatsapp.com/{}-{}'.format(title, i)
+            ))
+        else:
+            messages.append(text_message_html(
+                author, i, bubbles[i % len(bubbles)], outbound=i % 3 == 0
+            ))
+    return messages
+
+
+def generated_pane_html(title, count, author='Someone'):
+    return pane_html(title, generated_messages_html(title, count, author))
+
+
+def js_hash(raw):
+
+    # Same as the hash in WhatsappMessage.DATA_JS (over UTF-16 code units)
+    units = raw.encode('utf-16-le')
+    value = 5381
+    for i in range(0, len(units), 2):
+        value = (value * 33 + (units[i] | units[i + 1] << 8)) & 0xffffffff
+    return '{:x}:{}'.format(value, len(units) // 2)
+
+
+class FakeChat(object):
+
+    def __init__(self, title, phone, pane, unread=0, preview='',
+                 history=None):
+        self.title = title
+        self.phone = phone
+        self.pane = pane
+        self.unread = unread
+        self.preview = preview
+        # Older messages (HTML, oldest first) loaded by scrolling up
+        self.history = list(history or [])
+
+    @classmethod
+    def recorded(cls):
+        return [
+            cls(pane=read_fixture('panes', chat.pop('pane')), **chat)
+            for chat in json.loads(read_fixture('chats.json'))
+        ]
+
+
+class FakeElement(object):
+
+    def __init__(self, web_driver, tag):
+        self.web_driver = web_driver
+        self.tag = tag
+
+    @property
+    def id(self):
+        return str(id(self.tag))
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and self.tag is other.tag
+
+    def __hash__(self):
+        return id(self.tag)
+
+    @property
+    def text(self):
+        self.web_driver.execute('text')
+        return self.tag.get_text()
+
+    def get_attribute(self, name):
+        self.web_driver.execute('get_attribute')
+        if name == 'outerHTML':
+            return str(self.tag)
+        value = self.tag.get(name)
+        if isinstance(value, list):
+            return ' '.join(value)
+        return value
+
+    def find_element_by_css_selector(self, selector):
+        elements = self.find_elements_by_css_selector(selector)
+        if not elements:
+            raise NoSuchElementException(selector)
+        return elements[0]
+
+    def find_elements_by_css_selector(self, selector):
+        self.web_driver.execute('find_elements')
+        return self.web_driver.wrap(self.tag.select(selector))
+
+    def click(self):
+        self.web_driver.execute('click')
+        self.web_driver.click(self.tag)
+
+    def send_keys(self, *keys):
+        self.web_driver.execute('send_keys')
+        self.web_driver.type_into(self.tag, ''.join(keys))
+
+    def clear(self):
+        self.web_driver.execute('clear')
+        self.web_driver.typed.pop(id(self.tag), None)
+
+    def is_displayed(self):
+        self.web_driver.execute('is_displayed')
+        return True
+
+    def is_enabled(self):
+        self.web_driver.execute('is_enabled')
+        return True
+
+    @property
+    def location(self):
+        self.web_driver.execute('location')
+        return {'x': 0, 'y': 0}
+
+    @property
+    def size(self):
+        self.web_driver.execute('size')
+        return {'width': 64, 'height': 64}
+
+
+class FakeWebDriver(object):
+
+    """Offline stand-in for a Chrome WebDriver on WhatsApp Web.
+
+    Serves the recorded snapshots in benchmarks/fixtures (login screen,
+    chat list, chat panes and profile drawer) as a BeautifulSoup DOM, and
+    emulates the scripts the driver injects in Python (tests/page.py runs
+    the scripts themselves instead). Clicking chats, searching, sending and
+    opening the profile replay the matching snapshot changes.
+
+    Every call that would be an HTTP request to chromedriver counts as a
+    round-trip in `commands`, and adds `latency` seconds (a number, or a
+    dict by command name) to `simulated_seconds`; with `sleep` it is also
+    actually slept, so wall time includes it. When logged out, the phone
+    scans the code `login_delay` seconds into the first wait for a login
+    (never if None).
+    """
+
+    def __init__(
+            self,
+            chats=None,
+            logged_in=True,
+            latency=0.0,
+            sleep=True,
+            images=None,
+            login_delay=None,
+            history_page=50
+    ):
+        self.chats = FakeChat.recorded() if chats is None else chats
+        self.logged_in = logged_in
+        self.latency = latency
+        self.sleep = sleep
+        self.images = dict(images or {})
+        self.login_delay = login_delay
+        self.history_page = history_page
+        self.w3c = False
+        self.url = 'about:blank'
+        self.window_handles = ['main']
+        self.window = 'main'
+        self.dom = BeautifulSoup('<html></html>', 'html.parser')
+        self.tab_dom = None
+        self.chat_tags = {}
+        self.watcher = None
+        self.session = None
+        self.chat_index = None
+        self.cdp_commands = []
+        self.typed = {}
+        self.sent = []
+        self.reset_counters()
+
+    # Accounting
+
+    def reset_counters(self):
+        self.round_trips = 0
+        self.commands = {}
+        self.simulated_seconds = 0.0
+
+    def round_trip(self, command):
+        self.round_trips += 1
+        self.commands[command] = self.commands.get(command, 0) + 1
+        latency = self.latency
+        if isinstance(latency, dict):
+            latency = latency.get(command, latency.get('default', 0.0))
+        if latency:
+            self.simulated_seconds += latency
+            if self.sleep:
+                time.sleep(latency)
+
+    # Page state
+
+    def wrap(self, tags):
+        return [FakeElement(self, tag) for tag in tags]
+
+    def load_app(self):
+
+        if not self.logged_in:
+            self.dom = BeautifulSoup(read_fixture('login.html'), 'html.parser')
+            return
+
+        self.dom = BeautifulSoup(read_fixture('app.html'), 'html.parser')
+        chat_list = self.dom.select_one('[data-fake-chatlist]')
+        item_template = read_fixture('chat_item.html')
+        self.chat_tags = {}
+        for chat in self.chats:
+            item = BeautifulSoup(item_template.format(
+                title=chat.title,
+                time='12:00',
+                preview=chat.preview,
+                unread=chat.unread or ''
+            ), 'html.parser').select_one('.infinite-list-item')
+            chat_tag = item.select_one('.chat')
+            if chat.unread:
+                chat_tag['class'].append('unread')
+            self.chat_tags[id(chat_tag)] = chat
+            chat_list.append(item)
+        self.watcher = None
+        self.session = None
+        self.chat_index = None
+
+    def log_in(self):
+
+        # The app replaces the login screen without reloading the page
+        session = self.session
+        self.logged_in = True
+        self.load_app()
+        self.session = session
+
+    def open_chat(self, chat):
+
+        for tag in self.dom.select('.chat'):
+            current = self.chat_tags.get(id(tag))
+            classes = [
+                name for name in tag['class'] if name != 'active'
+            ]
+            if current is chat:
+                classes = [name for name in classes if name != 'unread']
+                classes.append('active')
+                tag.select_one('.unread-count').string = ''
+            tag['class'] = classes
+        chat.unread = 0
+
+        main = self.dom.select_one('#main')
+        main.clear()
+        main.append(BeautifulSoup(chat.pane, 'html.parser'))
+        self.notify_added(main.select('.message'))
+
+    def close_chat(self):
+
+        for tag in self.dom.select('.chat.active'):
+            tag['class'] = [name for name in tag['class'] if name != 'active']
+        main = self.dom.select_one('#main')
+        if main is not None:
+            main.clear()
+
+    def active_chat(self):
+        tag = self.dom.select_one('.chat.active')
+        return self.chat_tags.get(id(tag)) if tag is not None else None
+
+    def search_results(self, text):
+        return [
+            chat for chat in self.chats
+            if text in chat.phone or text.lower() in chat.title.lower()
+        ]
+
+    def search_titles(self, selector):
+
+        # The chat list filters itself while the search box has text
+        search_box = self.dom.select_one('#input-chatlist-search')
+        text = self.typed.get(id(search_box)) if search_box else None
+        if not text:
+            return self.inner_texts(selector)
+        return '\n'.join(chat.title for chat in self.search_results(text))
+
+    def chat_by_phone(self, phone):
+        for chat in self.chats:
+            if chat.phone == phone:
+                return chat
+        return None
+
+    def receive_message(self, title, message_html):
+
+        # A new message arriving from the phone
+        chat = next(chat for chat in self.chats if chat.title == title)
+        pane = BeautifulSoup(chat.pane, 'html.parser')
+        pane.select_one('.pane-chat-msgs').append(
+            BeautifulSoup(message_html, 'html.parser')
+        )
+        chat.pane = str(pane)
+
+        if chat is self.active_chat():
+            message = BeautifulSoup(message_html, 'html.parser').select_one(
+                '.msg'
+            )
+            self.dom.select_one('#main .pane-chat-msgs').append(message)
+            self.notify_added(message.select('.message'))
+            return
+
+        chat.unread += 1
+        for tag in self.dom.select('.chat'):
+            if self.chat_tags.get(id(tag)) is not chat:
+                continue
+            tag.select_one('.unread-count').string = str(chat.unread)
+            if 'unread' not in tag['class']:
+                tag['class'].append('unread')
+                self.notify_unread()
+
+    def click(self, tag):
+
+        action = None
+        for node in [tag] + list(tag.parents):
+            if node.get('data-fake-click'):
+                action = node['data-fake-click']
+                break
+
+        if action == 'open-chat':
+            chat_tag = tag if 'chat' in tag.get('class', []) else \
+                tag.find_parent(class_='chat')
+            self.open_chat(self.chat_tags[id(chat_tag)])
+
+        elif action == 'open-profile':
+            side = self.dom.select_one('#side')
+            side.append(BeautifulSoup(
+                read_fixture('profile.html'), 'html.parser'
+            ))
+
+        elif action == 'close-profile':
+            drawer = self.dom.select_one('.drawer-container')
+            if drawer is not None:
+                drawer.decompose()
+
+        elif action == 'send':
+            self.send_typed()
+
+    def type_into(self, tag, keys):
+
+        key = id(tag)
+        if keys.endswith(Keys.RETURN):
+            keys = keys[:-1]
+            text = self.typed.pop(key, '') + keys
+            if tag.get('id') == 'input-chatlist-search':
+                # Opens the top result
+                results = self.search_results(text)
+                if results:
+                    self.open_chat(results[0])
+            return
+        self.typed[key] = self.typed.get(key, '') + keys
+
+    def send_typed(self):
+
+        message_input = self.dom.select_one('#main .pluggable-input')
+        text = self.typed.pop(id(message_input), '')
+        chat = self.active_chat()
+        self.sent.append((chat.title if chat else None, text))
+        if chat is not None:
+            self.receive_message(chat.title, text_message_html(
+                'Me', 0, '<span class="selectable-text" dir="ltr">'
+                         '{}</span>'.format(text),
+                outbound=True
+            ))
+
+    # WebDriver API
+
+    def get(self, url):
+        self.execute('get')
+        if self.window == 'tab':
+            self.tab_dom = BeautifulSoup(
+                '<img src="{}">'.format(url), 'html.parser'
+            )
+            return
+        self.url = url
+        self.load_app()
+        if '/send?phone=' in url and self.logged_in:
+            chat = self.chat_by_phone(url.split('phone=', 1)[1])
+            if chat is not None:
+                self.open_chat(chat)
+
+    @property
+    def current_url(self):
+        self.execute('get_current_url')
+        return self.url if self.window == 'main' else 'about:blank'
+
+    @property
+    def current_window_handle(self):
+        self.execute('get_current_window_handle')
+        return self.window
+
+    def quit(self):
+        self.execute('quit')
+
+    def close(self):
+        self.execute('close')
+        self.window_handles = ['main']
+        self.tab_dom = None
+
+    def set_script_timeout(self, seconds):
+        self.execute('set_script_timeout')
+
+    def switch_to_window(self, handle):
+        self.execute('switch_to_window')
+        self.window = handle
+
+    def execute(self, command, params=None):
+        # Every round-trip goes through here, like Selenium's
+        self.round_trip(command)
+        if command == 'sendKeysToActiveElement' and \
+                Keys.ESCAPE in ''.join(params['value']):
+            self.close_chat()
+        return {'value': None}
+
+    def execute_cdp_cmd(self, command, params):
+        self.execute('execute_cdp_cmd')
+        self.cdp_commands.append((command, params))
+        return {}
+
+    def select(self, by, value):
+        if by == By.XPATH:
+            value = XPATHS[value]
+        elif by == By.CLASS_NAME:
+            value = '.' + value
+        elif by == By.TAG_NAME:
+            pass
+        dom = self.tab_dom if self.window == 'tab' else self.dom
+        return self.wrap(dom.select(value))
+
+    def find_elements(self, by=By.CSS_SELECTOR, value=None):
+        self.execute('find_elements')
+        return self.select(by, value)
+
+    def find_element(self, by=By.CSS_SELECTOR, value=None):
+        self.execute('find_element')
+        elements = self.select(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements_by_css_selector(self, selector):
+        return self.find_elements(By.CSS_SELECTOR, selector)
+
+    def find_element_by_css_selector(self, selector):
+        return self.find_element(By.CSS_SELECTOR, selector)
+
+    def find_element_by_class_name(self, name):
+        return self.find_element(By.CLASS_NAME, name)
+
+    def find_elements_by_tag_name(self, name):
+        return self.find_elements(By.TAG_NAME, name)
+
+    def get_screenshot_as_png(self):
+        self.execute('screenshot')
+        output = BytesIO()
+        Image.new('RGB', (650, 650), 'white').save(output, format='PNG')
+        return output.getvalue()
+
+    def get_screenshot_as_file(self, filename):
+        with open(filename, 'wb') as screenshot:
+            screenshot.write(self.get_screenshot_as_png())
+        return True
+
+    def execute_async_script(self, script, *args):
+
+        self.execute('execute_async_script')
+        if script == WhatsappDriver.FETCH_IMAGE_SCRIPT:
+            if args[0] not in self.images:
+                return {'error': 'TypeError: Failed to fetch'}
+            return {'dataUrl': 'data:image/jpeg;base64,' + base64.b64encode(
+                self.images[args[0]]
+            ).decode('ascii')}
+
+        if script == SessionState.WAIT_SCRIPT:
+            return self.wait_session(*args)
+
+        if script == WhatsappDriver.DRAIN_WATCHER_SCRIPT:
+            if self.watcher is None:
+                return None
+            max_events = args[0]
+            events = self.watcher['queue'][:max_events]
+            del self.watcher['queue'][:max_events]
+            return events
+
+        if script == BatchedSweep.READ_SCRIPT:
+            return self.read_chats(*args)
+
+        raise NotImplementedError('Unknown async script')
+
+    def read_chats(self, selectors, jobs, timeout):
+
+        # The page opening each chat in turn; chats render instantly here
+        results = []
+        for job in jobs:
+            tag = job['element'].tag
+            if self.chat_tags.get(id(tag)) is None or tag.find_parent(
+                    id='side'
+            ) is None:
+                results.append({'title': job['title'], 'error': 'stale'})
+                continue
+            self.click(tag)
+            if self.inner_text(selectors['header']) != job['title']:
+                results.append({'title': job['title'], 'error': 'timeout'})
+                continue
+            results.append({
+                'title': job['title'],
+                'messages': self.messages_data(
+                    selectors['messages'],
+                    job['cursor'],
+                    selectors['parts'],
+                    job['limit']
+                ),
+            })
+        return results
+
+    def execute_script(self, script, *args):
+
+        self.execute('execute_script')
+        handler = self.script_handlers().get(script)
+        if handler is None:
+            raise NotImplementedError('Unknown script: {}'.format(
+                script.strip().splitlines()[0]
+            ))
+        return handler(*args)
+
+    # Injected scripts, emulated
+
+    def script_handlers(self):
+        return {
+            WhatsappMessage.DATA_SCRIPT: self.messages_data,
+            WhatsappDriver.SCRIPT_SOURCES_SCRIPT: self.script_sources,
+            WhatsappDriver.CURRENT_CHAT_TITLE_SCRIPT: self.inner_text,
+            WhatsappDriver.CHAT_TITLES_SCRIPT: self.search_titles,
+            WhatsappDriver.INSTALL_WATCHER_SCRIPT: self.install_watcher,
+            SessionState.INSTALL_SCRIPT: self.install_session,
+            ChatIndex.REFRESH_SCRIPT: self.refresh_chat_index,
+            HistoryExport.SCROLL_UP_SCRIPT: self.load_history,
+            HistoryExport.PAGE_SCRIPT: self.history_page_data,
+            ElementCountAbove.SCRIPT:
+                lambda selector: len(self.dom.select(selector)),
+            ChatHeaderMatches.SCRIPT: self.inner_text,
+            ScrollSettled.SCRIPT: lambda element: 0,
+            AnimationsFinished.SCRIPT: lambda: True,
+            'arguments[0].scrollIntoView()': lambda element: None,
+            NO_ANIMATIONS_SCRIPT: lambda: None,
+            "window.open('','_blank');": self.open_window,
+        }
+
+    def script_sources(self):
+        return [script.get('src', '') for script in self.dom.select('script')]
+
+    def inner_text(self, selector):
+        tag = self.dom.select_one(selector)
+        return tag.get_text() if tag is not None else None
+
+    def inner_texts(self, selector):
+        return '\n'.join(tag.get_text() for tag in self.dom.select(selector))
+
+    def open_window(self):
+        self.window_handles = ['main', 'tab']
+
+    def session_state(self):
+
+        main_selector, logo_selector = self.session
+        if self.dom.select_one(main_selector) is not None:
+            return LOGGED_IN
+        if self.dom.select_one(logo_selector) is not None:
+            return LOGGED_OUT
+        return LOADING
+
+    def install_session(self, main_selector, logo_selector):
+
+        if self.session is None:
+            self.session = (main_selector, logo_selector)
+        return self.session_state()
+
+    def wait_session(self, known, timeout):
+
+        if self.session is None:
+            return None
+        if self.session_state() != known:
+            return self.session_state()
+
+        if not self.logged_in and self.login_delay is not None:
+            waited = self.login_delay
+            self.log_in()
+        else:
+            waited = timeout / 1000
+        self.simulated_seconds += waited
+        if self.sleep:
+            time.sleep(waited)
+        return self.session_state()
+
+    def refresh_chat_index(self, selectors, full):
+
+        # Rescans on every call, where the page only does after a mutation
+        if self.chat_index is None or full:
+            full = True
+            self.chat_index = {}
+
+        def text(tag, selector):
+            found = tag.select_one(selector)
+            return found.get_text() if found is not None else ''
+
+        result = {'full': full, 'added': [], 'changed': [], 'removed': []}
+        entries = {}
+        seen = {}
+        root = self.dom.select_one(selectors['root'])
+        chats = root.select(selectors['chat']) if root is not None else []
+        for position, tag in enumerate(chats):
+            title = text(tag, selectors['title'])
+            seen[title] = seen.get(title, 0) + 1
+            key = title if seen[title] == 1 else '{}#{}'.format(
+                title, seen[title]
+            )
+            count = text(tag, selectors['unread'])
+            classes = tag.get('class', [])
+            entry = {
+                'key': key,
+                'title': title,
+                'unread': int(count) if count.isdigit() else
+                int('unread' in classes),
+                'preview': text(tag, selectors['preview']),
+                'time': text(tag, selectors['time']),
+                'active': 'active' in classes,
+                'position': position,
+                'tag': id(tag),
+            }
+            entries[key] = entry
+            previous = self.chat_index.get(key)
+            if previous is None:
+                result['added'].append(entry)
+            elif any(previous[name] != entry[name] for name in entry):
+                result['changed'].append(entry)
+            entry['element'] = FakeElement(self, tag)
+        result['removed'] = [
+            key for key in self.chat_index if key not in entries
+        ]
+        self.chat_index = entries
+        return {
+            name: value if name in ('full', 'removed') else [
+                {k: v for k, v in entry.items() if k != 'tag'}
+                for entry in value
+            ]
+            for name, value in result.items()
+        }
+
+    def load_history(self, pane_selector, messages_selector):
+
+        # Scrolling to the top prepends the next older page at once
+        count = len(self.dom.select(messages_selector))
+        chat = self.active_chat()
+        if chat is not None and chat.history:
+            page = chat.history[-self.history_page:]
+            del chat.history[-self.history_page:]
+            pane = self.dom.select_one('#main ' + pane_selector)
+            for message_html in reversed(page):
+                pane.insert(0, BeautifulSoup(
+                    message_html, 'html.parser'
+                ).select_one('.msg'))
+        return count
+
+    def history_page_data(self, selector, boundary, boundary_key, parts):
+
+        tags = self.dom.select(selector)
+        end = len(tags)
+        if boundary is not None or boundary_key:
+            end = next((
+                i for i, tag in enumerate(tags)
+                if boundary is not None and tag is boundary.tag
+            ), -1)
+            if end < 0:
+                end = next((
+                    i for i, tag in enumerate(tags)
+                    if self.message_data(tag, parts)['key'] == boundary_key
+                ), len(tags))
+        return {
+            'messages': [self.message_data(tag, parts) for tag in tags[:end]],
+            'oldest': FakeElement(self, tags[0]) if end > 0 else None,
+        }
+
+    def message_data(self, tag, parts):
+
+        def query(selector):
+            return tag.select_one(selector)
+
+        bubble = query(parts['bubble'])
+        text = query(parts['text'])
+        thumbnail = query(parts['thumbnail'])
+        image_time = query(parts['time'])
+        gif = query(parts['gif'])
+        data = {
+            'classes': ' '.join(tag.get('class', [])),
+            'metadata': bubble.get('data-pre-plain-text') if bubble else None,
+            'html': str(text) if text else None,
+            'thumbnail': thumbnail.get('src') if thumbnail else None,
+            'time': image_time.get_text() if image_time else None,
+            'gif': FakeElement(self, gif) if gif else None,
+        }
+        raw = '|'.join(
+            data[name] or ''
+            for name in ('classes', 'metadata', 'html', 'thumbnail', 'time')
+        )
+        data['key'] = js_hash(raw)
+        return data
+
+    def messages_data(self, selector, cursor=None, parts=None, limit=None):
+
+        parts = parts or DEFAULT_PROFILE.message_parts()
+        result = []
+        for tag in reversed(self.dom.select(selector)):
+            if limit and len(result) >= limit:
+                break
+            data = self.message_data(tag, parts)
+            if cursor and data['key'] == cursor:
+                break
+            result.append(data)
+        return result[::-1]
+
+    def install_watcher(self, message_selector, unread_selector, root, parts,
+                        header_selector):
+
+        if self.watcher is None:
+            self.watcher = {
+                'parts': parts,
+                'header': header_selector,
+                'queue': []
+            }
+        return True
+
+    def notify_added(self, tags):
+        if self.watcher is None:
+            return
+        chat = self.inner_text(self.watcher['header']) or ''
+        for tag in tags:
+            self.watcher['queue'].append({
+                'type': 'message',
+                'chat': chat,
+                'data': self.message_data(tag, self.watcher['parts'])
+            })
+
+    def notify_unread(self):
+        if self.watcher is not None:
+            self.watcher['queue'].append({'type': 'unread'})
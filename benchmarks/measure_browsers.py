@@ -0,0 +1,51 @@
+import sys
+import time
+
+from wspdriver.driver import WhatsappDriver
+from wspdriver.lean import cpu_percent
+
+
+# Needs chromedriver, a logged in Chrome profile per mode and psutil:
+#   python -m benchmarks.measure_browsers CHROMEDRIVER DATA_DIR [SECONDS]
+
+
+def measure(chrome_driver_path, chrome_data_path, lean, seconds):
+
+    driver = WhatsappDriver.start(
+        chrome_driver_path,
+        chrome_data_path,
+        lean=lean
+    )
+    try:
+        driver.wait_for_login(timeout=60)
+        list(driver.get_unread_messages())
+        before = driver.resource_usage()
+        time.sleep(seconds)
+        list(driver.get_unread_messages())
+        after = driver.resource_usage()
+    finally:
+        driver.quit()
+    return after, cpu_percent(before, after)
+
+
+def main(chrome_driver_path, chrome_data_path, seconds=60):
+
+    print('{:>8} {:>10} {:>8} {:>8} {:>14} {:>15}'.format(
+        'mode', 'processes', 'RSS MB', 'CPU %', 'accounts/GB', 'accounts/core'
+    ))
+    for lean in (False, True):
+        usage, cpu = measure(chrome_driver_path, chrome_data_path, lean,
+                             seconds)
+        rss = usage['rss'] / 2 ** 20
+        print('{:>8} {:>10} {:>8.0f} {:>8.1f} {:>14.1f} {:>15.1f}'.format(
+            'lean' if lean else 'default',
+            usage['processes'],
+            rss,
+            cpu,
+            1024 / rss,
+            100 / cpu if cpu else float('inf')
+        ))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], sys.argv[2], *map(float, sys.argv[3:4]))
@@ -0,0 +1,279 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver, \
+    generated_pane_html, read_fixture, text_message_html
+from wspdriver.driver import WhatsappDriver
+from wspdriver.message import WSPTextMessage
+
+
+IMAGE_URL = 'blob:https://web.whatsapp.com/benchmark-image'
+
+
+def png_bytes(size=(640, 480)):
+
+    output = BytesIO()
+    Image.new('RGB', size, (37, 211, 102)).save(output, format='PNG')
+    return output.getvalue()
+
+
+def start(chats, latency, **kwargs):
+
+    # Simulated latency is accounted, not slept, so wall and CPU time only
+    # measure the driver's own overhead
+    web_driver = FakeWebDriver(chats, latency=latency, sleep=False, **kwargs)
+    return web_driver, WhatsappDriver(web_driver)
+
+
+# Each setup builds a fresh page and returns (web_driver, operation); the
+# operation returns how many items it processed
+
+def current_chat_messages(count):
+
+    def setup(latency):
+        chat = FakeChat('Chat', '1', generated_pane_html('Chat', count))
+        web_driver, driver = start([chat], latency)
+        web_driver.open_chat(chat)
+
+        def operation():
+            messages = list(driver.get_current_chat_messages())
+            for message in messages:
+                message.to_dict()
+            return len(messages)
+
+        return web_driver, operation
+
+    return setup
+
+
+def unread_messages(chat_count, unread=5):
+
+    def setup(latency):
+        chats = [
+            FakeChat(
+                'Chat {}'.format(i),
+                str(56900000000 + i),
+                generated_pane_html('Chat {}'.format(i), 20),
+                unread=unread
+            )
+            for i in range(chat_count)
+        ]
+        web_driver, driver = start(chats, latency)
+        # New messages arrive on top of what has already been read
+        list(driver.get_unread_messages())
+        for chat in chats:
+            for minute in range(unread):
+                web_driver.receive_message(chat.title, text_message_html(
+                    'Someone', 30 + minute,
+                    '<span class="selectable-text">New {}</span>'.format(
+                        minute
+                    )
+                ))
+
+        def operation():
+            return len(list(driver.get_unread_messages()))
+
+        return web_driver, operation
+
+    return setup
+
+
+def send_message(latency):
+
+    chats = FakeChat.recorded()
+    web_driver, driver = start(chats, latency)
+    sends = [chat.phone for chat in chats]
+
+    def operation():
+        for phone in sends:
+            driver.send_message(phone, 'Benchmark message')
+        return len(sends)
+
+    return web_driver, operation
+
+
+def get_user_data(latency):
+
+    web_driver, driver = start(None, latency)
+
+    def operation():
+        driver.get_user_data()
+        return 1
+
+    return web_driver, operation
+
+
+def get_image(latency):
+
+    web_driver, driver = start(None, latency, images={IMAGE_URL: png_bytes()})
+
+    def operation():
+        driver.get_image(IMAGE_URL).load()
+        return 1
+
+    return web_driver, operation
+
+
+def transform_emojis_to_text(latency):
+
+    bubbles = json.loads(read_fixture('bubbles.json'))
+
+    def operation():
+        for html in bubbles:
+            WSPTextMessage.transform_emojis_to_text(html)
+        return len(bubbles)
+
+    return None, operation
+
+
+CASES = [
+    ('get_current_chat_messages[10]', current_chat_messages(10), 20),
+    ('get_current_chat_messages[100]', current_chat_messages(100), 10),
+    ('get_current_chat_messages[1000]', current_chat_messages(1000), 3),
+    ('get_unread_messages[10 chats]', unread_messages(10), 5),
+    ('send_message', send_message, 5),
+    ('get_user_data', get_user_data, 5),
+    ('get_image', get_image, 10),
+    ('transform_emojis_to_text', transform_emojis_to_text, 200),
+]
+
+
+def summarize(values):
+
+    return {
+        'mean': statistics.mean(values),
+        'min': min(values),
+        'max': max(values),
+    }
+
+
+def measure(name, setup, repeat, latency):
+
+    walls, cpus, round_trips, simulated, items = [], [], [], [], 0
+    for _ in range(repeat):
+        web_driver, operation = setup(latency)
+        if web_driver is not None:
+            web_driver.reset_counters()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        items = operation()
+        cpus.append(time.process_time() - cpu)
+        walls.append(time.perf_counter() - wall)
+
+        if web_driver is not None:
+            round_trips.append(web_driver.round_trips)
+            simulated.append(web_driver.simulated_seconds)
+        else:
+            round_trips.append(0)
+            simulated.append(0.0)
+
+    wall = summarize(walls)
+    return {
+        'name': name,
+        'repeat': repeat,
+        'items': items,
+        'wall_seconds': wall,
+        'cpu_seconds': summarize(cpus),
+        'round_trips': statistics.mean(round_trips),
+        'simulated_latency_seconds': statistics.mean(simulated),
+        'items_per_second': items / wall['mean'] if wall['mean'] else None,
+    }
+
+
+def run(latency=0.005, only=None):
+
+    results = []
+    for name, setup, repeat in CASES:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results.append(measure(name, setup, repeat, latency))
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': latency,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+
+    # Wall time is noisy, so only flag it beyond the tolerance; round-trips
+    # are deterministic and any increase is a regression
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        if result['round_trips'] > before['round_trips']:
+            regressions.append('{}: round-trips {} -> {}'.format(
+                result['name'], before['round_trips'], result['round_trips']
+            ))
+        limit = before['wall_seconds']['mean'] * (1 + tolerance)
+        if result['wall_seconds']['mean'] > limit:
+            regressions.append('{}: wall {:.4f}s -> {:.4f}s'.format(
+                result['name'],
+                before['wall_seconds']['mean'],
+                result['wall_seconds']['mean']
+            ))
+    return regressions
+
+
+def print_report(report):
+
+    print('{:<34} {:>11} {:>10} {:>10} {:>12}'.format(
+        'operation', 'round-trips', 'wall ms', 'cpu ms', 'latency ms'
+    ))
+    for result in report['results']:
+        print('{:<34} {:>11.1f} {:>10.2f} {:>10.2f} {:>12.1f}'.format(
+            result['name'],
+            result['round_trips'],
+            result['wall_seconds']['mean'] * 1000,
+            result['cpu_seconds']['mean'] * 1000,
+            result['simulated_latency_seconds'] * 1000
+        ))
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the driver against the offline replay page'
+    )
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='simulated seconds per WebDriver round-trip')
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--compare', help='baseline JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed wall time increase over the baseline')
+    parser.add_argument('only', nargs='*',
+                        help='only run operations containing these names')
+    args = parser.parse_args(argv)
+
+    report = run(args.latency, args.only)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
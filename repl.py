@@ -1,4 +1,5 @@
 from wspdriver.driver import WhatsappDriver, NonBMPUnicodeNotSupportedError
+from wspdriver.instrumentation import Collector
 
 
 class REPL(object):
@@ -60,6 +61,20 @@ class REPL(object):
                     print(message)
             return 'Ok.'
 
+        if user_input == 'sweep_unread':
+            sweep = self.driver.sweep_unread()
+            for message in sweep:
+                print(message)
+            return '{chats} chats, {messages} messages in {seconds:.1f}s ' \
+                   '({messages_per_second:.1f}/s)'.format(**sweep.summary())
+
+        if user_input == 'export_history':
+            path = input('File (.jsonl or .parquet): ')
+            summary = self.driver.export_history(path)
+            return '{messages} messages from {chat} in {pages} pages, ' \
+                   '{seconds:.1f}s ({messages_per_second:.1f}/s)'.format(
+                       **summary)
+
         if user_input == 'get_current_chat':
             for message in self.driver.get_current_chat_messages():
                 print(message)
@@ -71,6 +86,39 @@ class REPL(object):
                     print(message)
             return 'Ok.'
 
+        if user_input == 'wait_timings':
+            for name, timing in sorted(self.driver.waits.summary().items()):
+                print('{}: {count} waits, {total:.3f}s total, '
+                      '{max:.3f}s max'.format(name, **timing))
+            return 'Ok.'
+
+        if user_input == 'stats':
+            if self.driver.hooks is None:
+                return 'Instrumentation disabled.'
+            stats = self.driver.hooks.summary()
+            for name, stat in sorted(
+                    stats.items(), key=lambda item: -item[1]['total']
+            ):
+                print('{}: {count} calls, {errors} errors, {total:.3f}s '
+                      'total, {mean:.4f}s mean, {p95}s p95, {max:.3f}s '
+                      'max'.format(name, **stat))
+            return 'Ok.'
+
+        if user_input == 'stats_export':
+            if self.driver.hooks is None:
+                return 'Instrumentation disabled.'
+            with open('stats.prom', 'w') as output:
+                output.write(self.driver.hooks.export())
+            return 'Saved to stats.prom'
+
+        if user_input == 'resources':
+            usage = self.driver.resource_usage()
+            return '{} processes, {:.0f} MB RSS, {:.1f}s CPU'.format(
+                usage['processes'],
+                usage['rss'] / 2 ** 20,
+                usage['cpu_seconds']
+            )
+
         if user_input == 'send_message':
             phone_number = input('To: ')
             message = input('Message: ')
@@ -89,7 +137,8 @@ if __name__ == '__main__':
     driver = WhatsappDriver.start(
         'webdriver/chromedriver',
         'data/whatsapp-driver',
-        headless=False
+        headless=False,
+        hooks=Collector()
     )
 
     repl = REPL(driver)
@@ -68,7 +68,17 @@ setup(
     # your project is installed. For an analysis of "install_requires" vs pip's
     # requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
-    install_requires=['selenium', 'beautifulsoup4'],
+    install_requires=['selenium', 'Pillow'],
+
+    # Measuring browser memory and CPU (WhatsappDriver.resource_usage),
+    # exporting history to Parquet (WhatsappDriver.export_history), and
+    # running the tests and benchmarks, whose fake WebDriver parses the
+    # recorded pages with BeautifulSoup
+    extras_require={
+        'metrics': ['psutil'],
+        'parquet': ['pyarrow'],
+        'dev': ['beautifulsoup4', 'pytest'],
+    },
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). You can install these using the following syntax,
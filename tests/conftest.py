@@ -0,0 +1,38 @@
+import pytest
+
+from benchmarks.fake_webdriver import FakeWebDriver
+from tests.page import NODE, PageWebDriver
+from wspdriver.driver import WhatsappDriver
+
+
+@pytest.fixture(params=['emulated', 'page'])
+def web_driver_class(request):
+
+    # Every driver test runs against the fake's Python emulation of the
+    # injected scripts, and against the scripts themselves run by node
+    if request.param == 'page':
+        if NODE is None:
+            pytest.skip('node is needed to run the injected scripts')
+        return PageWebDriver
+    return FakeWebDriver
+
+
+@pytest.fixture
+def open_driver(web_driver_class):
+
+    # open_driver(chats, history_page=..., **driver_options) returns the
+    # fake and a logged in WhatsappDriver on it
+    web_drivers = []
+
+    def open_driver(chats=None, history_page=50, **options):
+        web_driver = web_driver_class(
+            chats, sleep=False, history_page=history_page
+        )
+        web_drivers.append(web_driver)
+        driver = WhatsappDriver(web_driver, **options)
+        assert driver.is_logged_in()
+        return web_driver, driver
+
+    yield open_driver
+    for web_driver in web_drivers:
+        web_driver.quit()
@@ -0,0 +1,229 @@
+// A stand-in for the browser page, for running the driver's injected scripts
+// under node. tests/page.py sends snapshots of a FakeWebDriver's DOM (each
+// element with the selectors it matches, precomputed by BeautifulSoup) and
+// the mutations between them, then the scripts to run; one JSON object per
+// line each way.
+
+var readline = require('readline');
+
+var nodes = [];
+var matches = {};
+var elements = {};
+var observers = [];
+
+function send(message) {
+    process.stdout.write(JSON.stringify(message, function (key, value) {
+        if (value instanceof Element) {
+            return {__element: value.key};
+        }
+        return value === undefined ? null : value;
+    }) + '\n');
+}
+
+function Element(key) {
+    this.key = key;
+    this.index = -1;
+    this.end = -2;
+    this.attributes = {};
+    this.parentElement = null;
+    this.scrollTop = 0;
+}
+
+Element.prototype.nodeType = 1;
+
+Element.prototype.getAttribute = function (name) {
+    var value = this.attributes[name];
+    return value === undefined ? null : value;
+};
+
+Object.defineProperty(Element.prototype, 'src', {
+    get: function () { return this.getAttribute('src') || ''; }
+});
+
+Element.prototype.matches = function (selector) {
+    return matched(selector).indexOf(this.index) >= 0;
+};
+
+Element.prototype.querySelectorAll = function (selector) {
+    var element = this;
+    return matched(selector).filter(function (index) {
+        return index > element.index && index <= element.end;
+    }).map(function (index) { return nodes[index]; });
+};
+
+Element.prototype.querySelector = function (selector) {
+    return this.querySelectorAll(selector)[0] || null;
+};
+
+Element.prototype.contains = function (other) {
+    return other.index >= this.index && other.index <= this.end;
+};
+
+Element.prototype.scrollIntoView = function () {};
+
+Element.prototype.dispatchEvent = function (event) {
+    // Python replays it on the fake and answers with the new snapshot
+    send({event: {type: event.type, target: this.key}});
+    return true;
+};
+
+function matched(selector) {
+    if (!(selector in matches)) {
+        throw new Error('No matches were sent for ' + selector);
+    }
+    return matches[selector];
+}
+
+function element(key) {
+    if (!(key in elements)) {
+        elements[key] = new Element(key);
+    }
+    return elements[key];
+}
+
+global.window = global;
+global.Node = {ELEMENT_NODE: 1};
+
+global.MouseEvent = function (type, options) {
+    this.type = type;
+    this.options = options;
+};
+
+global.MutationObserver = function (callback) {
+    this.callback = callback;
+    this.targets = [];
+};
+
+MutationObserver.prototype.observe = function (target, options) {
+    this.targets.push({target: target, options: options});
+    if (observers.indexOf(this) < 0) {
+        observers.push(this);
+    }
+};
+
+MutationObserver.prototype.disconnect = function () {
+    this.targets = [];
+    observers.splice(observers.indexOf(this), 1);
+};
+
+MutationObserver.prototype.observes = function (record) {
+    return this.targets.some(function (observed) {
+        var options = observed.options;
+        if (!options[record.type]) {
+            return false;
+        }
+        if (record.type === 'attributes' && options.attributeFilter &&
+                options.attributeFilter.indexOf(record.attributeName) < 0) {
+            return false;
+        }
+        return record.target === observed.target ||
+            (options.subtree && observed.target.contains(record.target));
+    });
+};
+
+global.document = {
+    get documentElement() {
+        return nodes[0] || null;
+    },
+    querySelectorAll: function (selector) {
+        return matched(selector).map(function (index) {
+            return nodes[index];
+        });
+    },
+    querySelector: function (selector) {
+        return this.querySelectorAll(selector)[0] || null;
+    },
+    contains: function (other) {
+        return nodes[other.index] === other;
+    }
+};
+
+function load(snapshot) {
+    nodes.forEach(function (node) {
+        node.index = -1;
+        node.end = -2;
+    });
+    nodes = snapshot.nodes.map(function (data, index) {
+        var node = element(data.key);
+        node.index = index;
+        node.end = data.end;
+        node.tagName = data.tag.toUpperCase();
+        node.attributes = data.attributes;
+        node.outerHTML = data.outerHTML;
+        node.innerText = data.innerText;
+        return node;
+    });
+    snapshot.nodes.forEach(function (data, index) {
+        nodes[index].parentElement =
+            data.parent === null ? null : nodes[data.parent];
+    });
+    matches = snapshot.matches;
+}
+
+function notify(mutations) {
+    var records = mutations.map(function (mutation) {
+        return {
+            type: mutation.type,
+            target: element(mutation.target),
+            attributeName: mutation.attributeName || null,
+            addedNodes: (mutation.addedNodes || []).map(element),
+            removedNodes: (mutation.removedNodes || []).map(element)
+        };
+    });
+    observers.slice().forEach(function (observer) {
+        var observed = records.filter(function (record) {
+            return observer.observes(record);
+        });
+        if (observed.length) {
+            observer.callback(observed, observer);
+        }
+    });
+}
+
+function argument(value) {
+    if (Array.isArray(value)) {
+        return value.map(argument);
+    }
+    if (value && typeof value === 'object') {
+        if ('__element' in value) {
+            return element(value.__element);
+        }
+        var result = {};
+        Object.keys(value).forEach(function (key) {
+            result[key] = argument(value[key]);
+        });
+        return result;
+    }
+    return value;
+}
+
+function run(request) {
+    var script = new Function(request.script);
+    var args = argument(request.args);
+    if (!request.async) {
+        return Promise.resolve(script.apply(null, args));
+    }
+    return new Promise(function (resolve) {
+        script.apply(null, args.concat([resolve]));
+    });
+}
+
+// Requests run one at a time, but snapshots apply as soon as they arrive:
+// an async script may be waiting for the one answering its click
+var queue = Promise.resolve();
+
+readline.createInterface({input: process.stdin}).on('line', function (line) {
+    var message = JSON.parse(line);
+    if (message.snapshot) {
+        load(message.snapshot);
+        notify(message.mutations);
+        return;
+    }
+    queue = queue.then(function () {
+        return run(message);
+    }).then(function (result) {
+        send({result: result});
+    }, function (error) {
+        send({error: String(error && error.stack || error)});
+    });
+});
@@ -0,0 +1,275 @@
+import json
+import os
+import shutil
+import subprocess
+
+from bs4 import Tag
+from selenium.common.exceptions import WebDriverException
+
+from benchmarks.fake_webdriver import FakeElement, FakeWebDriver
+from wspdriver.chat_index import ChatIndex
+from wspdriver.driver import WhatsappDriver
+from wspdriver.export import HistoryExport
+from wspdriver.message import WhatsappMessage
+from wspdriver.session import SessionState
+from wspdriver.sweep import BatchedSweep
+from wspdriver.wait import ChatHeaderMatches, ElementCountAbove
+
+
+NODE = shutil.which('node')
+PAGE_JS = os.path.join(os.path.dirname(__file__), 'page.js')
+
+
+class PageWebDriver(FakeWebDriver):
+
+    """A FakeWebDriver that runs the driver's injected scripts in node
+    (against tests/page.js) instead of emulating them in Python.
+
+    Before each script the page gets a snapshot of the fake's DOM and the
+    mutations since the last one, so observers installed by earlier
+    scripts see the fake's clicks, arrivals and sends. Clicks dispatched
+    by a script are replayed on the fake. Search results stay emulated:
+    the fake filters the chat list without rendering it.
+    """
+
+    SCRIPTS = (
+        WhatsappMessage.DATA_SCRIPT,
+        WhatsappDriver.CURRENT_CHAT_TITLE_SCRIPT,
+        WhatsappDriver.INSTALL_WATCHER_SCRIPT,
+        WhatsappDriver.DRAIN_WATCHER_SCRIPT,
+        SessionState.INSTALL_SCRIPT,
+        SessionState.WAIT_SCRIPT,
+        ChatIndex.REFRESH_SCRIPT,
+        HistoryExport.PAGE_SCRIPT,
+        BatchedSweep.READ_SCRIPT,
+        ChatHeaderMatches.SCRIPT,
+        ElementCountAbove.SCRIPT,
+    )
+
+    def __init__(self, *args, **kwargs):
+
+        self.page = None
+        self.keys = {}
+        self.tags = {}
+        self.selectors = set()
+        self.snapshot = None
+        super(PageWebDriver, self).__init__(*args, **kwargs)
+
+    def get(self, url):
+
+        # A reload starts a new page, with none of the scripts' state
+        super(PageWebDriver, self).get(url)
+        if self.window == 'main':
+            self.close_page()
+
+    def quit(self):
+
+        super(PageWebDriver, self).quit()
+        self.close_page()
+
+    def close_page(self):
+
+        if self.page is not None:
+            self.page.stdin.close()
+            self.page.wait()
+            self.page.stdout.close()
+        self.page = None
+        self.snapshot = None
+
+    def execute_script(self, script, *args):
+
+        if script not in self.SCRIPTS:
+            return super(PageWebDriver, self).execute_script(script, *args)
+        self.execute('execute_script')
+        return self.run_in_page(script, args, False)
+
+    def execute_async_script(self, script, *args):
+
+        if script not in self.SCRIPTS:
+            return super(PageWebDriver, self).execute_async_script(
+                script, *args
+            )
+        self.execute('execute_async_script')
+        return self.run_in_page(script, args, True)
+
+    def run_in_page(self, script, args, is_async):
+
+        if self.page is None:
+            self.page = subprocess.Popen(
+                [NODE, PAGE_JS],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                encoding='utf-8'
+            )
+        self.collect_selectors(args)
+        self.sync()
+        self.send({
+            'script': script,
+            'args': self.encode(args),
+            'async': is_async
+        })
+        while True:
+            line = self.page.stdout.readline()
+            if not line:
+                raise WebDriverException('The page exited')
+            message = json.loads(line)
+            if 'event' in message:
+                if message['event']['type'] == 'click':
+                    self.click(self.tags[message['event']['target']])
+                    self.sync()
+            elif 'error' in message:
+                raise WebDriverException(message['error'])
+            else:
+                return self.decode(message['result'])
+
+    def send(self, message):
+
+        self.page.stdin.write(json.dumps(message) + '\n')
+        self.page.stdin.flush()
+
+    # Snapshots
+
+    def key(self, tag, root=False):
+
+        # The document element keeps its key when the app replaces the
+        # page's content, like the browser's does
+        if root:
+            return 0
+        if id(tag) not in self.keys:
+            self.keys[id(tag)] = len(self.keys) + 1
+            self.tags[self.keys[id(tag)]] = tag
+        return self.keys[id(tag)]
+
+    def collect_selectors(self, value):
+
+        # Every string argument could be a selector a script queries, now
+        # or from an observer later
+        if isinstance(value, str):
+            self.selectors.add(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self.collect_selectors(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self.collect_selectors(item)
+
+    def take_snapshot(self):
+
+        tags = [tag for tag in self.dom.descendants if isinstance(tag, Tag)]
+        keys = [self.key(tag, root=i == 0) for i, tag in enumerate(tags)]
+        if tags:
+            self.tags[0] = tags[0]
+        positions = {id(tag): i for i, tag in enumerate(tags)}
+        nodes = []
+        for i, tag in enumerate(tags):
+            parent = positions.get(id(tag.parent))
+            nodes.append({
+                'key': keys[i],
+                'tag': tag.name,
+                'parent': parent,
+                'end': i + sum(
+                    1 for child in tag.descendants if isinstance(child, Tag)
+                ),
+                'attributes': {
+                    name: ' '.join(value) if isinstance(value, list)
+                    else value
+                    for name, value in tag.attrs.items()
+                },
+                'outerHTML': str(tag),
+                'innerText': tag.get_text(),
+                'text': ''.join(
+                    child for child in tag.children
+                    if not isinstance(child, Tag)
+                ),
+            })
+
+        matches = {}
+        for selector in list(self.selectors):
+            try:
+                found = self.dom.select(selector)
+            except Exception:
+                # Not a selector after all
+                self.selectors.discard(selector)
+                continue
+            matches[selector] = sorted(positions[id(tag)] for tag in found)
+        return {'nodes': nodes, 'matches': matches}
+
+    def sync(self):
+
+        snapshot = self.take_snapshot()
+        mutations = []
+        if self.snapshot is not None:
+            mutations = self.mutations(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        self.send({'snapshot': snapshot, 'mutations': mutations})
+
+    @staticmethod
+    def mutations(old, new):
+
+        def index(snapshot):
+            nodes = snapshot['nodes']
+            return {
+                node['key']: dict(node, parent=nodes[node['parent']]['key']
+                                  if node['parent'] is not None else None)
+                for node in nodes
+            }
+
+        before, after = index(old), index(new)
+        added = [
+            node for key, node in after.items()
+            if key not in before or before[key]['parent'] != node['parent']
+        ]
+        removed = [
+            node for key, node in before.items()
+            if key not in after or after[key]['parent'] != node['parent']
+        ]
+        added_keys = set(node['key'] for node in added)
+        removed_keys = set(node['key'] for node in removed)
+        mutations = [
+            {'type': 'childList', 'target': node['parent'],
+             'addedNodes': [node['key']]}
+            for node in added
+            if node['parent'] is not None and node['parent'] not in added_keys
+        ] + [
+            {'type': 'childList', 'target': node['parent'],
+             'removedNodes': [node['key']]}
+            for node in removed
+            if node['parent'] in after and
+            node['parent'] not in removed_keys
+        ]
+        for key, node in after.items():
+            previous = before.get(key)
+            if previous is None:
+                continue
+            attributes = previous['attributes']
+            for name in set(attributes) | set(node['attributes']):
+                if attributes.get(name) != node['attributes'].get(name):
+                    mutations.append({
+                        'type': 'attributes',
+                        'target': key,
+                        'attributeName': name
+                    })
+            if previous['text'] != node['text']:
+                mutations.append({'type': 'characterData', 'target': key})
+        return mutations
+
+    def encode(self, value):
+
+        if isinstance(value, FakeElement):
+            return {'__element': self.key(value.tag)}
+        if isinstance(value, dict):
+            return {name: self.encode(item) for name, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.encode(item) for item in value]
+        return value
+
+    def decode(self, value):
+
+        if isinstance(value, dict):
+            if '__element' in value:
+                return FakeElement(self, self.tags[value['__element']])
+            return {name: self.decode(item) for name, item in value.items()}
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        return value
@@ -0,0 +1,76 @@
+from benchmarks.fake_webdriver import text_message_html
+
+
+def keys(entries):
+    return sorted(entry.key for entry in entries)
+
+
+def test_first_refresh_adds_every_chat(open_driver):
+
+    web_driver, driver = open_driver()
+    diff = driver.chat_index.refresh()
+
+    assert diff.full
+    assert keys(diff.added) == ['Alice', 'Family', 'Work']
+    assert [entry.title for entry in driver.chat_index] == \
+        ['Family', 'Work', 'Alice']
+    assert [(entry.title, entry.unread)
+            for entry in driver.chat_index.unread()] == \
+        [('Work', 2), ('Alice', 1)]
+
+
+def test_unchanged_list_gives_an_empty_diff(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.chat_index.refresh()
+    diff = driver.chat_index.refresh()
+    assert not diff
+    assert not diff.full
+
+
+def test_new_message_changes_its_chat(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.chat_index.refresh()
+    web_driver.receive_message('Family', text_message_html(
+        'Ana', 30, '<span class="selectable-text">Hi</span>'
+    ))
+    diff = driver.chat_index.refresh()
+
+    assert keys(diff.changed) == ['Family']
+    assert diff.added == diff.removed == []
+    assert driver.chat_index.lookup('Family').unread == 1
+
+
+def test_opening_a_chat_changes_it(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.chat_index.refresh()
+    driver.find_chat('Work').select()
+    # find_chat refreshed before the click
+    diff = driver.chat_index.refresh()
+
+    assert keys(diff.changed) == ['Work']
+    entry = driver.chat_index.lookup('Work')
+    assert entry.active and not entry.unread
+
+
+def test_reload_replaces_every_element(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.chat_index.refresh()
+    web_driver.get(driver.WHATSAPP_URL)
+    diff = driver.chat_index.refresh()
+
+    assert diff.full
+    assert keys(diff.changed) == ['Alice', 'Family', 'Work']
+    assert diff.added == diff.removed == []
+
+
+def test_lookup_by_number(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.send_message('56933333333', 'Hi')
+    driver.chat_index.refresh()
+    assert driver.chat_index.lookup('56933333333').title == 'Alice'
+    assert driver.chat_index.lookup('Nobody') is None
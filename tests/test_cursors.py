@@ -0,0 +1,83 @@
+import pytest
+
+from benchmarks.fake_webdriver import FakeChat, generated_pane_html, \
+    text_message_html
+
+
+def open_chat(open_driver, count=5):
+
+    web_driver, driver = open_driver([
+        FakeChat('Ana', '1', generated_pane_html('Ana', count))
+    ])
+    driver.find_chat('Ana').select()
+    return web_driver, driver
+
+
+def receive(web_driver, minute, text):
+    web_driver.receive_message('Ana', text_message_html(
+        'Ana', minute, '<span class="selectable-text">{}</span>'.format(text)
+    ))
+
+
+def test_incremental_reads_start_after_the_cursor(open_driver):
+
+    web_driver, driver = open_chat(open_driver)
+    first = list(driver.get_current_chat_messages(incremental=True))
+    assert len(first) == 5
+    assert driver.chat_cursors['Ana'] == first[-1].key
+
+    assert list(driver.get_current_chat_messages(incremental=True)) == []
+    receive(web_driver, 30, 'One')
+    receive(web_driver, 31, 'Two')
+    assert [message.text for message in
+            driver.get_current_chat_messages(incremental=True)] == \
+        ['One', 'Two']
+
+
+def test_full_reads_ignore_the_cursor(open_driver):
+
+    web_driver, driver = open_chat(open_driver)
+    list(driver.get_current_chat_messages(incremental=True))
+    assert len(list(driver.get_current_chat_messages())) == 5
+
+
+def test_limit_keeps_the_last_messages(open_driver):
+
+    web_driver, driver = open_chat(open_driver)
+    every = list(driver.extract_messages())
+    last = list(driver.extract_messages(chat='Ana', limit=2))
+    assert [message.key for message in last] == \
+        [message.key for message in every[-2:]]
+    assert driver.chat_cursors['Ana'] == every[-1].key
+
+
+def test_keys_are_stable_across_reads(open_driver):
+
+    web_driver, driver = open_chat(open_driver)
+    first = [message.key for message in driver.extract_messages()]
+    assert len(set(first)) == len(first)
+    assert [message.key for message in driver.extract_messages()] == first
+
+
+def test_element_mode_rejects_incremental_reads(open_driver):
+
+    web_driver, driver = open_chat(open_driver)
+    with pytest.raises(ValueError):
+        list(driver.get_current_chat_messages(
+            batch=False, incremental=True
+        ))
+    with pytest.raises(ValueError):
+        list(driver.find_chat('Ana').get_messages(
+            batch=False, incremental=True
+        ))
+
+
+def test_element_mode_reads_the_same_messages(open_driver):
+
+    # Only the page-side extractor computes keys
+    web_driver, driver = open_chat(open_driver)
+    batch = [dict(message.to_dict(), key=None)
+             for message in driver.extract_messages()]
+    elements = [message.to_dict()
+                for message in driver.extract_messages(batch=False)]
+    assert elements == batch
@@ -0,0 +1,96 @@
+from benchmarks.fake_webdriver import FakeChat, generated_pane_html, \
+    text_message_html
+from wspdriver.dedup import MemoryDedupStore, SQLiteDedupStore
+
+
+def bubble(text):
+    return '<span class="selectable-text">{}</span>'.format(text)
+
+
+def two_chats(open_driver, **options):
+
+    return open_driver([
+        FakeChat('Ana', '1', generated_pane_html('Ana', 3)),
+        FakeChat('Ben', '2', generated_pane_html('Ben', 3)),
+    ], **options)
+
+
+def test_duplicates_are_dropped_per_chat(open_driver):
+
+    web_driver, driver = two_chats(open_driver)
+    driver.find_chat('Ana').select()
+    messages = list(driver.extract_messages())
+
+    assert list(driver.ensure_no_duplicates(messages, 'Ana')) == messages
+    assert list(driver.ensure_no_duplicates(messages, 'Ana')) == []
+    # The same message in another chat is a different one
+    assert list(driver.ensure_no_duplicates(messages, 'Ben')) == messages
+
+
+def test_dedup_store_survives_the_driver(open_driver, tmp_path):
+
+    path = str(tmp_path / 'seen.db')
+    store = SQLiteDedupStore(path)
+    web_driver, driver = open_driver(dedup_store=store)
+    assert len(list(driver.get_unread_messages())) == 3
+    store.close()
+
+    store = SQLiteDedupStore(path)
+    web_driver, driver = open_driver(dedup_store=store)
+    assert list(driver.get_unread_messages()) == []
+    store.close()
+
+
+def watched(driver, count):
+
+    messages = []
+    for message in driver.watch_messages(wait=0.1):
+        messages.append(message)
+        if len(messages) == count:
+            break
+    return messages
+
+
+def test_watched_messages_are_deduped_under_their_chat(open_driver):
+
+    store = MemoryDedupStore()
+    web_driver, driver = two_chats(open_driver, dedup_store=store)
+    driver.find_chat('Ana').select()
+    driver.install_message_watcher()
+
+    # One message in the open chat; Ben turns unread, so the watcher opens
+    # it and picks up its whole pane
+    web_driver.receive_message('Ana', text_message_html(
+        'Ana', 30, bubble('Here')
+    ))
+    web_driver.receive_message('Ben', text_message_html(
+        'Ben', 30, bubble('There')
+    ))
+    messages = watched(driver, 5)
+
+    assert [(message.chat, message.text) for message in messages[:1]] == \
+        [('Ana', 'Here')]
+    assert [message.chat for message in messages[1:]] == ['Ben'] * 4
+    assert messages[-1].text == 'There'
+    for message in messages:
+        assert store.contains(message.chat, message.id)
+        other = 'Ben' if message.chat == 'Ana' else 'Ana'
+        assert not store.contains(other, message.id)
+
+
+def test_watcher_skips_messages_already_read(open_driver):
+
+    web_driver, driver = two_chats(open_driver)
+    driver.find_chat('Ana').select()
+    list(driver.get_unread_messages())
+    driver.install_message_watcher()
+
+    # Reopening Ana renders its pane again, old messages included
+    driver.find_chat('Ben').select()
+    driver.find_chat('Ana').select()
+    web_driver.receive_message('Ana', text_message_html(
+        'Ana', 30, bubble('Only this')
+    ))
+    messages = watched(driver, 4)
+    assert [(message.chat, message.text) for message in messages
+            if message.chat == 'Ana'] == [('Ana', 'Only this')]
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.bench_emoji_text import read_bubbles, reference_text
+from wspdriver.message import WSPTextMessage
+
+
+@pytest.mark.parametrize('html', read_bubbles())
+def test_matches_beautifulsoup(html):
+    assert WSPTextMessage.transform_emojis_to_text(html) == \
+        reference_text(html)
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from benchmarks.fake_webdriver import FakeChat, generated_messages_html, \
+    pane_html, text_message_html
+
+
+def history(open_driver, repeated=0, rendered=4):
+
+    # Older messages load four at a time. `repeated` identical "ok"s sent
+    # in the same minute share an id.
+    messages = generated_messages_html('Ana', 10)
+    ok = text_message_html(
+        'Ana', 100, '<span class="selectable-text">ok</span>'
+    )
+    messages = messages[:5] + [ok] * repeated + messages[5:]
+    web_driver, driver = open_driver([FakeChat(
+        'Ana', '1', pane_html('Ana', messages[-rendered:]),
+        history=messages[:-rendered]
+    )], history_page=4)
+    driver.find_chat('Ana').select()
+    return driver
+
+
+def read_lines(path):
+    with open(str(path), encoding='utf-8') as exported:
+        return exported.read().splitlines()
+
+
+def test_export_writes_every_message_newest_first(open_driver, tmp_path):
+
+    path = str(tmp_path / 'history.jsonl')
+    summary = history(open_driver).export_history(path, page_timeout=0.05)
+    records = [json.loads(line) for line in read_lines(path)]
+
+    assert summary['messages'] == len(records) == 10
+    assert summary['pages'] == 3
+    assert len(set(record['id'] for record in records)) == 10
+    assert [record['datetime'] for record in records if 'datetime' in
+            record] == sorted((record['datetime'] for record in records
+                               if 'datetime' in record), reverse=True)
+    assert set(record['chat'] for record in records) == {'Ana'}
+
+
+def test_export_stops_at_until(open_driver, tmp_path):
+
+    full = str(tmp_path / 'full.jsonl')
+    history(open_driver).export_history(full, page_timeout=0.05)
+    ids = [json.loads(line)['id'] for line in read_lines(full)]
+
+    path = str(tmp_path / 'new.jsonl')
+    summary = history(open_driver).export_history(
+        path, until=ids[6], page_timeout=0.05
+    )
+    assert summary['messages'] == 6
+    assert [json.loads(line)['id'] for line in read_lines(path)] == ids[:6]
+
+
+def test_resume_at_every_point(open_driver, tmp_path):
+
+    full = str(tmp_path / 'full.jsonl')
+    history(open_driver, repeated=4).export_history(full, page_timeout=0.05)
+    lines = read_lines(full)
+    assert len(lines) == 14
+
+    # Cut short anywhere, including between the identical messages
+    for written in range(1, len(lines)):
+        path = str(tmp_path / 'resumed-{}.jsonl'.format(written))
+        with open(path, 'w', encoding='utf-8') as partial:
+            partial.write('\n'.join(lines[:written]) + '\n')
+        summary = history(open_driver, repeated=4).export_history(
+            path, resume=True, page_timeout=0.05
+        )
+        assert summary['skipped'] == written
+        assert read_lines(path) == lines
+
+
+def test_resume_without_a_file_starts_fresh(open_driver, tmp_path):
+
+    path = str(tmp_path / 'missing.jsonl')
+    summary = history(open_driver).export_history(
+        path, resume=True, page_timeout=0.05
+    )
+    assert summary['skipped'] == 0
+    assert len(read_lines(path)) == 10
+
+
+def test_parquet_exports_can_not_resume(open_driver, tmp_path):
+
+    path = tmp_path / 'history.parquet'
+    path.write_bytes(b'not parquet')
+    with pytest.raises(ValueError):
+        history(open_driver).export_history(str(path), resume=True)
+    assert path.read_bytes() == b'not parquet'
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from wspdriver.async_driver import AsyncWhatsappDriver
+from wspdriver.instrumentation import Collector, timed_generator
+
+
+def test_driver_flows_with_hooks(open_driver):
+
+    collector = Collector()
+    web_driver, driver = open_driver(hooks=collector)
+    messages = [str(message) for message in driver.sweep_unread()]
+    driver.send_message('56933333333', 'Hooked')
+
+    assert len(messages) == 3
+    assert web_driver.sent == [('Alice', 'Hooked')]
+    summary = collector.summary()
+    for name in ('driver.sweep_unread', 'driver.search_steps',
+                 'driver.send_message', 'message.text',
+                 'message.parse_metadata', 'wait.search results'):
+        assert summary[name]['count'] >= 1, name
+    assert summary['driver.send_message']['errors'] == 0
+
+
+def test_async_search_with_hooks(open_driver):
+
+    web_driver, driver = open_driver(hooks=Collector())
+
+    async def send():
+        await AsyncWhatsappDriver(driver).send_message('Work', 'Hooked')
+
+    asyncio.run(send())
+    assert web_driver.sent == [('Work', 'Hooked')]
+
+
+def test_timed_generator_passes_values_through():
+
+    def steps():
+        try:
+            sent = yield 'first'
+            yield sent
+        except KeyError:
+            yield 'thrown'
+        return 'done'
+
+    collector = Collector()
+    generator = timed_generator(collector, 'test', 'steps', steps)()
+    assert next(generator) == 'first'
+    assert generator.send('sent') == 'sent'
+    assert generator.throw(KeyError()) == 'thrown'
+    with pytest.raises(StopIteration) as stop:
+        next(generator)
+    assert stop.value.value == 'done'
+    assert collector.summary()['test.steps']['count'] == 1
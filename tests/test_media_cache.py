@@ -0,0 +1,124 @@
+import os
+
+from benchmarks.fake_webdriver import FakeWebDriver
+from wspdriver.driver import WhatsappDriver
+from wspdriver.media_cache import MediaCache
+
+
+IMAGE = b'\xff\xd8image bytes'
+
+
+def age(cache, name, mtime):
+    path = cache.path_for(cache.key_for(name))
+    os.utime(path, (mtime, mtime))
+
+
+def test_memory_keeps_the_recently_used_within_budget():
+
+    cache = MediaCache(memory_budget=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+
+    # 'b' is now the least recently used
+    cache.put('c', b'cccc')
+    assert cache.memory_size == 8
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa' and cache.get('c') == b'cccc'
+
+    # Too big to keep at all
+    cache.put('d', b'd' * 11)
+    assert cache.get('d') is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_replacing_an_entry_counts_its_size_once():
+
+    cache = MediaCache(memory_budget=10)
+    cache.put('a', b'aaaa')
+    cache.put('a', b'aaaaaa')
+    assert cache.memory_size == 6
+    assert cache.get('a') == b'aaaaaa'
+
+
+def test_disk_evicts_the_least_recently_used(tmp_path):
+
+    cache = MediaCache(memory_budget=0, directory=str(tmp_path),
+                       disk_budget=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    age(cache, 'a', 1000)
+    age(cache, 'b', 2000)
+    cache.put('c', b'cccc')
+
+    assert cache.disk_size == 8
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        cache.key_for(name) for name in ('b', 'c')
+    )
+    assert cache.get('a') is None
+    assert cache.get('b') == b'bbbb'
+
+
+def test_disk_size_is_read_back(tmp_path):
+
+    cache = MediaCache(directory=str(tmp_path), disk_budget=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+
+    # A new cache on the same directory starts from its files, in memory
+    # too once read
+    reopened = MediaCache(directory=str(tmp_path), disk_budget=10)
+    assert reopened.disk_size == 8
+    assert reopened.get('a') == b'aaaa'
+    assert reopened.memory_size == 4
+
+    age(reopened, 'a', 1000)
+    age(reopened, 'b', 2000)
+    reopened.put('c', b'cccc')
+    assert reopened.disk_size == 8
+    assert not os.path.exists(reopened.path_for(reopened.key_for('a')))
+
+
+def image_driver(media_cache):
+
+    web_driver = FakeWebDriver(sleep=False, images={
+        'blob:image': IMAGE
+    })
+    return web_driver, WhatsappDriver(web_driver, media_cache=media_cache)
+
+
+def fetches(web_driver):
+    return web_driver.commands.get('execute_async_script', 0)
+
+
+def test_image_bytes_are_fetched_once():
+
+    cache = MediaCache()
+    web_driver, driver = image_driver(cache)
+    assert driver.get_image_bytes('blob:image', 'id1') == IMAGE
+    assert driver.get_image_bytes('blob:image', 'id1') == IMAGE
+    assert fetches(web_driver) == 1
+    assert cache.get('id1') == IMAGE
+
+    # Without a key the URL is the key
+    driver.get_image_bytes('blob:image')
+    assert fetches(web_driver) == 2
+    assert cache.get('blob:image') == IMAGE
+
+
+def test_saved_images_come_from_the_cache(tmp_path):
+
+    cache = MediaCache(directory=str(tmp_path / 'cache'))
+    web_driver, driver = image_driver(cache)
+    for name in ('first.jpg', 'second.jpg'):
+        driver.save_image('blob:image', str(tmp_path / name), 'id1')
+        with open(str(tmp_path / name), 'rb') as image_file:
+            assert image_file.read() == IMAGE
+    assert fetches(web_driver) == 1
+
+    # Another driver on the same directory reads it from disk
+    web_driver, driver = image_driver(
+        MediaCache(directory=str(tmp_path / 'cache'))
+    )
+    driver.save_image('blob:image', str(tmp_path / 'third.jpg'), 'id1')
+    assert fetches(web_driver) == 0
@@ -0,0 +1,113 @@
+import copy
+
+import pytest
+
+from benchmarks.fake_webdriver import FakeChat, FakeElement, \
+    generated_pane_html
+from tests.page import NODE, PageWebDriver
+from wspdriver.driver import WhatsappDriver
+from wspdriver.session import LOGGED_IN, LOGGED_OUT
+from wspdriver.sweep import BatchedSweep
+
+
+# The injected scripts themselves, checked against the fake's emulation
+pytestmark = pytest.mark.skipif(
+    NODE is None, reason='node is needed to run the injected scripts'
+)
+
+
+@pytest.fixture
+def page():
+
+    web_driver = PageWebDriver(sleep=False)
+    yield web_driver, WhatsappDriver(web_driver)
+    web_driver.quit()
+
+
+@pytest.mark.parametrize('title', ['Family', 'Work', 'Alice'])
+def test_extraction_matches_the_emulation(page, title):
+
+    web_driver, driver = page
+    driver.find_chat(title).select()
+    selector = driver.selectors.MESSAGES_SELECTOR
+    parts = driver.selectors.message_parts()
+
+    extracted = [
+        message.data for message in driver.extract_messages()
+    ]
+    # Same payloads, keys (the page's string hash) included
+    assert extracted == web_driver.messages_data(selector, None, parts)
+    assert extracted
+
+
+def test_read_script_reports_stale_and_unopened_chats(page):
+
+    web_driver, driver = page
+    driver.chat_index.refresh()
+    work = driver.chat_index.lookup('Work')
+    detached = FakeElement(web_driver, copy.copy(work.element.tag))
+    selectors = driver.selectors
+
+    results = web_driver.execute_async_script(
+        BatchedSweep.READ_SCRIPT,
+        {
+            'header': selectors.CHAT_HEADER_TITLE_SELECTOR,
+            'messages': selectors.MESSAGES_SELECTOR,
+            'incoming': selectors.INCOMING_MESSAGES_SELECTOR,
+            'parts': selectors.message_parts(),
+        },
+        [
+            {'element': detached, 'title': 'Work', 'cursor': None,
+             'limit': None},
+            # The header never shows this title
+            {'element': work.element, 'title': 'Not Work', 'cursor': None,
+             'limit': None},
+            {'element': work.element, 'title': 'Work', 'cursor': None,
+             'limit': 1},
+        ],
+        200
+    )
+    assert results[0] == {'title': 'Work', 'error': 'stale'}
+    assert results[1] == {'title': 'Not Work', 'error': 'timeout'}
+    assert [data['key'] for data in results[2]['messages']] == [
+        message.key for message in driver.extract_messages()
+    ][-1:]
+
+
+def test_session_state_follows_the_page():
+
+    web_driver = PageWebDriver(sleep=False, logged_in=False)
+    driver = WhatsappDriver(web_driver)
+    try:
+        assert driver.session.refresh() == LOGGED_OUT
+        assert driver.session.wait_for_change(0.05) == LOGGED_OUT
+
+        # The app swaps the login screen for the chats without a reload
+        web_driver.log_in()
+        assert driver.session.wait_for_change(5) == LOGGED_IN
+        assert driver.is_logged_in()
+    finally:
+        web_driver.quit()
+
+
+def test_reload_reinstalls_the_watcher():
+
+    web_driver = PageWebDriver(
+        [FakeChat('Ana', '1', generated_pane_html('Ana', 3))], sleep=False
+    )
+    driver = WhatsappDriver(web_driver)
+    try:
+        assert driver.install_message_watcher()
+        web_driver.get(driver.WHATSAPP_URL)
+        assert web_driver.execute_async_script(
+            driver.DRAIN_WATCHER_SCRIPT, 10, 0
+        ) is None
+        assert driver.install_message_watcher()
+        driver.find_chat('Ana').select()
+        events = web_driver.execute_async_script(
+            driver.DRAIN_WATCHER_SCRIPT, 10, 0
+        )
+        assert [(event['type'], event['chat']) for event in events] == \
+            [('message', 'Ana')] * 3
+    finally:
+        web_driver.quit()
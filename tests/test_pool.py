@@ -0,0 +1,162 @@
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, \
+    TimeoutException, WebDriverException
+
+from benchmarks.fake_webdriver import FakeChat, FakeWebDriver
+from wspdriver.driver import WhatsappDriver
+from wspdriver.pool import DriverPool, SendError, UnknownAccountException
+
+
+class ProbedWebDriver(FakeWebDriver):
+
+    # Stops answering once `dead`, like a crashed browser
+    dead = False
+
+    @property
+    def current_url(self):
+        if self.dead:
+            raise WebDriverException('chrome not reachable')
+        return self.url
+
+
+class FailingDriver(WhatsappDriver):
+
+    # Fails every send with `send_error`, and the first poll with
+    # `poll_error`; a failure kills the browser if `kills`
+    send_error = None
+    poll_error = None
+    kills = False
+
+    def type_message(self, message):
+        if self.send_error is None:
+            return super(FailingDriver, self).type_message(message)
+        self.web_driver.dead = self.kills
+        raise self.send_error
+
+    def get_unread_messages(self, batch=None):
+        error, self.poll_error = self.poll_error, None
+        if error is not None:
+            self.web_driver.dead = self.kills
+            raise error
+        return super(FailingDriver, self).get_unread_messages(batch)
+
+
+PROFILES = {
+    'recorded': {},
+    'no-alice': {'chats': 'no-alice'},
+    'missing-input': {'send_error': NoSuchElementException('input')},
+    'crashing': {'send_error': WebDriverException('disconnected'),
+                 'kills': True},
+    'slow-poll': {'poll_error': TimeoutException('chat list')},
+}
+
+
+def start_fake(chrome_driver_path, profile, headless):
+
+    # The pool's start_driver, in the worker process
+    options = dict(PROFILES[profile])
+    chats = FakeChat.recorded()
+    if options.pop('chats', None) == 'no-alice':
+        chats = [chat for chat in chats if chat.title != 'Alice']
+    driver = FailingDriver(ProbedWebDriver(chats, sleep=False))
+    for name, value in options.items():
+        setattr(driver, name, value)
+    return driver
+
+
+@pytest.fixture
+def start_pool():
+
+    pools = []
+
+    def start_pool(**accounts):
+        pool = DriverPool(
+            None, accounts, poll_interval=0.05, restart_delay=0.1,
+            start_driver=start_fake
+        )
+        pools.append(pool)
+        pool.start()
+        return pool
+
+    yield start_pool
+    for pool in pools:
+        pool.stop()
+
+
+def wait_until(condition, timeout=10):
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+def test_sends_are_routed_by_account(start_pool):
+
+    pool = start_pool(first='recorded', second='no-alice')
+    sent = pool.send_message('first', '56933333333', 'Hi')
+    missing = pool.send_message('second', '56933333333', 'Hi')
+
+    assert sent.result(10) is True
+    with pytest.raises(SendError) as error:
+        missing.result(10)
+    assert 'ConversationNotFoundError' in str(error.value)
+    with pytest.raises(UnknownAccountException):
+        pool.send_message('third', '56933333333', 'Hi')
+
+    summary = pool.summary()
+    assert summary['first']['messages_sent'] == 1
+    assert summary['second']['send_errors'] == 1
+
+
+def test_messages_from_every_account(start_pool):
+
+    pool = start_pool(first='recorded', second='recorded')
+    received = []
+    for account, record in pool.messages(timeout=10):
+        received.append((account, record.chat))
+        if len(received) == 6:
+            break
+    assert sorted(received) == sorted(
+        [(account, chat) for account in ('first', 'second')
+         for chat in ('Work', 'Work', 'Alice')]
+    )
+
+
+def test_element_errors_fail_the_send_only(start_pool):
+
+    pool = start_pool(first='missing-input')
+    with pytest.raises(SendError) as error:
+        pool.send_message('first', '56933333333', 'Hi').result(10)
+    assert 'NoSuchElementException' in str(error.value)
+
+    # The browser keeps serving
+    with pytest.raises(SendError):
+        pool.send_message('first', '56933333333', 'Again').result(10)
+    summary = pool.summary()['first']
+    assert summary['restarts'] == 0 and summary['alive']
+
+
+def test_poll_errors_keep_the_browser(start_pool):
+
+    pool = start_pool(first='slow-poll')
+    wait_until(lambda: pool.stats['first'].messages_received == 3)
+    summary = pool.summary()['first']
+    assert summary['poll_errors'] == 1
+    assert summary['restarts'] == 0 and summary['alive']
+
+
+def test_dead_browser_fails_the_send_and_restarts(start_pool):
+
+    pool = start_pool(first='crashing')
+    with pytest.raises(SendError) as error:
+        pool.send_message('first', '56933333333', 'Hi').result(10)
+    assert 'disconnected' in str(error.value)
+
+    wait_until(lambda: pool.stats['first'].restarts == 1)
+    wait_until(lambda: pool.summary()['first']['alive'])
+    # The restarted browser takes sends again
+    with pytest.raises(SendError):
+        pool.send_message('first', '56933333333', 'Hi').result(10)
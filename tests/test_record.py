@@ -0,0 +1,116 @@
+import pickle
+from datetime import datetime
+
+import pytest
+
+from wspdriver.message import WhatsappMessage
+from wspdriver.record import MessageRecord, decode_records, \
+    encode_records, stable_id
+
+
+RECORDS = [
+    MessageRecord(
+        stable_id('[12:05, 18/10/2017] Ana: ', 'Hola ñandú 👋'), 'text',
+        True, datetime(2017, 10, 18, 12, 5), 'Ana', '1a2b:40', 'Ana',
+        'Hola ñandú 👋'
+    ),
+    MessageRecord(
+        2 ** 64 - 1, 'image', chat='Work', key='3c4d:52',
+        thumbnail='blob:https://web.whatsapp.com/1', time='12:06'
+    ),
+    # An empty string is not a missing field
+    MessageRecord(3, 'text', datetime=datetime(1969, 12, 31, 23, 59),
+                  chat='', author_name='', text=''),
+    MessageRecord(4, 'system'),
+]
+
+
+@pytest.mark.parametrize('record', RECORDS)
+def test_encode_round_trip(record):
+
+    decoded = MessageRecord.decode(record.encode())
+    assert decoded == record
+    assert [type(value) for value in decoded] == \
+        [type(value) for value in record]
+    assert pickle.loads(pickle.dumps(decoded)) == record
+
+
+def test_empty_strings_and_none_stay_apart():
+
+    decoded = MessageRecord.decode(RECORDS[2].encode())
+    assert (decoded.chat, decoded.author_name, decoded.text) == ('', '', '')
+    assert decoded.key is None and decoded.thumbnail is None
+    assert decoded.to_dict() == {
+        'id': 3, 'type': 'text', 'is_outbound': False,
+        'datetime': '1969-12-31T23:59:00', 'chat': '', 'author_name': '',
+        'text': ''
+    }
+
+
+def test_records_decode_back_to_back():
+
+    data = encode_records(RECORDS)
+    assert list(decode_records(data)) == RECORDS
+    assert list(decode_records(bytearray(data))) == RECORDS
+    assert list(decode_records(b'')) == []
+
+    # decode_from walks the same buffer by offset
+    offset, decoded = 0, []
+    while offset < len(data):
+        record, offset = MessageRecord.decode_from(data, offset)
+        decoded.append(record)
+    assert decoded == RECORDS and offset == len(data)
+
+
+def message(classes, **data):
+
+    data = dict({
+        'classes': 'message ' + classes, 'metadata': None, 'html': None,
+        'thumbnail': None, 'time': None, 'gif': None, 'key': 'ab12:30'
+    }, **data)
+    return WhatsappMessage.build_from_data(data, None, chat='Ana')
+
+
+def test_text_to_record():
+
+    text = message(
+        'message-chat message-out',
+        metadata='[12:05, 18/10/2017] Ana: ',
+        html='<span class="selectable-text">Hola &amp; '
+             '<img alt="x" data-plain-text="👋" src="e.png"></span>'
+    )
+    record = text.to_record()
+    assert record == MessageRecord(
+        stable_id('[12:05, 18/10/2017] Ana: ', 'Hola & 👋'), 'text', True,
+        datetime(2017, 10, 18, 12, 5), 'Ana', 'ab12:30', 'Ana', 'Hola & 👋'
+    )
+    assert text.to_record(chat='Other').chat == 'Other'
+    assert MessageRecord.decode(record.encode()) == record
+
+
+def test_image_to_record():
+
+    image = message('message-image message-in',
+                    thumbnail='blob:https://web.whatsapp.com/1',
+                    time='12:06')
+    record = image.to_record()
+    assert record == MessageRecord(
+        stable_id('blob:https://web.whatsapp.com/1', '12:06'), 'image',
+        False, chat='Ana', key='ab12:30',
+        thumbnail='blob:https://web.whatsapp.com/1', time='12:06'
+    )
+    assert MessageRecord.decode(record.encode()) == record
+
+
+@pytest.mark.parametrize('classes,kind', [
+    ('message-gif message-out', 'gif'),
+    ('message-system', 'system'),
+])
+def test_keyed_to_record(classes, kind):
+
+    record = message(classes).to_record()
+    assert record == MessageRecord(
+        stable_id('ab12:30'), kind, kind == 'gif', chat='Ana',
+        key='ab12:30'
+    )
+    assert MessageRecord.decode(record.encode()) == record
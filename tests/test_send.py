@@ -0,0 +1,178 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.fake_webdriver import FakeChat, generated_pane_html
+from wspdriver.async_driver import AsyncWhatsappDriver
+from wspdriver.driver import ConversationNotFoundError, \
+    WrongConversationError
+from wspdriver.send_queue import SendQueue
+
+
+def test_send_by_number_and_title(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.send_message('56933333333', 'By number')
+    driver.send_message('Work', 'By title')
+
+    assert web_driver.sent == [('Alice', 'By number'), ('Work', 'By title')]
+    assert driver.conversation_titles == {
+        '56933333333': 'Alice',
+        'Work': 'Work',
+    }
+    assert driver.get_current_chat_title() == 'Work'
+
+
+def test_unknown_number_sends_nothing(open_driver):
+
+    web_driver, driver = open_driver()
+    with pytest.raises(ConversationNotFoundError):
+        driver.send_message('56900000000', 'Lost')
+    assert web_driver.sent == []
+    assert driver.active_conversation is None
+
+
+def test_open_conversation_remembers_the_chat(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.open_conversation('56922222222')
+    assert driver.active_conversation == '56922222222'
+    assert driver.find_chat('56922222222').name == 'Work'
+
+    # Already open: nothing to search
+    web_driver.reset_counters()
+    driver.ensure_conversation('56922222222')
+    assert 'send_keys' not in web_driver.commands
+
+
+def test_direct_open_reuses_the_chat_handle(open_driver):
+
+    web_driver, driver = open_driver(direct_open=True)
+    driver.send_message('56933333333', 'First')
+    driver.find_chat('Family').select()
+    driver.send_message('56933333333', 'Second')
+
+    # One deep link after the initial load, then the cached handle
+    assert web_driver.commands['get'] == 2
+    assert web_driver.sent == [('Alice', 'First'), ('Alice', 'Second')]
+
+
+def test_send_queue_batches_per_recipient(open_driver):
+
+    web_driver, driver = open_driver()
+    queue = SendQueue(driver, rate=100, burst=10)
+    futures = [
+        queue.put('56933333333', 'One'),
+        queue.put('Work', 'Two'),
+        queue.put('56933333333', 'Three'),
+    ]
+    queue.flush()
+
+    assert [future.result(0) for future in futures] == [True] * 3
+    assert web_driver.sent == [
+        ('Alice', 'One'), ('Alice', 'Three'), ('Work', 'Two')
+    ]
+    assert len(queue) == 0
+
+
+def test_send_queue_thread_shares_the_driver(open_driver):
+
+    web_driver, driver = open_driver()
+    queue = SendQueue(driver, rate=100, burst=100)
+    queue.start()
+    try:
+        futures = [queue.put('56933333333', str(i)) for i in range(10)]
+        messages = list(driver.sweep_unread())
+        assert [future.result(10) for future in futures] == [True] * 10
+    finally:
+        queue.stop()
+
+    assert [text for _, text in web_driver.sent] == \
+        [str(i) for i in range(10)]
+    assert set(chat for chat, _ in web_driver.sent) == {'Alice'}
+    assert messages
+
+
+def test_async_send_shares_the_search_flow(open_driver):
+
+    web_driver, driver = open_driver()
+
+    async def send():
+        async_driver = AsyncWhatsappDriver(driver)
+        await async_driver.send_message('56933333333', 'Async')
+        with pytest.raises(ConversationNotFoundError):
+            await async_driver.send_message('56900000000', 'Lost')
+
+    asyncio.run(send())
+    assert web_driver.sent == [('Alice', 'Async')]
+    assert driver.conversation_titles['56933333333'] == 'Alice'
+
+
+def prefixed_chats(open_driver, **options):
+
+    return open_driver([
+        FakeChat('Ana Maria', '56911111111',
+                 generated_pane_html('Ana Maria', 2)),
+        FakeChat('Ana', '56922222222', generated_pane_html('Ana', 2)),
+    ], wait_timeout=0.2, **options)
+
+
+def test_confirm_needs_the_exact_title(open_driver):
+
+    web_driver, driver = prefixed_chats(open_driver)
+    driver.find_chat('Ana Maria').select()
+    driver.conversation_titles['56922222222'] = 'Ana'
+    driver.active_conversation = '56922222222'
+
+    with pytest.raises(WrongConversationError):
+        driver.ensure_conversation('56922222222')
+    assert driver.active_conversation is None
+
+    driver.send_message('56922222222', 'To Ana')
+    assert web_driver.sent == [('Ana', 'To Ana')]
+
+
+def test_recycled_handle_is_not_trusted(open_driver):
+
+    web_driver, driver = prefixed_chats(open_driver, direct_open=True)
+    driver.send_message('56922222222', 'First')
+    # The list reused the element for a chat whose title contains "Ana"
+    driver.chat_handles['56922222222'] = \
+        driver.find_chat('Ana Maria').chat_element
+
+    driver.send_message('56922222222', 'Second')
+    assert web_driver.sent == [('Ana', 'First'), ('Ana', 'Second')]
+
+
+def test_async_send_waits_for_the_driver_lock(open_driver):
+
+    web_driver, driver = open_driver()
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        # Like a SendQueue flushing on its own thread
+        with driver.ui_lock:
+            held.set()
+            release.wait(10)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(10)
+
+    async def send():
+        task = asyncio.ensure_future(
+            AsyncWhatsappDriver(driver).send_message('Work', 'Later')
+        )
+        web_driver.reset_counters()
+        await asyncio.sleep(0.2)
+        assert web_driver.round_trips == 0
+        release.set()
+        await task
+
+    try:
+        asyncio.run(send())
+    finally:
+        release.set()
+        holder.join()
+    assert web_driver.sent == [('Work', 'Later')]
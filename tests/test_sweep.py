@@ -0,0 +1,121 @@
+import pytest
+
+from benchmarks.fake_webdriver import FakeChat, generated_pane_html, \
+    text_message_html
+from wspdriver.chat import WrongConversationError
+
+
+def bubble(text):
+    return '<span class="selectable-text">{}</span>'.format(text)
+
+
+@pytest.mark.parametrize('batch', [None, 1, 4])
+def test_sweep_reads_every_unread_chat(open_driver, batch):
+
+    web_driver, driver = open_driver()
+    sweep = driver.sweep_unread(batch=batch)
+    messages = list(sweep)
+
+    # Work has two unread messages and Alice one
+    assert [message.chat for message in messages] == \
+        ['Work', 'Work', 'Alice']
+    assert sweep.summary()['chats'] == 2
+    assert sweep.unread == len(messages) == 3
+    assert driver.unread_chat_entries() == []
+
+
+def test_batched_sweep_matches_unbatched(open_driver):
+
+    read = []
+    for batch in (None, 8):
+        web_driver, driver = open_driver()
+        read.append([str(message) for message in
+                     driver.sweep_unread(batch=batch)])
+    assert read[0] == read[1]
+
+
+@pytest.mark.parametrize('order, titles', [
+    ('most', ['Work', 'Alice']),
+    ('list', ['Work', 'Alice']),
+    ('oldest', ['Alice', 'Work']),
+])
+def test_sweep_order(open_driver, order, titles):
+
+    web_driver, driver = open_driver()
+    chats = [message.chat for message in driver.sweep_unread(order=order)]
+    assert sorted(set(chats), key=chats.index) == titles
+
+
+def test_sweep_without_tail_reads_the_whole_pane(open_driver):
+
+    web_driver, driver = open_driver([
+        FakeChat('Ana', '1', generated_pane_html('Ana', 5), unread=2)
+    ])
+    assert len(list(driver.sweep_unread(tail=False))) == 5
+
+
+@pytest.mark.parametrize('batch', [None, 4])
+def test_next_sweep_reads_only_new_messages(open_driver, batch):
+
+    web_driver, driver = open_driver()
+    list(driver.sweep_unread(batch=batch))
+    driver.find_chat('Family').select()
+
+    web_driver.receive_message('Work', text_message_html(
+        'Pedro', 30, bubble('Later')
+    ))
+    messages = list(driver.sweep_unread(batch=batch))
+    assert [(message.chat, message.text) for message in messages] == \
+        [('Work', 'Later')]
+    assert list(driver.sweep_unread(batch=batch)) == []
+
+
+def test_unread_messages_include_the_open_chat(open_driver):
+
+    web_driver, driver = open_driver()
+    driver.find_chat('Family').select()
+    first = [message.chat for message in driver.get_unread_messages()]
+    assert first.count('Family') == len(first) - 3
+
+    web_driver.receive_message('Family', text_message_html(
+        'Ana', 30, bubble('New here')
+    ))
+    messages = list(driver.get_unread_messages())
+    assert [(message.chat, message.text) for message in messages] == \
+        [('Family', 'New here')]
+
+
+def stuck_chat(open_driver):
+
+    # "Family" never opens, and "Family group" shares its prefix
+    web_driver, driver = open_driver([
+        FakeChat('Family group', '1', generated_pane_html('Family group', 3)),
+        FakeChat('Family', '2', generated_pane_html('Family', 3), unread=1),
+        FakeChat('Ana', '3', generated_pane_html('Ana', 3), unread=1),
+    ], wait_timeout=0.2)
+    open_chat = web_driver.open_chat
+    web_driver.open_chat = lambda chat: None if chat.title == 'Family' \
+        else open_chat(chat)
+    driver.find_chat('Family group').select()
+    return web_driver, driver
+
+
+def test_select_needs_the_exact_header(open_driver):
+
+    web_driver, driver = stuck_chat(open_driver)
+    with pytest.raises(WrongConversationError):
+        list(driver.find_chat('Family').get_messages(incremental=True))
+    assert 'Family' not in driver.chat_cursors
+
+
+@pytest.mark.parametrize('batch', [None, 4])
+def test_sweep_skips_a_chat_that_does_not_open(open_driver, batch):
+
+    web_driver, driver = stuck_chat(open_driver)
+    sweep = driver.sweep_unread(batch=batch)
+    messages = list(sweep)
+
+    assert [message.chat for message in messages] == ['Ana']
+    assert 'Family' not in driver.chat_cursors
+    assert [entry.title for entry in driver.unread_chat_entries()] == \
+        ['Family']
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from selenium.common.exceptions import TimeoutException
+
+from wspdriver.driver import WhatsappDriver, NotLoggedInException, \
+    LoginTimeoutError
+from wspdriver.session import LOGGED_IN
+
+
+class AsyncWhatsappDriver(object):
+
+    """Coroutine front-end for WhatsappDriver.
+
+    Selenium is not thread safe, so every WebDriver call runs on a single
+    dedicated executor thread. Multi-step UI flows (sending, opening chats,
+    reading profiles) also hold `ui_lock` so they never interleave, and
+    the ones made of several executor calls hold the driver's own
+    `ui_lock` on that thread throughout, so a SendQueue flushing on
+    another thread can't interleave with them either.
+    """
+
+    @classmethod
+    async def start(cls, chrome_driver_path, chrome_data_path, headless=True):
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        driver = await asyncio.get_running_loop().run_in_executor(
+            executor,
+            partial(
+                WhatsappDriver.start,
+                chrome_driver_path,
+                chrome_data_path,
+                headless=headless
+            )
+        )
+        return cls(driver, executor)
+
+    def __init__(self, driver, executor=None, poll_interval=0.1):
+
+        self.driver = driver
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.poll_interval = poll_interval
+        self.ui_lock = asyncio.Lock()
+
+    async def run(self, function, *args, **kwargs):
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            partial(function, *args, **kwargs)
+        )
+
+    @asynccontextmanager
+    async def driver_lock(self):
+
+        # The executor's only thread takes and releases it, so it is held
+        # across the calls in between
+        await self.run(self.driver.ui_lock.acquire)
+        try:
+            yield
+        finally:
+            await self.run(self.driver.ui_lock.release)
+
+    async def wait_for(self, condition, timeout=10):
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            result = await self.run(condition)
+            if result:
+                return result
+            if loop.time() >= deadline:
+                raise TimeoutException(
+                    'Condition not met after {} seconds'.format(timeout)
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def settle(self, condition, name, timeout=None):
+
+        waits = self.driver.waits
+        start = time.perf_counter()
+        try:
+            return await self.wait_for(
+                partial(condition, self.driver.web_driver),
+                timeout=waits.timeout if timeout is None else timeout
+            )
+        except TimeoutException:
+            return False
+        finally:
+            waits.record(name, time.perf_counter() - start)
+
+    async def quit(self):
+
+        self.driver.stop()
+        await self.run(self.driver.quit)
+        self.executor.shutdown(wait=False)
+
+    async def is_logged_in(self):
+
+        return await self.run(self.driver.is_logged_in)
+
+    async def wait_for_login(self, timeout=None):
+
+        # Waits in the page a chunk at a time, so the executor isn't held
+        # for the whole login and cancelling the task takes effect
+        session = self.driver.session
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        state = await self.run(session.refresh)
+        while state != LOGGED_IN:
+            remaining = session.WAIT_CHUNK
+            if deadline is not None:
+                remaining = min(remaining, deadline - loop.time())
+                if remaining <= 0:
+                    raise LoginTimeoutError(
+                        '{} seconds passed'.format(timeout)
+                    )
+            state = await self.run(session.wait_for_change, remaining)
+
+    async def get_user_data(self):
+
+        async with self.ui_lock:
+            return await self.run(self.driver.get_user_data)
+
+    async def get_image(self, image_url):
+
+        async with self.ui_lock:
+            return await self.run(self.driver.get_image, image_url)
+
+    async def open_conversation(self, phone_number):
+
+        if self.driver.direct_open:
+            return await self.run(self.driver.open_conversation, phone_number)
+
+        if not await self.is_logged_in():
+            raise NotLoggedInException()
+
+        async with self.driver_lock():
+            self.driver.active_conversation = None
+            title = await self.run_steps(
+                self.driver.search_steps(phone_number)
+            )
+            await self.run(
+                self.driver.remember_conversation, phone_number, title
+            )
+            self.driver.active_conversation = phone_number
+
+    async def run_steps(self, steps):
+
+        # Runs one of the driver's step flows (see search_steps) on the
+        # executor, awaiting its waits here so the executor stays free
+        done, value = await self.run(self.driver.advance, steps)
+        while not done:
+            condition, name = value
+            result = await self.settle(condition, name)
+            done, value = await self.run(self.driver.advance, steps, result)
+        return value
+
+    async def send_message(self, phone_number, message):
+
+        async with self.ui_lock, self.driver_lock():
+            await self.open_conversation(phone_number)
+            await self.run(self.driver.confirm_conversation, phone_number)
+            await self.run(self.driver.type_message, message)
+
+    async def iterate(self, generator):
+
+        sentinel = object()
+        while True:
+            async with self.ui_lock:
+                item = await self.run(next, generator, sentinel)
+            if item is sentinel:
+                return
+            yield item
+
+    def get_unread_messages(self):
+
+        return self.iterate(self.driver.get_unread_messages())
+
+    def watch_messages(self, wait=5, batch_size=100):
+
+        return self.iterate(self.driver.watch_messages(wait, batch_size))
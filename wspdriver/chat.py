@@ -1,41 +1,70 @@
-import time
 from selenium.common.exceptions import WebDriverException
 
-from wspdriver.message import WhatsappMessage
+from wspdriver.instrumentation import instrument
+from wspdriver.wait import ScrollSettled
 
 
 class WhatsAppChat(object):
 
-    def __init__(self, chat_element, whatsapp_driver):
+    def __init__(self, chat_element, whatsapp_driver, name=None):
         self.chat_element = chat_element
         self.whatsapp_driver = whatsapp_driver
         self.web_driver = whatsapp_driver.web_driver
+        self._name = name
+        if whatsapp_driver.hooks is not None:
+            instrument(self, whatsapp_driver.hooks, 'chat')
 
     def select(self):
 
+        waits = self.whatsapp_driver.waits
         self.web_driver.execute_script(
             'arguments[0].scrollIntoView()',
             self.chat_element
         )
-        time.sleep(0.2)  # Scroll...
+        waits.settle(ScrollSettled(self.chat_element), 'chat list scroll')
+        name = self.name
+        self.whatsapp_driver.active_conversation = None
         try:
             self.chat_element.click()
         except WebDriverException as e:
-            print(self.name)
+            print(name)
             raise e
+        # Until the header shows this chat, the pane is still the previous
+        # one's
+        if not waits.settle(
+                self.whatsapp_driver.chat_header_matches(name, exact=True),
+                'chat header'
+        ):
+            raise WrongConversationError('Expected chat {!r}'.format(name))
 
-    def get_messages(self):
+    def get_messages(self, batch=True, incremental=False, limit=None):
 
+        if incremental and not batch:
+            raise ValueError('Incremental reads need batch extraction')
         self.select()
         self.whatsapp_driver.ensure_scroll_to_chat_bottom()
-        messages = self.web_driver.find_elements_by_css_selector(
-            '.pane-chat-msgs .message'
+        yield from self.whatsapp_driver.extract_messages(
+            batch,
+            self.name if incremental else None,
+            limit
         )
-        for message_element in messages:
-            yield WhatsappMessage.build(message_element, self.whatsapp_driver)
+
+    @property
+    def cursor(self):
+        return self.whatsapp_driver.chat_cursors.get(self.name)
+
+    @cursor.setter
+    def cursor(self, message_key):
+        self.whatsapp_driver.chat_cursors[self.name] = message_key
 
     @property
     def name(self):
-        return self.chat_element.find_element_by_css_selector(
-            '.chat-title'
-        ).text
+        if self._name is None:
+            self._name = self.chat_element.find_element_by_css_selector(
+                self.whatsapp_driver.selectors.CHAT_TITLE_SELECTOR
+            ).text
+        return self._name
+
+
+class WrongConversationError(Exception):
+    pass
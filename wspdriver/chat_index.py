@@ -0,0 +1,225 @@
+import re
+
+from wspdriver.chat import WhatsAppChat
+
+
+def digits(text):
+    return re.sub(r'\D', '', text or '')
+
+
+class ChatEntry(object):
+
+    def __init__(self, data):
+
+        self.key = data['key']
+        self.title = data['title']
+        self.unread = data['unread']
+        self.preview = data['preview']
+        self.time = data['time']
+        self.active = data['active']
+        self.position = data['position']
+        self.element = data['element']
+
+    def __repr__(self):
+        return '<ChatEntry {!r} unread={}>'.format(self.title, self.unread)
+
+
+class ChatDiff(object):
+
+    def __init__(self, added, changed, removed, full=False):
+
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.full = full
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+class ChatIndex(object):
+
+    """Snapshot of the chat list, kept current one script call at a time.
+
+    An observer in the page marks the list dirty when it changes; the next
+    `refresh` then rescans it in the page and only sends back the entries
+    that were added, changed or removed since the previous one.
+    """
+
+    # Resolves to {full, added: [entry], changed: [entry], removed: [key]};
+    # `full` when the page lost the previous snapshot (e.g. it reloaded)
+    REFRESH_SCRIPT = '''
+        var s = arguments[0];
+        var full = arguments[1];
+        var index = window.wspdriverChatIndex;
+        if (!index || full) {
+            full = true;
+            index = window.wspdriverChatIndex = {
+                entries: {},
+                dirty: true,
+                root: null
+            };
+        }
+        var root = document.querySelector(s.root);
+        if (root !== index.root) {
+            // The side pane is rebuilt on login or reload
+            index.root = root;
+            index.dirty = true;
+            if (index.observer) {
+                index.observer.disconnect();
+            }
+            if (root) {
+                index.observer = new MutationObserver(function () {
+                    index.dirty = true;
+                });
+                index.observer.observe(root, {
+                    childList: true,
+                    subtree: true,
+                    characterData: true,
+                    attributes: true,
+                    attributeFilter: ['class', 'title']
+                });
+            }
+        }
+        var result = {full: full, added: [], changed: [], removed: []};
+        if (!index.dirty) {
+            return result;
+        }
+        index.dirty = !root;
+
+        var text = function (chat, selector) {
+            var element = chat.querySelector(selector);
+            return element ? element.innerText : '';
+        };
+        var entries = {};
+        var seen = {};
+        var chats = root ? root.querySelectorAll(s.chat) : [];
+        Array.prototype.forEach.call(chats, function (chat, position) {
+            var title = text(chat, s.title);
+            // Chats with the same name get an ordinal
+            seen[title] = (seen[title] || 0) + 1;
+            var key = seen[title] > 1 ? title + '#' + seen[title] : title;
+            var unread = parseInt(text(chat, s.unread), 10);
+            var entry = {
+                key: key,
+                title: title,
+                unread: unread || (chat.matches(s.unreadChat) ? 1 : 0),
+                preview: text(chat, s.preview),
+                time: text(chat, s.time),
+                active: chat.matches(s.activeChat),
+                position: position,
+                element: chat
+            };
+            entries[key] = entry;
+            var previous = index.entries[key];
+            if (!previous) {
+                result.added.push(entry);
+            } else if (previous.element !== chat ||
+                    previous.unread !== entry.unread ||
+                    previous.preview !== entry.preview ||
+                    previous.time !== entry.time ||
+                    previous.active !== entry.active ||
+                    previous.position !== entry.position) {
+                result.changed.push(entry);
+            }
+        });
+        Object.keys(index.entries).forEach(function (key) {
+            if (!entries[key]) {
+                result.removed.push(key);
+            }
+        });
+        index.entries = entries;
+        return result;
+    '''
+
+    def __init__(self, whatsapp_driver):
+
+        self.whatsapp_driver = whatsapp_driver
+        self.entries = {}
+        self.by_title = {}
+        self.by_number = {}
+        self.refreshed = False
+
+    def selectors(self):
+
+        selectors = self.whatsapp_driver.selectors
+        return {
+            'root': selectors.SIDE_PANE_SELECTOR,
+            'chat': selectors.CHAT_SELECTOR,
+            'title': selectors.CHAT_TITLE_SELECTOR,
+            'unread': selectors.CHAT_UNREAD_COUNT_SELECTOR,
+            'preview': selectors.CHAT_PREVIEW_SELECTOR,
+            'time': selectors.CHAT_TIME_SELECTOR,
+            'unreadChat': selectors.UNREAD_CHAT_SELECTOR,
+            'activeChat': selectors.ACTIVE_CHAT_SELECTOR,
+        }
+
+    def refresh(self, full=False):
+
+        result = self.whatsapp_driver.web_driver.execute_script(
+            self.REFRESH_SCRIPT,
+            self.selectors(),
+            full or not self.refreshed
+        )
+        self.refreshed = True
+        if result['full']:
+            previous = set(self.entries)
+            self.entries = {}
+        else:
+            previous = set()
+
+        added = [ChatEntry(data) for data in result['added']]
+        changed = [ChatEntry(data) for data in result['changed']]
+        for entry in added + changed:
+            self.entries[entry.key] = entry
+        removed = [
+            key for key in result['removed'] if self.entries.pop(key, None)
+        ]
+        if result['full']:
+            # After a reload every chat comes back with a new element
+            removed = sorted(previous - set(self.entries))
+            changed = [entry for entry in added if entry.key in previous]
+            added = [entry for entry in added if entry.key not in previous]
+
+        if added or changed or removed or result['full']:
+            self.reindex()
+        return ChatDiff(added, changed, removed, result['full'])
+
+    def reindex(self):
+
+        self.by_title = {}
+        self.by_number = {}
+        for entry in self.entries.values():
+            self.by_title.setdefault(entry.title, entry)
+            number = digits(entry.title)
+            if number:
+                self.by_number.setdefault(number, entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(sorted(
+            self.entries.values(),
+            key=lambda entry: entry.position
+        ))
+
+    def lookup(self, name_or_number):
+
+        entry = self.by_title.get(name_or_number)
+        if entry is None:
+            entry = self.by_number.get(digits(name_or_number))
+        if entry is None:
+            # Saved contacts are titled by name; the driver remembers the
+            # titles of the numbers it opened
+            title = self.whatsapp_driver.conversation_titles.get(
+                name_or_number
+            )
+            entry = self.by_title.get(title)
+        return entry
+
+    def unread(self):
+        return [entry for entry in self if entry.unread]
+
+    def chat(self, entry):
+        return WhatsAppChat(entry.element, self.whatsapp_driver, entry.title)
@@ -0,0 +1,135 @@
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class DedupStore(object):
+
+    """Remembers which message ids were already handed out, per chat."""
+
+    def contains(self, chat, message_id):
+        raise NotImplementedError()
+
+    def add(self, chat, message_ids):
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class MemoryDedupStore(DedupStore):
+
+    def __init__(self, max_size=100000, ttl=None):
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def contains(self, chat, message_id):
+
+        key = (chat, message_id)
+        read_at = self.entries.get(key)
+        if read_at is None:
+            return False
+        if self.ttl is not None and time.time() - read_at > self.ttl:
+            del self.entries[key]
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def add(self, chat, message_ids):
+
+        now = time.time()
+        for message_id in message_ids:
+            key = (chat, message_id)
+            self.entries[key] = now
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class SQLiteDedupStore(DedupStore):
+
+    """Survives restarts. Lookups go through a bounded in-memory LRU first,
+    writes are buffered and inserted `batch_size` at a time, and at most
+    `max_rows` ids are kept on disk per account."""
+
+    def __init__(
+            self,
+            path,
+            account='',
+            batch_size=100,
+            cache_size=10000,
+            max_rows=1000000
+    ):
+        self.account = account
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.cache = MemoryDedupStore(max_size=cache_size)
+        self.pending = []
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS read_messages (
+                account TEXT NOT NULL,
+                chat TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                read_at REAL NOT NULL,
+                PRIMARY KEY (account, chat, message_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS read_messages_read_at
+                ON read_messages (account, read_at);
+        ''')
+
+    def contains(self, chat, message_id):
+
+        if self.cache.contains(chat, message_id):
+            return True
+        row = self.connection.execute(
+            'SELECT 1 FROM read_messages '
+            'WHERE account = ? AND chat = ? AND message_id = ?',
+            (self.account, chat, message_id)
+        ).fetchone()
+        if row is None:
+            return False
+        self.cache.add(chat, [message_id])
+        return True
+
+    def add(self, chat, message_ids):
+
+        now = time.time()
+        self.cache.add(chat, message_ids)
+        self.pending.extend(
+            (self.account, chat, message_id, now)
+            for message_id in message_ids
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO read_messages VALUES (?, ?, ?, ?)',
+                self.pending
+            )
+            self.connection.execute(
+                'DELETE FROM read_messages WHERE account = ? AND read_at < ('
+                '  SELECT read_at FROM read_messages WHERE account = ?'
+                '  ORDER BY read_at DESC LIMIT 1 OFFSET ?'
+                ')',
+                (self.account, self.account, self.max_rows - 1)
+            )
+        self.pending = []
+
+    def close(self):
+
+        self.flush()
+        self.connection.close()
@@ -1,7 +1,10 @@
 import base64
 import hashlib
+import threading
 import time
+from contextlib import ExitStack
 from functools import reduce
+from itertools import groupby
 from io import BytesIO
 
 from PIL import Image
@@ -11,12 +14,24 @@ from selenium.common.exceptions import TimeoutException, \
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from wspdriver.chat import WhatsAppChat
+from wspdriver.chat import WhatsAppChat, WrongConversationError
+from wspdriver.chat_index import ChatIndex
+from wspdriver.dedup import MemoryDedupStore
+from wspdriver.export import HistoryExport, is_parquet, open_writer, \
+    resume_marker
+from wspdriver.instrumentation import instrument, instrument_class, \
+    instrument_web_driver
+from wspdriver.lean import LeanProfile, AVATAR_URLS, resource_usage
 from wspdriver.message import WhatsappMessage
+from wspdriver.remote import AttachedWebDriver
+from wspdriver.selectors import DEFAULT_PROFILE, get_profile
+from wspdriver.session import SessionState, LOGGED_IN, LOGGED_OUT
+from wspdriver.sweep import BatchedSweep, UnreadSweep
 from wspdriver.user import User
+from wspdriver.wait import WaitStrategy, AnimationsFinished, ScrollSettled, \
+    Settled, ChatHeaderMatches, ElementCountAbove
 
 
 class WhatsappDriver(object):
@@ -24,8 +39,18 @@ class WhatsappDriver(object):
     USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 ' \
                  '(KHTML, like Gecko) Chrome/60.0.3112.50 Safari/537.36'
 
+    WHATSAPP_URL = 'https://web.whatsapp.com'
+
     @classmethod
-    def start(cls, chrome_driver_path, chrome_data_path, headless=True):
+    def start(
+            cls,
+            chrome_driver_path,
+            chrome_data_path,
+            headless=True,
+            hooks=None,
+            debugging_port=None,
+            lean=None
+    ):
 
         options = webdriver.ChromeOptions()
         options.add_argument('--user-data-dir=' + chrome_data_path)
@@ -36,39 +61,177 @@ class WhatsappDriver(object):
             options.add_argument('--headless')
             options.add_argument('--disable-gpu')
 
+        if debugging_port is not None:
+            # Chrome outlives this process, so a restart can `attach` to it
+            # with WhatsApp Web still loaded
+            options.add_argument(
+                '--remote-debugging-port={}'.format(debugging_port)
+            )
+            options.add_experimental_option('detach', True)
+
+        if lean is True:
+            lean = LeanProfile()
+        if lean:
+            lean.configure(options)
+
         web_driver = webdriver.Chrome(
             chrome_options=options,
             executable_path=chrome_driver_path
         )
 
-        return cls(web_driver)
+        return cls(web_driver, hooks=hooks, lean=lean or None)
 
-    APP_WRAPPER_SELECTOR = '.app-wrapper-web'
+    @classmethod
+    def attach(cls, chrome_driver_path, debugger_address, **kwargs):
 
-    def __init__(self, web_driver):
+        # Chrome already running with --remote-debugging-port
+        options = webdriver.ChromeOptions()
+        options.debugger_address = debugger_address
+        web_driver = webdriver.Chrome(
+            chrome_options=options,
+            executable_path=chrome_driver_path
+        )
+        return cls(web_driver, reuse_page=True, **kwargs)
+
+    @classmethod
+    def attach_session(
+            cls,
+            command_executor,
+            session_id,
+            w3c=True,
+            **kwargs
+    ):
+
+        # A chromedriver session left running, see `session_address`
+        web_driver = AttachedWebDriver(command_executor, session_id, w3c)
+        return cls(web_driver, reuse_page=True, **kwargs)
 
+    SCRIPT_TIMEOUT = 30
+
+    def __init__(
+            self,
+            web_driver,
+            wait_timeout=2,
+            dedup_store=None,
+            direct_open=False,
+            selectors=None,
+            media_cache=None,
+            hooks=None,
+            reuse_page=False,
+            lean=None
+    ):
+
+        self.hooks = hooks
+        if hooks is not None:
+            instrument_web_driver(web_driver, hooks)
+            instrument(self, hooks, 'driver')
+            instrument_class(WhatsappMessage, 'message')
         self.running = True
         self.web_driver = web_driver
-        web_driver.get('https://web.whatsapp.com')
-        WebDriverWait(web_driver, 10).until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, self.APP_WRAPPER_SELECTOR)
-            )
+        self._selectors = selectors
+        self._wsp_web_version = None
+        # A store is falsy while empty, so only None means the default
+        self.dedup_store = dedup_store if dedup_store is not None \
+            else MemoryDedupStore()
+        self.direct_open = direct_open
+        self.media_cache = media_cache
+        self.chat_cursors = {}
+        self.chat_handles = {}
+        self.conversation_titles = {}
+        self.active_conversation = None
+        # Held through every multi-step UI flow (opening a chat and typing,
+        # reading one, scrolling its history) so a SendQueue flushing on its
+        # own thread never interleaves with a sweep or an export
+        self.ui_lock = threading.RLock()
+        self.lean = lean
+        self.pane_checked_at = time.monotonic()
+        self.session = SessionState(self)
+        self.chat_index = ChatIndex(self)
+        self.waits = WaitStrategy(
+            web_driver,
+            timeout=wait_timeout,
+            hooks=hooks
+        )
+        if lean is not None:
+            lean.install(web_driver)
+        # The login state, version fingerprint and selector profile are
+        # all resolved on first use
+        if not (reuse_page and self.find_whatsapp_tab()):
+            web_driver.get(self.WHATSAPP_URL)
+        self.wait_until_located(
+            (selectors or DEFAULT_PROFILE).APP_WRAPPER_SELECTOR
         )
-        self.whatsapp_web_version = self.get_wsp_web_version()
+        web_driver.set_script_timeout(self.SCRIPT_TIMEOUT)
 
     def stop(self):
         self.running = False
 
-    def get_wsp_web_version(self):
+    @property
+    def selectors(self):
 
-        scripts = [
-            script.get_attribute('src') for script in
-            self.web_driver.find_elements_by_tag_name('script')
-        ]
+        if self._selectors is None:
+            self._selectors = get_profile(self.whatsapp_web_version)
+        return self._selectors
+
+    @selectors.setter
+    def selectors(self, selectors):
+        self._selectors = selectors
+
+    @property
+    def whatsapp_web_version(self):
+        return self.get_wsp_web_version()
+
+    def find_whatsapp_tab(self):
 
-        to_hash = reduce(lambda a, b: a + '|' + b, sorted(scripts), '')
-        return hashlib.md5(to_hash.encode()).hexdigest()
+        # An attached browser may be showing some other tab
+        if self.web_driver.current_url.startswith(self.WHATSAPP_URL):
+            return True
+        current = self.web_driver.current_window_handle
+        for handle in self.web_driver.window_handles:
+            if handle == current:
+                continue
+            self.web_driver.switch_to_window(handle)
+            if self.web_driver.current_url.startswith(self.WHATSAPP_URL):
+                return True
+        self.web_driver.switch_to_window(current)
+        return False
+
+    def resource_usage(self):
+
+        # Memory and CPU of this driver's browser, needs psutil
+        return resource_usage(self.web_driver)
+
+    def allowing_resources(self, patterns):
+
+        if self.lean is None:
+            return ExitStack()
+        return self.lean.allowing(self.web_driver, patterns)
+
+    def session_address(self):
+
+        # What `attach_session` needs to take over this browser later
+        return (
+            self.web_driver.command_executor._url,
+            self.web_driver.session_id
+        )
+
+    SCRIPT_SOURCES_SCRIPT = '''
+        return Array.prototype.map.call(
+            document.getElementsByTagName('script'),
+            function (script) { return script.src; }
+        );
+    '''
+
+    def get_wsp_web_version(self, refresh=False):
+
+        # The build only changes on reload, so one script call is cached
+        if self._wsp_web_version is None or refresh:
+            scripts = self.web_driver.execute_script(
+                self.SCRIPT_SOURCES_SCRIPT
+            )
+            to_hash = reduce(lambda a, b: a + '|' + b, sorted(scripts), '')
+            self._wsp_web_version = hashlib.md5(to_hash.encode()).hexdigest()
+        return self._wsp_web_version
 
     def find_element_by_selector(self, selector):
 
@@ -84,8 +247,10 @@ class WhatsappDriver(object):
             timeout,
             by_method=By.CSS_SELECTOR
     ):
-        return WebDriverWait(self.web_driver, timeout).until(
-            finder((by_method, css_selector))
+        return self.waits.until(
+            finder((by_method, css_selector)),
+            css_selector,
+            timeout=timeout
         )
 
     def wait_until_clickable(
@@ -116,6 +281,7 @@ class WhatsappDriver(object):
 
     def quit(self):
 
+        self.dedup_store.close()
         self.web_driver.quit()
 
     def save_screenshot(self, img_file):
@@ -141,44 +307,110 @@ class WhatsappDriver(object):
             raise AlreadyLoggedInException()
 
         login_element = self.wait_until_located(
-            '{} img'.format(self.APP_WRAPPER_SELECTOR)
+            '{} img'.format(self.selectors.APP_WRAPPER_SELECTOR)
         )
         login_image_base64 = login_element.get_attribute('src')
         return login_image_base64
 
-    APP_MAIN_SELECTOR = '.app'
-
     def wait_for_login(self, timeout=None):
 
-        seconds_passed = 0
-        while self.running and (timeout is None or timeout > seconds_passed):
-            main = self.web_driver.find_elements_by_css_selector(
-                self.APP_MAIN_SELECTOR
-            )
-            if len(main) > 0:
-                return
-            time.sleep(1)
-            seconds_passed += 1
-
-        raise LoginTimeoutError('{} seconds passed'.format(timeout))
+        if self.session.wait_for((LOGGED_IN,), timeout) != LOGGED_IN:
+            raise LoginTimeoutError('{} seconds passed'.format(timeout))
 
     def is_logged_in(self):
 
-        while self.running:
-            main = self.web_driver.find_elements_by_css_selector(
-                self.APP_MAIN_SELECTOR
-            )
-            if len(main) > 0:
-                return True
-            logo = self.web_driver.find_elements_by_css_selector(
-                'span[data-icon="logo"]'
-            )
-            if len(logo) > 0:
-                return False
+        # Free while the cached state is fresh; blocks while the page is
+        # still loading, until it shows either the app or the login code
+        state = self.session.current()
+        if state not in (LOGGED_IN, LOGGED_OUT):
+            state = self.session.wait_for((LOGGED_IN, LOGGED_OUT))
+        return state == LOGGED_IN
+
+    # Reads the image behind a (blob) URL in the page itself and resolves
+    # with it as a data URL, so the original bytes come back untouched
+    FETCH_IMAGE_SCRIPT = '''
+        var callback = arguments[arguments.length - 1];
+        fetch(arguments[0]).then(function (response) {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.blob();
+        }).then(function (blob) {
+            var reader = new FileReader();
+            reader.onloadend = function () {
+                callback({dataUrl: reader.result});
+            };
+            reader.readAsDataURL(blob);
+        }).catch(function (error) {
+            callback({error: String(error)});
+        });
+    '''
+
+    def fetch_image_data(self, image_url):
+
+        result = self.web_driver.execute_async_script(
+            self.FETCH_IMAGE_SCRIPT,
+            image_url
+        )
+        if 'error' in result:
+            raise ImageFetchError(result['error'])
+        return result['dataUrl'].split(',', 1)[1]
+
+    def get_image_bytes(self, image_url, cache_key=None):
+
+        # cache_key defaults to the URL; messages pass their id
+        cache_key = cache_key or image_url
+        if self.media_cache is not None:
+            image_bytes = self.media_cache.get(cache_key)
+            if image_bytes is not None:
+                return image_bytes
+
+        try:
+            image_bytes = base64.b64decode(self.fetch_image_data(image_url))
+        except ImageFetchError:
+            # Cross-origin images (e.g. avatars) may refuse fetch()
+            image = self.screenshot_image(image_url)
+            output = BytesIO()
+            image.save(output, format='PNG')
+            image_bytes = output.getvalue()
+
+        if self.media_cache is not None:
+            self.media_cache.put(cache_key, image_bytes)
+        return image_bytes
+
+    def save_image(
+            self,
+            image_url,
+            filename,
+            cache_key=None,
+            chunk_size=1 << 16
+    ):
+
+        if self.media_cache is not None:
+            with open(filename, 'wb') as image_file:
+                image_file.write(self.get_image_bytes(image_url, cache_key))
+            return
 
-            time.sleep(0.1)
+        # Decodes in chunks (a multiple of 4 base64 characters) straight
+        # into the file, without building the image in memory
+        try:
+            data = self.fetch_image_data(image_url)
+        except ImageFetchError:
+            self.screenshot_image(image_url).save(filename)
+            return
+        with open(filename, 'wb') as image_file:
+            for start in range(0, len(data), chunk_size * 4):
+                image_file.write(base64.b64decode(
+                    data[start:start + chunk_size * 4]
+                ))
+
+    def get_image(self, image_url, cache_key=None):
+
+        return Image.open(
+            BytesIO(self.get_image_bytes(image_url, cache_key))
+        )
 
-    def get_image(self, image_url):
+    def screenshot_image(self, image_url):
 
         self.web_driver.execute_script("window.open('','_blank');")
         windows = self.web_driver.window_handles
@@ -199,67 +431,69 @@ class WhatsappDriver(object):
         self.web_driver.switch_to_window(windows[0])
         return cropped_image
 
-    SIDE_HEADER_IMG_CSS_SELECTOR = '#side header img'
-    USER_NAME_XPATH = "(//div[contains(@class, 'selectable-text')])[1]"
-    USER_AVATAR_XPATH = "//div[@style='width: 200px; height: 200px; " \
-                        "top: 0px; left: 0px; position: absolute;']/img"
-    USER_VIEW_PICTURE_BUTTON_XPATH = '//html//li[1]/div'
-    USER_PHONE_XPATH = "(//span[@dir='auto'])[1]"
-    CLOSE_IMAGE_VIEWER_CSS_SELECTOR = 'span[data-icon="x-viewer"]'
-    CLOSE_USER_PROFILE_XPATH = "//span[@data-icon='back-light']/parent::*"
-
     def get_user_data(self):
 
         if not self.is_logged_in():
             raise NotLoggedInException()
 
-        self.wait_until_clickable(self.SIDE_HEADER_IMG_CSS_SELECTOR).click()
+        with self.ui_lock, self.allowing_resources(AVATAR_URLS):
+            return self.read_user_data()
+
+    def read_user_data(self):
+
+        self.wait_until_clickable(
+            self.selectors.SIDE_HEADER_IMG_CSS_SELECTOR
+        ).click()
         name = self.wait_until_clickable(
-            self.USER_NAME_XPATH,
+            self.selectors.USER_NAME_XPATH,
             by_method=By.XPATH
         ).text
 
         try:
             avatar_element = self.wait_until_clickable(
-                self.USER_AVATAR_XPATH,
+                self.selectors.USER_AVATAR_XPATH,
                 by_method=By.XPATH
             )
         except TimeoutException:
             raise AvatarNotFoundException()
 
         avatar_url = avatar_element.get_attribute('src')
-        avatar = self.get_image(avatar_url)
+        avatar_bytes = self.get_image_bytes(avatar_url)
+        avatar = Image.open(BytesIO(avatar_bytes))
 
-        time.sleep(0.5)  # Animation...
+        self.waits.settle(AnimationsFinished(), 'profile drawer animation')
         ActionChains(self.web_driver)\
             .move_to_element(avatar_element)\
             .click().perform()
 
         self.wait_until_clickable(
-            self.USER_VIEW_PICTURE_BUTTON_XPATH,
+            self.selectors.USER_VIEW_PICTURE_BUTTON_XPATH,
             by_method=By.XPATH
         ).click()
         phone_number = self.wait_until_located(
-            self.USER_PHONE_XPATH,
+            self.selectors.USER_PHONE_XPATH,
             by_method=By.XPATH
         ).text
 
-        self.wait_until_clickable(self.CLOSE_IMAGE_VIEWER_CSS_SELECTOR).click()
-        time.sleep(0.6)  # Animation...
+        self.wait_until_clickable(
+            self.selectors.CLOSE_IMAGE_VIEWER_CSS_SELECTOR
+        ).click()
+        self.waits.settle(AnimationsFinished(), 'image viewer animation')
 
         self.wait_until_clickable(
-            self.CLOSE_USER_PROFILE_XPATH,
+            self.selectors.CLOSE_USER_PROFILE_XPATH,
             by_method=By.XPATH
         ).click()
-        time.sleep(0.5)  # Animation...
-        return User(phone_number, name, avatar)
+        self.waits.settle(AnimationsFinished(), 'profile close animation')
+        return User(phone_number, name, avatar, avatar_bytes)
 
     def scroll_to_chatlist_top(self):
 
         self.web_driver.execute_script(
             'arguments[0].scrollIntoView()',
             self.find_element_by_selector(
-                '.chatlist-panel-body div:first-child')
+                self.selectors.CHATLIST_TOP_SELECTOR
+            )
         )
 
     def get_unread_chat(self, first_try=True):
@@ -267,7 +501,9 @@ class WhatsappDriver(object):
         if not self.is_logged_in():
             raise NotLoggedInException()
 
-        chat = self.find_element_by_selector('.chat.unread')
+        chat = self.find_element_by_selector(
+            self.selectors.UNREAD_CHAT_SELECTOR
+        )
         if chat:
             return WhatsAppChat(chat, self)
         elif first_try:
@@ -280,83 +516,524 @@ class WhatsappDriver(object):
         if not self.is_logged_in():
             raise NotLoggedInException()
 
-        chat = self.get_unread_chat()
-        while chat:
-            yield chat
-            chat = self.get_unread_chat()
+        for entry in self.unread_chat_entries():
+            yield self.chat_index.chat(entry)
+
+    def unread_chat_entries(self):
+
+        # Every unread chat with its count, from one chat list query
+        with self.ui_lock:
+            self.chat_index.refresh()
+            entries = self.chat_index.unread()
+            if not entries:
+                self.scroll_to_chatlist_top()
+                self.chat_index.refresh()
+                entries = self.chat_index.unread()
+        return entries
+
+    def sweep_unread(self, order='most', tail=True, batch=None):
+
+        # With a batch size, the page opens and reads that many chats per
+        # round-trip
+        if batch:
+            return BatchedSweep(self, order, tail, batch)
+        return UnreadSweep(self, order, tail)
+
+    def export_history(
+            self,
+            path,
+            resume=None,
+            until=None,
+            page_timeout=10,
+            progress=None
+    ):
+
+        # The open chat, to JSONL or (with pyarrow) a .parquet file. Resuming
+        # appends to the JSONL file where the previous export stopped; with
+        # no file yet, it starts a fresh one.
+        if not self.is_logged_in():
+            raise NotLoggedInException()
+
+        if resume is not None and is_parquet(path):
+            raise ValueError('Parquet files can not be appended to')
+        if resume is True:
+            resume = resume_marker(path)
+        writer = open_writer(path, append=resume is not None)
+        try:
+            with self.ui_lock:
+                return HistoryExport(
+                    self, writer, resume, until, page_timeout
+                ).run(progress)
+        finally:
+            writer.close()
 
     def get_chats(self):
 
         if not self.is_logged_in():
             raise NotLoggedInException()
 
-        chats = self.web_driver.find_elements_by_css_selector('.chat')
-        for chat in chats:
-            yield WhatsAppChat(chat, self)
+        self.chat_index.refresh()
+        for entry in self.chat_index:
+            yield self.chat_index.chat(entry)
+
+    def find_chat(self, name_or_number):
+
+        # By title, or by a number in the title or opened before
+        if not self.is_logged_in():
+            raise NotLoggedInException()
+
+        self.chat_index.refresh()
+        entry = self.chat_index.lookup(name_or_number)
+        return self.chat_index.chat(entry) if entry is not None else None
 
     def ensure_scroll_to_chat_bottom(self):
 
-        incoming_btn = self.find_element_by_selector('.incoming-msgs')
+        incoming_btn = self.find_element_by_selector(
+            self.selectors.INCOMING_MESSAGES_SELECTOR
+        )
         if incoming_btn:
             incoming_btn.click()
-            time.sleep(0.5)
+            self.waits.settle(
+                ScrollSettled(self.selectors.CHAT_PANE_SELECTOR),
+                'chat scroll to bottom'
+            )
 
-    def get_current_chat_messages(self):
+    def get_current_chat_messages(self, batch=True, incremental=False):
 
         if not self.is_logged_in():
             raise NotLoggedInException()
 
         self.ensure_scroll_to_chat_bottom()
+        chat = self.get_current_chat_title() if incremental else None
+        yield from self.extract_messages(batch, chat)
+
+    def extract_messages(self, batch=True, chat=None, limit=None):
+
+        # With a chat, only the messages after its cursor are extracted, and
+        # the cursor moves to the last one yielded; `limit` keeps the last
+        # that many at most. Cursors are page-side keys, so they need batch
+        # extraction.
+        if chat is not None and not batch:
+            raise ValueError('Incremental reads need batch extraction')
+        if batch:
+            messages_data = self.web_driver.execute_script(
+                WhatsappMessage.DATA_SCRIPT,
+                self.selectors.MESSAGES_SELECTOR,
+                self.chat_cursors.get(chat) if chat is not None else None,
+                self.selectors.message_parts(),
+                limit
+            )
+            for message_data in messages_data:
+                message = WhatsappMessage.build_from_data(
+                    message_data, self, chat
+                )
+                if chat is not None:
+                    self.chat_cursors[chat] = message.key
+                yield message
+            return
+
         messages = self.web_driver.find_elements_by_css_selector(
-            '.pane-chat-msgs .message'
+            self.selectors.MESSAGES_SELECTOR
         )
+        if limit:
+            messages = messages[-limit:]
         for message_element in messages:
             yield WhatsappMessage.build(message_element, self)
 
-    read_messages = set()
-
-    def ensure_no_duplicates(self, messages):
+    def ensure_no_duplicates(self, messages, chat=''):
 
         filtered_messages = [
             message for message in messages
-            if message.id not in self.read_messages
+            if not self.dedup_store.contains(chat, message.id)
         ]
-        for message in filtered_messages:
-            self.read_messages.add(message.id)
-            yield message
+        self.dedup_store.add(
+            chat,
+            [message.id for message in filtered_messages]
+        )
+        yield from filtered_messages
+
+    CURRENT_CHAT_TITLE_SCRIPT = '''
+        var title = document.querySelector(arguments[0]);
+        return title ? title.innerText : '';
+    '''
+
+    def get_current_chat_title(self):
+
+        return self.web_driver.execute_script(
+            self.CURRENT_CHAT_TITLE_SCRIPT,
+            self.selectors.CHAT_HEADER_TITLE_SELECTOR
+        )
+
+    def get_unread_messages(self, batch=None):
 
-    def get_unread_messages(self):
+        # Read in one go, so the chat can't change under the read
+        with self.ui_lock:
+            current_chat = list(
+                self.get_current_chat_messages(incremental=True)
+            )
+            title = self.get_current_chat_title()
+        yield from self.ensure_no_duplicates(current_chat, title)
+
+        yield from self.sweep_unread(batch=batch)
+        self.trim_message_pane()
+
+    def trim_message_pane(self, force=False):
+
+        # React owns the pane's nodes, so they can't be removed one by one;
+        # closing the chat unmounts them all and reopening it only renders
+        # the latest page
+        if self.lean is None and not force:
+            return False
+        now = time.monotonic()
+        if not force and now - self.pane_checked_at < self.lean.trim_interval:
+            return False
+        self.pane_checked_at = now
+
+        limit = self.lean.pane_limit if self.lean is not None else 0
+        if not ElementCountAbove(self.selectors.MESSAGES_SELECTOR, limit)(
+                self.web_driver
+        ):
+            return False
+        with self.ui_lock:
+            ActionChains(self.web_driver).send_keys(Keys.ESCAPE).perform()
+            self.active_conversation = None
+        return True
+
+    # Queues the payload of every '.message' added to the page, with the title
+    # of the chat open when it was added, plus a marker whenever a chat in the
+    # list turns unread. Installing it twice is a no-op.
+    INSTALL_WATCHER_SCRIPT = '''
+        var messageSelector = arguments[0];
+        var unreadSelector = arguments[1];
+        var root = document.querySelector(arguments[2]);
+        var parts = arguments[3];
+        var headerSelector = arguments[4];
+        if (window.wspdriverWatcher || !root) {
+            return !!window.wspdriverWatcher;
+        }
+        var extract = ''' + WhatsappMessage.DATA_JS + ''';
+        var watcher = window.wspdriverWatcher = {queue: [], waiting: null};
+        var push = function (event) {
+            watcher.queue.push(event);
+            if (watcher.waiting) {
+                var wake = watcher.waiting;
+                watcher.waiting = null;
+                wake();
+            }
+        };
+        var pushMessages = function (node) {
+            var messages = node.matches(messageSelector) ?
+                [node] : node.querySelectorAll(messageSelector);
+            if (!messages.length) {
+                return;
+            }
+            // The observer runs right after the render that added them, so
+            // the header still belongs to their chat
+            var header = document.querySelector(headerSelector);
+            var chat = header ? header.innerText : '';
+            Array.prototype.forEach.call(messages, function (message) {
+                push({
+                    type: 'message',
+                    chat: chat,
+                    data: extract(message, parts)
+                });
+            });
+        };
+        new MutationObserver(function (mutations) {
+            mutations.forEach(function (mutation) {
+                var target = mutation.target;
+                if (mutation.type === 'attributes') {
+                    if (target.matches(unreadSelector)) {
+                        push({type: 'unread'});
+                    }
+                    return;
+                }
+                var added = mutation.addedNodes;
+                Array.prototype.forEach.call(added, function (node) {
+                    if (node.nodeType !== Node.ELEMENT_NODE) {
+                        return;
+                    }
+                    pushMessages(node);
+                    if (node.matches(unreadSelector) ||
+                            node.querySelector(unreadSelector)) {
+                        push({type: 'unread'});
+                    }
+                });
+            });
+        }).observe(root, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ['class']
+        });
+        return true;
+    '''
+
+    # Resolves with up to arguments[0] queued events as soon as there are any,
+    # with [] after arguments[1] ms, or with null if the watcher is gone.
+    DRAIN_WATCHER_SCRIPT = '''
+        var maxEvents = arguments[0];
+        var timeout = arguments[1];
+        var callback = arguments[arguments.length - 1];
+        var watcher = window.wspdriverWatcher;
+        if (!watcher) {
+            callback(null);
+            return;
+        }
+        var drain = function () {
+            callback(watcher.queue.splice(0, maxEvents));
+        };
+        if (watcher.queue.length) {
+            drain();
+            return;
+        }
+        watcher.waiting = drain;
+        setTimeout(function () {
+            if (watcher.waiting === drain) {
+                watcher.waiting = null;
+                callback([]);
+            }
+        }, timeout);
+    '''
+
+    def install_message_watcher(self):
+
+        return self.web_driver.execute_script(
+            self.INSTALL_WATCHER_SCRIPT,
+            self.selectors.MESSAGES_SELECTOR,
+            self.selectors.UNREAD_CHAT_SELECTOR,
+            self.selectors.APP_MAIN_SELECTOR,
+            self.selectors.message_parts(),
+            self.selectors.CHAT_HEADER_TITLE_SELECTOR
+        )
 
-        current_chat = self.get_current_chat_messages()
-        yield from self.ensure_no_duplicates(current_chat)
+    def watch_messages(self, wait=5, batch_size=100):
 
-        for chat in self.get_unread_chats():
-            yield from self.ensure_no_duplicates(chat.get_messages())
+        if not self.is_logged_in():
+            raise NotLoggedInException()
+
+        self.web_driver.set_script_timeout(
+            max(wait + 5, self.SCRIPT_TIMEOUT)
+        )
+        self.install_message_watcher()
+        while self.running:
+            events = self.web_driver.execute_async_script(
+                self.DRAIN_WATCHER_SCRIPT,
+                batch_size,
+                int(wait * 1000)
+            )
+            if events is None:  # Page reloaded
+                self.install_message_watcher()
+                continue
+
+            # Deduplicated under the chat each message was added to, which
+            # may not be the one open now
+            messages = [
+                WhatsappMessage.build_from_data(
+                    event['data'], self, event['chat']
+                )
+                for event in events if event['type'] == 'message'
+            ]
+            for chat, chat_messages in groupby(
+                    messages, lambda message: message.chat
+            ):
+                yield from self.ensure_no_duplicates(chat_messages, chat)
+
+            if any(event['type'] == 'unread' for event in events):
+                # Opening the chat renders its messages, which the watcher
+                # picks up on the next drain
+                with self.ui_lock:
+                    for chat in self.get_unread_chats():
+                        chat.select()
+            self.trim_message_pane()
+
+    def listen(self, callback, wait=5, batch_size=100):
+
+        for message in self.watch_messages(wait, batch_size):
+            callback(message)
+
+    # Titles of the chats currently listed, settled once search filtering
+    # stops changing them
+    CHAT_TITLES_SCRIPT = '''
+        return Array.prototype.map.call(
+            document.querySelectorAll(arguments[0]),
+            function (title) { return title.innerText; }
+        ).join('\\n');
+    '''
+
+    def chat_header_matches(self, title, exact=False):
+
+        return ChatHeaderMatches(
+            title,
+            self.selectors.CHAT_HEADER_TITLE_SELECTOR,
+            exact
+        )
+
+    def search_results_settled(self):
+
+        return Settled(
+            self.CHAT_TITLES_SCRIPT,
+            '{} {}'.format(
+                self.selectors.CHAT_SELECTOR,
+                self.selectors.CHAT_TITLE_SELECTOR
+            )
+        )
 
     def open_conversation(self, phone_number):
 
         if not self.is_logged_in():
             raise NotLoggedInException()
 
-        # search_box = self.wait_until_located('input.input-search')
-        search_box = self.wait_until_located('#input-chatlist-search')
+        with self.ui_lock:
+            self.active_conversation = None
+            if not (self.direct_open and
+                    self.open_chat_handle(phone_number)):
+                if self.direct_open:
+                    self.open_deep_link(phone_number)
+                    title = None
+                else:
+                    title = self.search_conversation(phone_number)
+                self.remember_conversation(phone_number, title)
+            self.active_conversation = phone_number
+
+    def search_conversation(self, phone_number):
+
+        return self.run_steps(self.search_steps(phone_number))
+
+    def search_steps(self, phone_number):
+
+        # Yields each (condition, name) to wait for and is sent back the
+        # result, so the async front-end can await the waits in between.
+        # Returns the title of the chat it opened.
+        search_box = self.wait_until_located(
+            self.selectors.CHATLIST_SEARCH_SELECTOR
+        )
         search_box.send_keys(phone_number)
-        time.sleep(0.5)
+        results = self.search_results_settled()
+        yield results, 'search results'
+
+        titles = results.last_value
+        title = titles.split('\n')[0] if isinstance(titles, str) else ''
+        if not title:
+            search_box.clear()
+            raise ConversationNotFoundError(phone_number)
+        # RETURN opens the top result, and only the header tells when the
+        # pane switched to it
         search_box.send_keys(Keys.RETURN)
+        opened = yield self.chat_header_matches(title, exact=True), \
+            'search result header'
+        if not opened:
+            raise WrongConversationError(
+                'Expected chat {!r} for {}'.format(title, phone_number)
+            )
+        return title
+
+    @staticmethod
+    def advance(steps, result=None):
+
+        # Runs a flow like search_steps up to its next wait: (False,
+        # (condition, name)), or (True, its return value) once it is done
+        try:
+            return False, steps.send(result)
+        except StopIteration as stop:
+            return True, stop.value
+
+    def run_steps(self, steps):
+
+        done, value = self.advance(steps)
+        while not done:
+            condition, name = value
+            done, value = self.advance(
+                steps,
+                self.waits.settle(condition, name)
+            )
+        return value
+
+    DEEP_LINK_URL = 'https://web.whatsapp.com/send?phone={}'
+
+    def open_deep_link(self, phone_number):
+
+        # Reloads the app: element handles and page-side state are gone
+        self.chat_handles = {}
+        self.web_driver.get(self.DEEP_LINK_URL.format(phone_number))
+        self.wait_until_located(
+            self.selectors.CHAT_HEADER_TITLE_SELECTOR,
+            timeout=30
+        )
+
+    def remember_conversation(self, phone_number, title=None):
+
+        # `title` is the chat the search opened and the header confirmed;
+        # without one (after a deep link reloaded the page) the header is
+        # read as it is
+        if title is None:
+            title = self.get_current_chat_title()
+        if title:
+            self.conversation_titles[phone_number] = title
+        chat_element = self.find_element_by_selector(
+            self.selectors.ACTIVE_CHAT_SELECTOR
+        )
+        if chat_element:
+            self.chat_handles[phone_number] = chat_element
+
+    def open_chat_handle(self, phone_number):
+
+        # Clicks the chat list entry cached from a previous open. The list
+        # recycles its elements, so the header has to confirm the chat.
+        chat_element = self.chat_handles.get(phone_number)
+        title = self.conversation_titles.get(phone_number)
+        if chat_element is None or title is None:
+            return False
+        try:
+            chat_element.click()
+        except WebDriverException:
+            del self.chat_handles[phone_number]
+            return False
+        if self.waits.settle(
+                self.chat_header_matches(title, exact=True),
+                'chat handle header'
+        ):
+            return True
+        del self.chat_handles[phone_number]
+        return False
+
+    def confirm_conversation(self, phone_number):
+
+        title = self.conversation_titles.get(phone_number)
+        if title is None:
+            return
+        if not self.waits.settle(
+                self.chat_header_matches(title, exact=True),
+                'conversation header'
+        ):
+            self.active_conversation = None
+            raise WrongConversationError(
+                'Expected chat {!r} for {}'.format(title, phone_number)
+            )
+
+    def ensure_conversation(self, phone_number):
 
-        # self.wait_until_located('.list-search > span .icon-spinner')
-        # self.wait_until_located('.list-search > span .icon-close-search')
+        with self.ui_lock:
+            if self.active_conversation != phone_number:
+                self.open_conversation(phone_number)
+            self.confirm_conversation(phone_number)
 
     def send_message(self, phone_number, message):
 
-        self.open_conversation(phone_number)
+        with self.ui_lock:
+            self.open_conversation(phone_number)
+            self.confirm_conversation(phone_number)
+            self.type_message(message)
+
+    def type_message(self, message):
+
         input_element = self.web_driver.find_element_by_class_name(
-            'pluggable-input'
+            self.selectors.MESSAGE_INPUT_CLASS
         )
         try:
             input_element.send_keys(message)
             send_button = self.web_driver.find_element_by_css_selector(
-                'button.compose-btn-send'
+                self.selectors.SEND_BUTTON_SELECTOR
             )
             send_button.click()
         except WebDriverException as e:
@@ -373,6 +1050,10 @@ class NotLoggedInException(Exception):
     pass
 
 
+class ConversationNotFoundError(Exception):
+    pass
+
+
 class AlreadyLoggedInException(Exception):
     pass
 
@@ -383,3 +1064,7 @@ class LoginTimeoutError(TimeoutError):
 
 class AvatarNotFoundException(Exception):
     pass
+
+
+class ImageFetchError(Exception):
+    pass
@@ -0,0 +1,281 @@
+import json
+import os
+import time
+
+from wspdriver.message import WhatsappMessage
+from wspdriver.wait import ElementCountAbove
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+COLUMNS = (
+    'chat', 'id', 'key', 'type', 'is_outbound', 'datetime', 'author_name',
+    'text', 'thumbnail', 'time'
+)
+
+
+class JSONLinesWriter(object):
+
+    def __init__(self, path, append=False):
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, records):
+
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter(object):
+
+    """Writes every batch as a row group. Parquet files can't be appended
+    to, so a resumed export needs a new file."""
+
+    def __init__(self, path, append=False):
+
+        if pyarrow is None:
+            raise ImportError('Exporting to Parquet requires pyarrow')
+        if append:
+            raise ValueError('Parquet files can not be appended to')
+        self.schema = pyarrow.schema([
+            (name, pyarrow.bool_() if name == 'is_outbound' else
+             pyarrow.string())
+            for name in COLUMNS
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+
+        if records:
+            self.writer.write_table(pyarrow.Table.from_pydict({
+                name: [record.get(name) for record in records]
+                for name in COLUMNS
+            }, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def is_parquet(path):
+    return os.path.splitext(path)[1] == '.parquet'
+
+
+def open_writer(path, append=False):
+
+    if is_parquet(path):
+        return ParquetWriter(path, append)
+    return JSONLinesWriter(path, append)
+
+
+def last_exported_id(path):
+
+    # Id of the last record of a JSONL export, reading only its end
+    with open(path, 'rb') as exported:
+        exported.seek(0, os.SEEK_END)
+        position = exported.tell()
+        tail = b''
+        while position > 0 and tail.count(b'\n') < 2:
+            step = min(4096, position)
+            position -= step
+            exported.seek(position)
+            tail = exported.read(step) + tail
+    lines = tail.strip().splitlines()
+    return json.loads(lines[-1].decode('utf-8'))['id'] if lines else None
+
+
+def resume_marker(path):
+
+    # (id, occurrence) of the last record of a JSONL export: identical
+    # messages sent in the same minute share an id, so the id alone doesn't
+    # tell which of them the export stopped at. None if there is nothing
+    # to resume.
+    if not os.path.exists(path):
+        return None
+    last_id = last_exported_id(path)
+    if last_id is None:
+        return None
+    with open(path, encoding='utf-8') as exported:
+        occurrence = sum(
+            1 for line in exported
+            if line.strip() and json.loads(line)['id'] == last_id
+        )
+    return last_id, occurrence
+
+
+class HistoryExport(object):
+
+    """Streams the open chat's history, newest message first.
+
+    Scrolls the pane up a page at a time and extracts, in one script call
+    per page, only the messages older than the ones already written, so
+    memory stays at one page however long the chat is. `resume` is the
+    (id, occurrence) of the last message a previous export wrote (see
+    `resume_marker`; a bare id means its first occurrence): everything down
+    to it is skipped. `until` is the id where the export stops, e.g. the
+    newest one of the previous archive.
+    """
+
+    # Scrolls the pane's scrollable ancestor to the top, so the app loads
+    # an older page, and returns how many messages there were before
+    SCROLL_UP_SCRIPT = '''
+        var element = document.querySelector(arguments[0]);
+        while (element && element.scrollHeight <= element.clientHeight) {
+            element = element.parentElement;
+        }
+        if (element) {
+            element.scrollTop = 0;
+        }
+        return document.querySelectorAll(arguments[1]).length;
+    '''
+
+    # Payloads of the messages older than the arguments[1] element (by key
+    # arguments[2] if it was re-rendered), oldest first, with the oldest
+    # element to pass back as the next boundary
+    PAGE_SCRIPT = '''
+        var extract = ''' + WhatsappMessage.DATA_JS + ''';
+        var messages = document.querySelectorAll(arguments[0]);
+        var boundary = arguments[1];
+        var boundaryKey = arguments[2];
+        var parts = arguments[3];
+        var end = messages.length;
+        if (boundary || boundaryKey) {
+            end = Array.prototype.indexOf.call(messages, boundary);
+            for (var i = messages.length - 1; end < 0 && i >= 0; i--) {
+                if (extract(messages[i], parts).key === boundaryKey) {
+                    end = i;
+                }
+            }
+            if (end < 0) {
+                end = messages.length;
+            }
+        }
+        var page = [];
+        for (var j = 0; j < end; j++) {
+            page.push(extract(messages[j], parts));
+        }
+        return {messages: page, oldest: end > 0 ? messages[0] : null};
+    '''
+
+    def __init__(
+            self,
+            whatsapp_driver,
+            writer,
+            resume=None,
+            until=None,
+            page_timeout=10
+    ):
+
+        self.whatsapp_driver = whatsapp_driver
+        self.writer = writer
+        if resume is not None and not isinstance(resume, tuple):
+            resume = (resume, 1)
+        self.resume = resume
+        self.until = until
+        self.page_timeout = page_timeout
+        self.chat = None
+        self.pages = 0
+        self.messages = 0
+        self.skipped = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def run(self, progress=None):
+
+        driver = self.whatsapp_driver
+        selectors = driver.selectors
+        self.started_at = time.perf_counter()
+        self.chat = driver.get_current_chat_title()
+        driver.ensure_scroll_to_chat_bottom()
+
+        skipping = self.resume is not None
+        if skipping:
+            resume_id, remaining = self.resume
+        boundary, boundary_key = None, None
+        while True:
+            page = driver.web_driver.execute_script(
+                self.PAGE_SCRIPT,
+                selectors.MESSAGES_SELECTOR,
+                boundary,
+                boundary_key,
+                selectors.message_parts()
+            )
+            if not page['messages']:
+                break
+            self.pages += 1
+            boundary = page['oldest']
+            boundary_key = page['messages'][0]['key']
+
+            records = []
+            done = False
+            for data in reversed(page['messages']):
+                message = WhatsappMessage.build_from_data(data, driver)
+                message_id = message.id
+                if message_id == self.until:
+                    done = True
+                    break
+                if skipping:
+                    self.skipped += 1
+                    if message_id == resume_id:
+                        remaining -= 1
+                        skipping = remaining > 0
+                    continue
+                record = message.to_dict()
+                record.update(chat=self.chat, id=message_id)
+                records.append(record)
+            self.writer.write(records)
+            self.messages += len(records)
+            if progress is not None:
+                progress(self)
+            if done or not self.load_older_page():
+                break
+
+        self.finished_at = time.perf_counter()
+        return self.summary()
+
+    def load_older_page(self):
+
+        driver = self.whatsapp_driver
+        selectors = driver.selectors
+        count = driver.web_driver.execute_script(
+            self.SCROLL_UP_SCRIPT,
+            selectors.CHAT_PANE_SELECTOR,
+            selectors.MESSAGES_SELECTOR
+        )
+        # Nothing loading within the timeout means the chat's beginning
+        return driver.waits.until(
+            ElementCountAbove(selectors.MESSAGES_SELECTOR, count),
+            'history page',
+            timeout=self.page_timeout,
+            required=False
+        )
+
+    @property
+    def seconds(self):
+
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def rate(self):
+
+        seconds = self.seconds
+        return self.messages / seconds if seconds else 0.0
+
+    def summary(self):
+
+        return {
+            'chat': self.chat,
+            'pages': self.pages,
+            'messages': self.messages,
+            'skipped': self.skipped,
+            'seconds': self.seconds,
+            'messages_per_second': self.rate,
+        }
@@ -0,0 +1,346 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+import types
+
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+
+class Hooks(object):
+
+    """Receives every instrumented call.
+
+    `scope` is 'driver', 'chat', 'message', 'webdriver' (one chromedriver
+    command) or 'wait'. Whatever `started` returns, e.g. a tracing span,
+    is handed back to `finished`; waits are only reported once finished.
+    """
+
+    def started(self, scope, name):
+        return None
+
+    def finished(self, scope, name, seconds, error, context):
+        pass
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+
+        # Upper bound of the bucket holding the quantile
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def to_dict(self):
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class Collector(Hooks):
+
+    """In-memory counts and latency histograms per scope and name."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def finished(self, scope, name, seconds, error, context):
+
+        with self.lock:
+            histogram = self.histograms.get((scope, name))
+            if histogram is None:
+                histogram = Histogram(self.buckets)
+                self.histograms[(scope, name)] = histogram
+            histogram.observe(seconds, error is not None)
+
+    def reset(self):
+
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self):
+
+        with self.lock:
+            return {
+                '{}.{}'.format(scope, name): histogram.to_dict()
+                for (scope, name), histogram in self.histograms.items()
+            }
+
+    def export(self, prefix='wspdriver'):
+
+        # Prometheus text exposition format
+        histograms = ['# TYPE {}_call_seconds histogram'.format(prefix)]
+        errors = ['# TYPE {}_call_errors_total counter'.format(prefix)]
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        with self.lock:
+            for (scope, name), histogram in sorted(self.histograms.items()):
+                labels = 'scope="{}",name="{}"'.format(
+                    scope, name.replace('\\', '\\\\').replace('"', '\\"')
+                )
+                cumulative = 0
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    histograms.append(
+                        '{}_call_seconds_bucket{{{},le="{}"}} {}'.format(
+                            prefix, labels, bound, cumulative
+                        )
+                    )
+                histograms.append('{}_call_seconds_sum{{{}}} {}'.format(
+                    prefix, labels, histogram.total
+                ))
+                histograms.append('{}_call_seconds_count{{{}}} {}'.format(
+                    prefix, labels, histogram.count
+                ))
+                errors.append('{}_call_errors_total{{{}}} {}'.format(
+                    prefix, labels, histogram.errors
+                ))
+        return '\n'.join(histograms + errors) + '\n'
+
+
+# The hooks of the instrumented call running on this thread, for the
+# classmethods instrument_class wraps: they have no driver to ask
+_active = threading.local()
+
+
+def timed(hooks, scope, name, function):
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+
+        context = hooks.started(scope, name)
+        error = None
+        outer = getattr(_active, 'hooks', None)
+        _active.hooks = hooks
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _active.hooks = outer
+            hooks.finished(
+                scope, name, time.perf_counter() - start, error, context
+            )
+
+    return wrapper
+
+
+def timed_generator(hooks, scope, name, function):
+
+    # Only time spent producing items counts, not the consumer's. Values
+    # and exceptions sent in are passed on, and so is the return value:
+    # step flows like search_steps depend on both.
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+
+        context = hooks.started(scope, name)
+        error = None
+        elapsed = 0.0
+        generator = function(*args, **kwargs)
+        resume, value = generator.send, None
+        try:
+            while True:
+                outer = getattr(_active, 'hooks', None)
+                _active.hooks = hooks
+                start = time.perf_counter()
+                try:
+                    item = resume(value)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    elapsed += time.perf_counter() - start
+                    _active.hooks = outer
+                try:
+                    value = yield item
+                    resume = generator.send
+                except GeneratorExit:
+                    raise
+                except BaseException as e:
+                    resume, value = generator.throw, e
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            generator.close()
+            hooks.finished(scope, name, elapsed, error, context)
+
+    return wrapper
+
+
+def public_methods(cls):
+
+    names = {}
+    for klass in reversed(cls.__mro__):
+        for name, member in vars(klass).items():
+            if not name.startswith('_') and \
+                    isinstance(member, types.FunctionType):
+                names[name] = member
+    return names
+
+
+def wrap(hooks, scope, name, function, generator):
+
+    if generator:
+        return timed_generator(hooks, scope, name, function)
+    return timed(hooks, scope, name, function)
+
+
+def instrument(obj, hooks, scope):
+
+    # Wraps the bound public methods of this one instance, so objects
+    # without hooks keep calling the plain methods
+    for name, function in public_methods(type(obj)).items():
+        setattr(obj, name, wrap(
+            hooks, scope, name, getattr(obj, name),
+            inspect.isgeneratorfunction(function)
+        ))
+    return obj
+
+
+def instrument_web_driver(web_driver, hooks):
+
+    # Every chromedriver command, including the ones made by elements,
+    # goes through the driver's `execute`
+    execute = web_driver.execute
+    if getattr(execute, 'hooks', None) is hooks:
+        return web_driver
+
+    @functools.wraps(execute)
+    def instrumented_execute(command, params=None):
+
+        context = hooks.started('webdriver', command)
+        error = None
+        start = time.perf_counter()
+        try:
+            return execute(command, params)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            hooks.finished(
+                'webdriver', command, time.perf_counter() - start, error,
+                context
+            )
+
+    instrumented_execute.hooks = hooks
+    web_driver.execute = instrumented_execute
+    return web_driver
+
+
+_instrumented_classes = set()
+_instrumented_lock = threading.Lock()
+
+
+def instrument_class(cls, scope):
+
+    """Wraps the public methods, properties, memoized fields and
+    classmethods of `cls` and its subclasses.
+
+    For classes whose instances can't hold wrapped methods (e.g. they use
+    `__slots__`). The hooks are looked up per call on `self.driver.hooks`,
+    so instances whose driver has none only pay that lookup; memoized
+    fields are timed only when first computed. Classmethods have no
+    driver, so they report to the hooks of the instrumented call they run
+    under, if any.
+    """
+
+    with _instrumented_lock:
+        classes = [cls]
+        while classes:
+            klass = classes.pop()
+            classes.extend(klass.__subclasses__())
+            if klass in _instrumented_classes:
+                continue
+            _instrumented_classes.add(klass)
+            for name, member in vars(klass).copy().items():
+                if name.startswith('_'):
+                    continue
+                if isinstance(member, types.FunctionType):
+                    setattr(klass, name, hooked_method(scope, name, member))
+                elif isinstance(member, property):
+                    setattr(klass, name, property(
+                        hooked_method(scope, name, member.fget),
+                        doc=member.__doc__
+                    ))
+                elif isinstance(member, classmethod):
+                    setattr(klass, name, classmethod(
+                        hooked_classmethod(scope, name, member.__func__)
+                    ))
+                elif hasattr(member, 'function') and hasattr(member, 'slot'):
+                    # A memoized field: the wrapped function only runs on
+                    # the first access
+                    member.function = hooked_method(
+                        scope, name, member.function
+                    )
+
+
+def hooked_method(scope, name, function):
+
+    generator = inspect.isgeneratorfunction(function)
+
+    @functools.wraps(function)
+    def method(self, *args, **kwargs):
+
+        hooks = getattr(self.driver, 'hooks', None)
+        if hooks is None:
+            return function(self, *args, **kwargs)
+        return wrap(hooks, scope, name, function, generator)(
+            self, *args, **kwargs
+        )
+
+    return method
+
+
+def hooked_classmethod(scope, name, function):
+
+    generator = inspect.isgeneratorfunction(function)
+
+    @functools.wraps(function)
+    def method(cls, *args, **kwargs):
+
+        hooks = getattr(_active, 'hooks', None)
+        if hooks is None:
+            return function(cls, *args, **kwargs)
+        return wrap(hooks, scope, name, function, generator)(
+            cls, *args, **kwargs
+        )
+
+    return method
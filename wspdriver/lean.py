@@ -0,0 +1,182 @@
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Chrome flags for many long running, unattended browsers on one box
+LEAN_ARGUMENTS = (
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-translate',
+    '--disable-dev-shm-usage',
+    '--disable-features=MediaRouter,TranslateUI,OptimizationHints',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--renderer-process-limit=1',
+)
+
+FONT_URLS = ('*.woff', '*.woff2', '*.ttf', '*.otf')
+# Profile pictures, only loaded while `get_user_data` reads the avatar
+AVATAR_URLS = ('*pps.whatsapp.net/*',)
+# Full size media the app downloads automatically; thumbnails are inline
+MEDIA_URLS = ('*mmg.whatsapp.net/*',)
+
+NO_ANIMATIONS_SCRIPT = '''
+    (function () {
+        var style = function () {
+            var element = document.createElement('style');
+            element.textContent = '*, *::before, *::after {' +
+                'animation: none !important; transition: none !important; }';
+            document.head.appendChild(element);
+        };
+        if (document.head) {
+            style();
+        } else {
+            document.addEventListener('DOMContentLoaded', style);
+        }
+    })();
+'''
+
+CDP_COMMAND = 'executeCdpCommand'
+
+
+def execute_cdp(web_driver, command, params=None):
+
+    # webdriver.Chrome has execute_cdp_cmd; an AttachedWebDriver is a plain
+    # Remote, so it registers chromedriver's DevTools endpoint itself
+    if hasattr(web_driver, 'execute_cdp_cmd'):
+        return web_driver.execute_cdp_cmd(command, params or {})
+    commands = web_driver.command_executor._commands
+    if CDP_COMMAND not in commands:
+        commands[CDP_COMMAND] = (
+            'POST', '/session/$sessionId/goog/cdp/execute'
+        )
+    return web_driver.execute(
+        CDP_COMMAND, {'cmd': command, 'params': params or {}}
+    )['value']
+
+
+class LeanProfile(object):
+
+    """Launch and page settings that trade unused features for memory.
+
+    Blocks fonts, automatic media downloads and profile pictures, turns off
+    animations and has the driver close the open chat, which unmounts its
+    messages, whenever more than `pane_limit` are rendered (checked at most
+    every `trim_interval` seconds).
+    """
+
+    def __init__(
+            self,
+            block_fonts=True,
+            block_media=True,
+            block_avatars=True,
+            animations=False,
+            pane_limit=200,
+            trim_interval=60
+    ):
+
+        self.blocked = []
+        if block_fonts:
+            self.blocked.extend(FONT_URLS)
+        if block_media:
+            self.blocked.extend(MEDIA_URLS)
+        if block_avatars:
+            self.blocked.extend(AVATAR_URLS)
+        self.animations = animations
+        self.pane_limit = pane_limit
+        self.trim_interval = trim_interval
+
+    def configure(self, options):
+
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        return options
+
+    def install(self, web_driver):
+
+        # Before the page loads, so nothing blocked is ever fetched
+        if self.blocked:
+            execute_cdp(web_driver, 'Network.enable')
+            self.block(web_driver, self.blocked)
+        if not self.animations:
+            execute_cdp(
+                web_driver,
+                'Page.addScriptToEvaluateOnNewDocument',
+                {'source': NO_ANIMATIONS_SCRIPT}
+            )
+            # An attached browser already has the page loaded
+            web_driver.execute_script(NO_ANIMATIONS_SCRIPT)
+
+    def block(self, web_driver, patterns):
+
+        execute_cdp(web_driver, 'Network.setBlockedURLs', {
+            'urls': list(patterns)
+        })
+
+    @contextmanager
+    def allowing(self, web_driver, patterns):
+
+        allowed = [pattern for pattern in self.blocked if pattern in patterns]
+        if not allowed:
+            yield
+            return
+
+        self.block(web_driver, [
+            pattern for pattern in self.blocked if pattern not in patterns
+        ])
+        try:
+            yield
+        finally:
+            self.block(web_driver, self.blocked)
+
+
+def browser_processes(web_driver):
+
+    """chromedriver and every Chrome process it launched."""
+
+    if psutil is None:
+        raise ImportError('Measuring the browser requires psutil')
+    service = getattr(web_driver, 'service', None)
+    if service is None or service.process is None:
+        raise ValueError('Only browsers launched by this process can be '
+                         'measured')
+    root = psutil.Process(service.process.pid)
+    return [root] + root.children(recursive=True)
+
+
+def resource_usage(web_driver):
+
+    # RSS counts pages shared between Chrome processes once per process,
+    # so the total is an upper bound
+    usage = {'processes': 0, 'rss': 0, 'cpu_seconds': 0.0}
+    for process in browser_processes(web_driver):
+        try:
+            with process.oneshot():
+                rss = process.memory_info().rss
+                cpu = process.cpu_times()
+        except psutil.NoSuchProcess:
+            continue
+        usage['processes'] += 1
+        usage['rss'] += rss
+        usage['cpu_seconds'] += cpu.user + cpu.system
+    usage['time'] = time.monotonic()
+    return usage
+
+
+def cpu_percent(before, after):
+
+    # Share of one core used between two `resource_usage` samples
+    elapsed = after['time'] - before['time']
+    if elapsed <= 0:
+        return 0.0
+    return (after['cpu_seconds'] - before['cpu_seconds']) / elapsed * 100
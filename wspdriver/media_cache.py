@@ -0,0 +1,131 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class MediaCache(object):
+
+    """Two-tier cache for downloaded media, keyed by a hash of the message id
+    or media URL.
+
+    The memory tier is an LRU holding at most `memory_budget` bytes. The
+    optional disk tier keeps one file per key under `directory` and evicts
+    the least recently used files beyond `disk_budget` bytes.
+    """
+
+    def __init__(
+            self,
+            memory_budget=32 * 1024 * 1024,
+            directory=None,
+            disk_budget=512 * 1024 * 1024
+    ):
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(
+                entry.stat().st_size for entry in os.scandir(directory)
+                if entry.is_file()
+            )
+
+    @staticmethod
+    def key_for(name):
+        return hashlib.sha1(name.encode()).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, name):
+
+        key = self.key_for(name)
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+            data = self.read_disk(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.put_memory(key, data)
+            return data
+
+    def put(self, name, data):
+
+        key = self.key_for(name)
+        with self.lock:
+            self.put_memory(key, data)
+            if self.directory is not None:
+                self.write_disk(key, data)
+
+    def put_memory(self, key, data):
+
+        if len(data) > self.memory_budget:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_size -= len(previous)
+        self.memory[key] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_budget:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def read_disk(self, key):
+
+        if self.directory is None:
+            return None
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as media_file:
+                data = media_file.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # Recently used
+        return data
+
+    def write_disk(self, key, data):
+
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        file_descriptor, tmp_path = tempfile.mkstemp(
+            dir=self.directory,
+            suffix='.tmp'
+        )
+        with os.fdopen(file_descriptor, 'wb') as media_file:
+            media_file.write(data)
+        os.replace(tmp_path, path)
+        self.disk_size += len(data)
+        if self.disk_size > self.disk_budget:
+            self.evict_disk()
+
+    def evict_disk(self):
+
+        entries = sorted(
+            (
+                entry for entry in os.scandir(self.directory)
+                if entry.is_file() and not entry.name.endswith('.tmp')
+            ),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self.disk_size <= self.disk_budget:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self.disk_size -= size
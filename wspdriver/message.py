@@ -2,35 +2,193 @@ import hashlib
 import re
 
 from datetime import datetime
-
-from bs4 import BeautifulSoup
+from html import unescape
+
+from wspdriver.record import MessageRecord, stable_id
+from wspdriver.selectors import DEFAULT_PROFILE
+
+
+class memoized(object):
+
+    """Read-only property computed on first access and stored in the
+    instance's `_<name>` slot."""
+
+    def __init__(self, function):
+        self.function = function
+        self.slot = '_' + function.__name__
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            value = self.function(instance)
+            setattr(instance, self.slot, value)
+            return value
+
+
+class ElementMessageData(object):
+
+    """Per-element stand-in for the DATA_JS payload. Each field costs its
+    WebDriver calls on first access only, so building a message from an
+    element takes a single round-trip for its classes."""
+
+    __slots__ = ('element', 'selectors', 'values')
+
+    def __init__(self, message_element, selectors=DEFAULT_PROFILE):
+        self.element = message_element
+        self.selectors = selectors
+        self.values = {'key': None}
+
+    def fetch(self, name):
+
+        element = self.element
+        selectors = self.selectors
+        if name == 'classes':
+            return element.get_attribute('class')
+        if name == 'metadata':
+            return element.find_element_by_css_selector(
+                selectors.BUBBLE_SELECTOR
+            ).get_attribute('data-pre-plain-text')
+        if name == 'html':
+            return element.find_element_by_css_selector(
+                selectors.BUBBLE_TEXT_SELECTOR
+            ).get_attribute('outerHTML')
+        if name == 'thumbnail':
+            return element.find_element_by_css_selector(
+                selectors.IMAGE_THUMB_SELECTOR
+            ).get_attribute('src')
+        if name == 'time':
+            return element.find_element_by_css_selector(
+                selectors.IMAGE_META_SELECTOR
+            ).text
+        if name == 'gif':
+            return element.find_element_by_css_selector(
+                selectors.GIF_THUMB_SELECTOR
+            )
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = self.fetch(name)
+        return self.values[name]
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
 
 
 class WhatsappMessage(object):
 
+    __slots__ = ('driver', 'data', 'key', 'is_outbound', 'chat')
+
+    # Page-side extractor: collects everything the message types need from a
+    # '.message' element, so a whole chat can be read in one round-trip. The
+    # key is a cheap hash of the raw fields, used as a per-chat cursor.
+    # `parts` are the selectors from SelectorProfile.message_parts().
+    DATA_JS = '''function (message, parts) {
+        var query = function (selector) {
+            return message.querySelector(selector);
+        };
+        var bubble = query(parts.bubble);
+        var text = query(parts.text);
+        var thumbnail = query(parts.thumbnail);
+        var time = query(parts.time);
+        var data = {
+            classes: message.getAttribute('class') || '',
+            metadata: bubble && bubble.getAttribute('data-pre-plain-text'),
+            html: text && text.outerHTML,
+            thumbnail: thumbnail && thumbnail.src,
+            time: time && time.innerText,
+            gif: query(parts.gif)
+        };
+        var raw = [
+            data.classes, data.metadata, data.html, data.thumbnail, data.time
+        ].join('|');
+        var hash = 5381;
+        for (var i = 0; i < raw.length; i++) {
+            hash = ((hash << 5) + hash + raw.charCodeAt(i)) | 0;
+        }
+        data.key = (hash >>> 0).toString(16) + ':' + raw.length;
+        return data;
+    }'''
+
+    # Payloads of the messages matching arguments[0] that come after the one
+    # whose key is arguments[1] (all of them when it is null or not found),
+    # at most the last arguments[3] when given. Walks backwards, so only the
+    # new tail of the chat is extracted.
+    DATA_SCRIPT = '''
+        var extract = ''' + DATA_JS + ''';
+        var messages = document.querySelectorAll(arguments[0]);
+        var cursor = arguments[1];
+        var parts = arguments[2];
+        var limit = arguments[3];
+        var result = [];
+        for (var i = messages.length - 1; i >= 0; i--) {
+            if (limit && result.length >= limit) {
+                break;
+            }
+            var data = extract(messages[i], parts);
+            if (cursor && data.key === cursor) {
+                break;
+            }
+            result.push(data);
+        }
+        return result.reverse();
+    '''
+
     @classmethod
     def build(cls, message_element, whatsapp_driver):
 
-        classes = message_element.get_attribute('class')
+        return cls.build_from_data(
+            cls.extract_data(message_element, whatsapp_driver.selectors),
+            whatsapp_driver
+        )
+
+    @classmethod
+    def build_from_data(cls, message_data, whatsapp_driver, chat=None):
+
+        classes = message_data['classes']
         if 'message-chat' in classes:
-            return WSPTextMessage(message_element, whatsapp_driver)
+            return WSPTextMessage(message_data, whatsapp_driver, chat)
 
         elif 'message-image' in classes:
-            return WSPImageMessage(message_element, whatsapp_driver)
+            return WSPImageMessage(message_data, whatsapp_driver, chat)
 
         elif 'message-gif' in classes:
-            return WSPGIFMessage(message_element, whatsapp_driver)
+            return WSPGIFMessage(message_data, whatsapp_driver, chat)
 
         elif 'message-system' in classes:
-            return WSPSystemMessage(message_element, whatsapp_driver)
+            return WSPSystemMessage(message_data, whatsapp_driver, chat)
 
         raise UnknownMessageTypeException(classes)
 
-    def __init__(self, message_element, whatsapp_driver):
+    @classmethod
+    def extract_data(cls, message_element, selectors=DEFAULT_PROFILE):
+
+        return ElementMessageData(message_element, selectors)
+
+    def __init__(self, message_data, whatsapp_driver, chat=None):
 
+        # Everything else is parsed from `data` on first access. `chat` is
+        # the title of the chat it was read from, when known.
         self.driver = whatsapp_driver
-        classes = message_element.get_attribute('class')
-        self.is_outbound = 'message-out' in classes
+        self.data = message_data
+        self.key = message_data.get('key')
+        self.is_outbound = 'message-out' in message_data['classes']
+        self.chat = chat
+
+    @property
+    def id(self):
+        # Types without parsed content fall back to the page-side key
+        return self.key
+
+    def to_dict(self):
+        return {'key': self.key, 'is_outbound': self.is_outbound}
 
     def is_system_message(self):
         return False
@@ -48,32 +206,77 @@ class UnknownMessageTypeException(Exception):
 
 class WSPTextMessage(WhatsappMessage):
 
+    __slots__ = ('_metadata', '_text', '_id')
+
     METADATA_REGEX = re.compile(r'\[(\d+):(\d+),\s(\d+)/(\d+)/(\d+)\]\s(.*):')
 
-    def __init__(self, message_element, driver):
+    @memoized
+    def metadata(self):
+        return self.parse_metadata(self.data['metadata'])
 
-        super(WSPTextMessage, self).__init__(message_element, driver)
-        bubble = message_element.find_element_by_css_selector('.bubble')
-        metadata = bubble.get_attribute('data-pre-plain-text')
-        self.datetime, self.author_name = self.parse_metadata(metadata)
+    @property
+    def datetime(self):
+        return self.metadata[0]
 
-        bubble_text = message_element.find_element_by_css_selector(
-            '.bubble .selectable-text'
-        )
-        self.text = self.transform_emojis_to_text(bubble_text)
+    @property
+    def author_name(self):
+        return self.metadata[1]
 
+    @memoized
+    def text(self):
+        return self.transform_emojis_to_text(self.data['html'])
+
+    @memoized
+    def id(self):
         to_hash = '{}{}{}'.format(
             self.datetime, self.author_name, self.text
         )
-        self.id = hashlib.md5(to_hash.encode()).hexdigest()
+        return hashlib.md5(to_hash.encode()).hexdigest()
 
-    def transform_emojis_to_text(self, bubble_element):
+    # outerHTML is serialized by the browser, so attributes are always
+    # double quoted and their text escaped: regular expressions are enough
+    # to swap emoji images for their text and drop the remaining tags.
+    TAG_REGEX = re.compile(r'<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+    EMOJI_TEXT_REGEX = re.compile(
+        r'^<img\b.*?\sdata-plain-text="([^"]*)"',
+        re.DOTALL
+    )
 
-        html = bubble_element.get_attribute('outerHTML')
-        dom = BeautifulSoup(html, 'html.parser')
-        for img in dom.find_all('img'):
-            img.replace_with(img['data-plain-text'])
-        return dom.text
+    @classmethod
+    def replace_tag(cls, match):
+        emoji = cls.EMOJI_TEXT_REGEX.match(match.group(0))
+        return emoji.group(1) if emoji else ''
+
+    @classmethod
+    def transform_emojis_to_text(cls, html):
+
+        return unescape(cls.TAG_REGEX.sub(cls.replace_tag, html))
+
+    def to_dict(self):
+        data = super(WSPTextMessage, self).to_dict()
+        data.update(
+            type='text',
+            id=self.id,
+            datetime=self.datetime.isoformat(),
+            author_name=self.author_name,
+            text=self.text
+        )
+        return data
+
+    def to_record(self, chat=None):
+
+        # `chat` defaults to the one the message was read from. The raw
+        # metadata already holds the datetime and author.
+        return MessageRecord(
+            stable_id(self.data['metadata'], self.text),
+            'text',
+            self.is_outbound,
+            self.datetime,
+            chat or self.chat,
+            self.key,
+            self.author_name,
+            self.text
+        )
 
     def __str__(self):
         return '[{}] {}: {}'.format(
@@ -97,24 +300,53 @@ class WSPTextMessage(WhatsappMessage):
 
 class WSPImageMessage(WhatsappMessage):
 
-    def __init__(self, message_element, driver):
-        super(WSPImageMessage, self).__init__(message_element, driver)
+    __slots__ = ('_id',)
 
-        self.thumbnail = message_element.find_element_by_css_selector(
-            '.bubble-image .image-thumb img'
-        ).get_attribute('src')
+    @property
+    def thumbnail(self):
+        return self.data['thumbnail']
 
-        self.time = message_element.find_element_by_css_selector(
-            '.bubble-image .bubble-image-meta'
-        ).text
+    @property
+    def time(self):
+        return self.data['time']
 
+    @memoized
+    def id(self):
         to_hash = '{}{}'.format(
             self.thumbnail, self.time
         )
-        self.id = hashlib.md5(to_hash.encode()).hexdigest()
+        return hashlib.md5(to_hash.encode()).hexdigest()
 
     def image(self):
-        return self.driver.get_image(self.thumbnail)
+        return self.driver.get_image(self.thumbnail, self.id)
+
+    def image_bytes(self):
+        return self.driver.get_image_bytes(self.thumbnail, self.id)
+
+    def save_image(self, filename):
+        self.driver.save_image(self.thumbnail, filename, self.id)
+
+    def to_dict(self):
+        data = super(WSPImageMessage, self).to_dict()
+        data.update(
+            type='image',
+            id=self.id,
+            thumbnail=self.thumbnail,
+            time=self.time
+        )
+        return data
+
+    def to_record(self, chat=None):
+
+        return MessageRecord(
+            stable_id(self.thumbnail, self.time),
+            'image',
+            self.is_outbound,
+            chat=chat or self.chat,
+            key=self.key,
+            thumbnail=self.thumbnail,
+            time=self.time
+        )
 
     def __str__(self):
         return '[{}] {}: {}'.format(
@@ -129,12 +361,22 @@ class WSPImageMessage(WhatsappMessage):
 
 class WSPGIFMessage(WhatsappMessage):
 
-    def __init__(self, message_element, driver):
-        super(WSPGIFMessage, self).__init__(message_element, driver)
+    __slots__ = ()
+
+    #TODO: GIF DATA
+    @property
+    def thumbnail(self):
+        return self.data['gif']
 
-        #TODO: GIF DATA
-        self.thumbnail = message_element.find_element_by_css_selector(
-            '.bubble-image .image-thumb-gif'
+    def to_dict(self):
+        data = super(WSPGIFMessage, self).to_dict()
+        data.update(type='gif')
+        return data
+
+    def to_record(self, chat=None):
+        return MessageRecord(
+            stable_id(self.key), 'gif', self.is_outbound,
+            chat=chat or self.chat, key=self.key
         )
 
     def is_gif(self):
@@ -143,8 +385,18 @@ class WSPGIFMessage(WhatsappMessage):
 
 class WSPSystemMessage(WhatsappMessage):
 
-    def __init__(self, message_element, driver):
-        super(WSPSystemMessage, self).__init__(message_element, driver)
+    __slots__ = ()
+
+    def to_dict(self):
+        data = super(WSPSystemMessage, self).to_dict()
+        data.update(type='system')
+        return data
+
+    def to_record(self, chat=None):
+        return MessageRecord(
+            stable_id(self.key), 'system', self.is_outbound,
+            chat=chat or self.chat, key=self.key
+        )
 
     def is_system_message(self):
         return True
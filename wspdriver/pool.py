@@ -0,0 +1,335 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from selenium.common.exceptions import WebDriverException
+
+from wspdriver.driver import WhatsappDriver
+
+
+class LatencyCounter(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+        }
+
+
+class AccountStats(object):
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.send_errors = 0
+        self.poll_errors = 0
+        self.restarts = 0
+        self.poll_latency = LatencyCounter()
+        self.send_latency = LatencyCounter()
+
+    def summary(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            'messages_received': self.messages_received,
+            'messages_sent': self.messages_sent,
+            'send_errors': self.send_errors,
+            'poll_errors': self.poll_errors,
+            'restarts': self.restarts,
+            'received_per_second': self.messages_received / elapsed,
+            'sent_per_second': self.messages_sent / elapsed,
+            'poll_latency': self.poll_latency.summary(),
+            'send_latency': self.send_latency.summary(),
+        }
+
+
+def session_alive(driver):
+
+    # Element and wait errors are WebDriverExceptions too; only a session
+    # that stopped answering means the browser is gone
+    try:
+        driver.web_driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+def run_worker(account, start_driver, start_args, commands, events,
+               poll_interval):
+
+    # Runs in the worker process: one browser per account. Sends are served
+    # between polls, and every result goes back through `events`.
+    try:
+        driver = start_driver(*start_args)
+    except Exception as e:
+        events.put(('died', account, (repr(e), None)))
+        return
+
+    request_id = None
+    try:
+        if not driver.is_logged_in():
+            events.put(('login_required', account, driver.get_log_in_code()))
+            driver.wait_for_login()
+        events.put(('started', account, None))
+
+        while True:
+            try:
+                command = commands.get(timeout=poll_interval)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                if command[0] == 'stop':
+                    return
+                _, request_id, phone_number, message = command
+                start = time.perf_counter()
+                try:
+                    driver.send_message(phone_number, message)
+                    error = None
+                except Exception as e:
+                    if isinstance(e, WebDriverException) and \
+                            not session_alive(driver):
+                        raise
+                    error = repr(e)
+                events.put(('sent', account, (
+                    request_id, error, time.perf_counter() - start
+                )))
+                request_id = None
+                continue
+
+            start = time.perf_counter()
+            # Records are plain tuples: cheap to pickle through the queue.
+            # Each carries the title of the chat it was read from.
+            try:
+                messages = [
+                    message.to_record()
+                    for message in driver.get_unread_messages()
+                ]
+            except WebDriverException as e:
+                if not session_alive(driver):
+                    raise
+                events.put(('poll_failed', account, repr(e)))
+                continue
+            events.put(('messages', account, (
+                messages, time.perf_counter() - start
+            )))
+    except WebDriverException as e:
+        events.put(('died', account, (repr(e), request_id)))
+    finally:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+
+class DriverPool(object):
+
+    """Runs one WhatsappDriver per account, each in its own process with its
+    own Chrome profile.
+
+    `accounts` maps an account name to its chrome_data_path. Sends are
+    routed by account and resolve futures, inbound messages from every
+    account are merged into `messages()`, and dead browsers are restarted.
+    A failed send or poll whose session still answers is only reported:
+    the send's future raises SendError and the poll counts in `poll_errors`.
+    """
+
+    def __init__(
+            self,
+            chrome_driver_path,
+            accounts,
+            headless=True,
+            poll_interval=1,
+            restart_delay=5,
+            start_driver=WhatsappDriver.start
+    ):
+        self.chrome_driver_path = chrome_driver_path
+        self.accounts = dict(accounts)
+        self.headless = headless
+        self.poll_interval = poll_interval
+        self.restart_delay = restart_delay
+        self.start_driver = start_driver
+
+        self.running = False
+        self.events = multiprocessing.Queue()
+        self.commands = {}
+        self.workers = {}
+        self.died_at = {}
+        self.stats = {account: AccountStats() for account in self.accounts}
+        self.inbox = queue.Queue()
+        self.login_codes = {}
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.pump_thread = None
+
+    def start(self):
+
+        self.running = True
+        for account in self.accounts:
+            self.commands[account] = multiprocessing.Queue()
+            self.spawn(account)
+        self.pump_thread = threading.Thread(target=self.pump, daemon=True)
+        self.pump_thread.start()
+
+    def spawn(self, account):
+
+        worker = multiprocessing.Process(
+            target=run_worker,
+            args=(
+                account,
+                self.start_driver,
+                (
+                    self.chrome_driver_path,
+                    self.accounts[account],
+                    self.headless
+                ),
+                self.commands[account],
+                self.events,
+                self.poll_interval
+            ),
+            daemon=True
+        )
+        worker.start()
+        self.workers[account] = worker
+        self.died_at.pop(account, None)
+
+    def stop(self, timeout=10):
+
+        self.running = False
+        for account, commands in self.commands.items():
+            commands.put(('stop',))
+        for worker in self.workers.values():
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        if self.pump_thread:
+            self.pump_thread.join(timeout)
+
+    def send_message(self, account, phone_number, message):
+
+        # The search box also finds chats by title, so a reply can go to
+        # the `chat` of a record from `messages()`
+        if account not in self.accounts:
+            raise UnknownAccountException(account)
+
+        future = Future()
+        with self.lock:
+            request_id = next(self.request_ids)
+            self.pending[request_id] = future
+        self.commands[account].put(
+            ('send', request_id, phone_number, message)
+        )
+        return future
+
+    def messages(self, timeout=None):
+
+        # Yields (account, MessageRecord) from every account; `record.chat`
+        # is the chat to reply to
+        while self.running:
+            try:
+                yield self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+    def pump(self):
+
+        while self.running:
+            try:
+                event = self.events.get(timeout=self.poll_interval)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                self.handle_event(*event)
+            self.supervise()
+
+    def handle_event(self, kind, account, payload):
+
+        stats = self.stats[account]
+        if kind == 'messages':
+            messages, latency = payload
+            stats.poll_latency.add(latency)
+            stats.messages_received += len(messages)
+            for message in messages:
+                self.inbox.put((account, message))
+
+        elif kind == 'sent':
+            request_id, error, latency = payload
+            stats.send_latency.add(latency)
+            if error is None:
+                stats.messages_sent += 1
+                self.resolve(request_id, result=True)
+            else:
+                stats.send_errors += 1
+                self.resolve(request_id, error=SendError(error))
+
+        elif kind == 'poll_failed':
+            stats.poll_errors += 1
+
+        elif kind == 'login_required':
+            self.login_codes[account] = payload
+
+        elif kind == 'started':
+            self.login_codes.pop(account, None)
+
+        elif kind == 'died':
+            error, request_id = payload
+            self.died_at[account] = time.time()
+            if request_id is not None:
+                stats.send_errors += 1
+                self.resolve(request_id, error=SendError(error))
+
+    def resolve(self, request_id, result=None, error=None):
+
+        with self.lock:
+            future = self.pending.pop(request_id, None)
+        if future is None:
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def supervise(self):
+
+        now = time.time()
+        for account, worker in list(self.workers.items()):
+            if not self.running or worker.is_alive():
+                continue
+            died_at = self.died_at.setdefault(account, now)
+            if now - died_at >= self.restart_delay:
+                self.stats[account].restarts += 1
+                self.spawn(account)
+
+    def summary(self):
+
+        return {
+            account: dict(
+                stats.summary(),
+                alive=self.workers[account].is_alive()
+                if account in self.workers else False
+            )
+            for account, stats in self.stats.items()
+        }
+
+
+class UnknownAccountException(Exception):
+    pass
+
+
+class SendError(Exception):
+    pass
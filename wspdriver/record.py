@@ -0,0 +1,121 @@
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+
+def stable_id(*fields):
+
+    # 64 bits from two checksums of the raw fields: the same across runs and
+    # processes (unlike hash()), and cheaper than formatting and md5
+    raw = '\x1f'.join(field or '' for field in fields).encode('utf-8')
+    return zlib.crc32(raw) << 32 | zlib.adler32(raw)
+
+
+EPOCH = datetime(1970, 1, 1)
+
+TYPES = ('text', 'image', 'gif', 'system')
+
+STRING_FIELDS = ('chat', 'key', 'author_name', 'text', 'thumbnail', 'time')
+
+
+class MessageRecord(namedtuple('MessageRecord', (
+        ('id', 'type', 'is_outbound', 'datetime') + STRING_FIELDS
+))):
+
+    """Immutable copy of a message's fields, with no driver or element
+    behind it: it pickles, hashes and can be cached or sent to another
+    process. `encode` packs it as a fixed header (id, type, flags, datetime
+    and string lengths) followed by the UTF-8 strings.
+    """
+
+    __slots__ = ()
+
+    # id, type, flags, seconds since EPOCH, then one length per string
+    # field, NONE for missing ones
+    HEADER = struct.Struct('<QBBq' + 'I' * len(STRING_FIELDS))
+    NONE = 0xFFFFFFFF
+    OUTBOUND = 1
+    HAS_DATETIME = 2
+
+    def __new__(cls, id, type, is_outbound=False, datetime=None, chat=None,
+                key=None, author_name=None, text=None, thumbnail=None,
+                time=None):
+
+        return tuple.__new__(cls, (
+            id, type, is_outbound, datetime, chat, key, author_name, text,
+            thumbnail, time
+        ))
+
+    def to_dict(self):
+
+        data = self._asdict()
+        if self.datetime is not None:
+            data['datetime'] = self.datetime.isoformat()
+        return dict(
+            (name, value) for name, value in data.items()
+            if value is not None
+        )
+
+    def encode(self):
+
+        message_id, message_type, is_outbound, sent = self[:4]
+        strings = [
+            value.encode('utf-8') if value is not None else None
+            for value in self[4:]
+        ]
+        flags = self.OUTBOUND if is_outbound else 0
+        seconds = 0
+        if sent is not None:
+            flags |= self.HAS_DATETIME
+            seconds = int((sent - EPOCH).total_seconds())
+        header = self.HEADER.pack(
+            message_id,
+            TYPES.index(message_type),
+            flags,
+            seconds,
+            *[len(value) if value is not None else self.NONE
+              for value in strings]
+        )
+        return header + b''.join(value for value in strings if value)
+
+    @classmethod
+    def decode_from(cls, data, offset=0):
+
+        # Returns the record at `offset` and the offset right after it
+        fields = cls.HEADER.unpack_from(data, offset)
+        message_id, type_index, flags, seconds = fields[:4]
+        offset += cls.HEADER.size
+        values = [
+            message_id,
+            TYPES[type_index],
+            bool(flags & cls.OUTBOUND),
+            EPOCH + timedelta(seconds=seconds)
+            if flags & cls.HAS_DATETIME else None
+        ]
+        for length in fields[4:]:
+            if length == cls.NONE:
+                values.append(None)
+            else:
+                end = offset + length
+                values.append(str(data[offset:end], 'utf-8'))
+                offset = end
+        return tuple.__new__(cls, values), offset
+
+    @classmethod
+    def decode(cls, data):
+        return cls.decode_from(data)[0]
+
+
+def encode_records(records):
+    return b''.join(record.encode() for record in records)
+
+
+def decode_records(data):
+
+    # Records packed back to back by encode_records
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        record, offset = MessageRecord.decode_from(view, offset)
+        yield record
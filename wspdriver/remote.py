@@ -0,0 +1,27 @@
+from selenium import webdriver
+
+
+class AttachedWebDriver(webdriver.Remote):
+
+    """A WebDriver for a session some other process already created.
+
+    Takes over a chromedriver session (e.g. one left behind by a previous
+    run, see `WhatsappDriver.session_address`) instead of asking
+    chromedriver to launch a new browser.
+    """
+
+    def __init__(self, command_executor, session_id, w3c=True):
+
+        self.attached_session_id = session_id
+        self.attached_w3c = w3c
+        super(AttachedWebDriver, self).__init__(
+            command_executor=command_executor,
+            desired_capabilities={}
+        )
+
+    def start_session(self, capabilities, browser_profile=None):
+
+        self.session_id = self.attached_session_id
+        self.capabilities = {}
+        self.w3c = self.attached_w3c
+        self.command_executor.w3c = self.attached_w3c
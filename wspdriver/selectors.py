@@ -0,0 +1,71 @@
+class SelectorProfile(object):
+
+    """The CSS selectors and XPaths the driver uses for one WhatsApp Web
+    build. Profiles are registered by version fingerprint, so a new build
+    only needs a profile with the selectors that changed."""
+
+    def __init__(self, **selectors):
+        self.__dict__.update(selectors)
+
+    def derive(self, **overrides):
+        return SelectorProfile(**dict(self.__dict__, **overrides))
+
+    def message_parts(self):
+        # Passed to the page-side extractor, see WhatsappMessage.DATA_JS
+        return {
+            'bubble': self.BUBBLE_SELECTOR,
+            'text': self.BUBBLE_TEXT_SELECTOR,
+            'thumbnail': self.IMAGE_THUMB_SELECTOR,
+            'time': self.IMAGE_META_SELECTOR,
+            'gif': self.GIF_THUMB_SELECTOR,
+        }
+
+
+DEFAULT_PROFILE = SelectorProfile(
+    APP_WRAPPER_SELECTOR='.app-wrapper-web',
+    APP_MAIN_SELECTOR='.app',
+    LOGO_SELECTOR='span[data-icon="logo"]',
+
+    SIDE_HEADER_IMG_CSS_SELECTOR='#side header img',
+    USER_NAME_XPATH="(//div[contains(@class, 'selectable-text')])[1]",
+    USER_AVATAR_XPATH="//div[@style='width: 200px; height: 200px; "
+                      "top: 0px; left: 0px; position: absolute;']/img",
+    USER_VIEW_PICTURE_BUTTON_XPATH='//html//li[1]/div',
+    USER_PHONE_XPATH="(//span[@dir='auto'])[1]",
+    CLOSE_IMAGE_VIEWER_CSS_SELECTOR='span[data-icon="x-viewer"]',
+    CLOSE_USER_PROFILE_XPATH="//span[@data-icon='back-light']/parent::*",
+
+    SIDE_PANE_SELECTOR='#side',
+    CHATLIST_TOP_SELECTOR='.chatlist-panel-body div:first-child',
+    CHATLIST_SEARCH_SELECTOR='#input-chatlist-search',
+    CHAT_SELECTOR='.chat',
+    CHAT_TITLE_SELECTOR='.chat-title',
+    CHAT_UNREAD_COUNT_SELECTOR='.unread-count',
+    CHAT_PREVIEW_SELECTOR='.last-msg',
+    CHAT_TIME_SELECTOR='.chat-meta .timestamp',
+    UNREAD_CHAT_SELECTOR='.chat.unread',
+    ACTIVE_CHAT_SELECTOR='.chat.active',
+    CHAT_HEADER_TITLE_SELECTOR='#main header .chat-title',
+
+    CHAT_PANE_SELECTOR='.pane-chat-msgs',
+    MESSAGES_SELECTOR='.pane-chat-msgs .message',
+    INCOMING_MESSAGES_SELECTOR='.incoming-msgs',
+    MESSAGE_INPUT_CLASS='pluggable-input',
+    SEND_BUTTON_SELECTOR='button.compose-btn-send',
+
+    BUBBLE_SELECTOR='.bubble',
+    BUBBLE_TEXT_SELECTOR='.bubble .selectable-text',
+    IMAGE_THUMB_SELECTOR='.bubble-image .image-thumb img',
+    IMAGE_META_SELECTOR='.bubble-image .bubble-image-meta',
+    GIF_THUMB_SELECTOR='.bubble-image .image-thumb-gif',
+)
+
+PROFILES = {}
+
+
+def register_profile(fingerprint, profile):
+    PROFILES[fingerprint] = profile
+
+
+def get_profile(fingerprint):
+    return PROFILES.get(fingerprint, DEFAULT_PROFILE)
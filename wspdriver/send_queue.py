@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst,
+            self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def take(self):
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self):
+        self.refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class SendQueue(object):
+
+    """Batches outbound messages per recipient on top of a WhatsappDriver.
+
+    Each recipient's conversation is opened once per flush (or not at all
+    if it is already active) and its messages are sent back to back, in
+    the order they were queued. Every recipient gets a token bucket of
+    `burst` messages refilled at `rate` per second; recipients that run
+    out are revisited after the others. `put` returns a Future for the
+    delivery result.
+
+    Each recipient's batch holds the driver's `ui_lock`, so the queue can
+    flush on its own thread (`start`) while the driver sweeps or exports.
+    """
+
+    def __init__(self, driver, rate=1.0, burst=5):
+
+        self.driver = driver
+        self.rate = rate
+        self.burst = burst
+        self.pending = OrderedDict()
+        self.buckets = {}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def put(self, phone_number, message):
+
+        future = Future()
+        with self.condition:
+            self.pending.setdefault(phone_number, []).append(
+                (message, future)
+            )
+            self.condition.notify()
+        return future
+
+    def __len__(self):
+        with self.condition:
+            return sum(len(messages) for messages in self.pending.values())
+
+    def bucket(self, phone_number):
+
+        if phone_number not in self.buckets:
+            self.buckets[phone_number] = TokenBucket(self.rate, self.burst)
+        return self.buckets[phone_number]
+
+    def flush(self):
+
+        while True:
+            with self.condition:
+                if not self.pending:
+                    return
+                ready = [
+                    phone_number for phone_number in self.pending
+                    if self.bucket(phone_number).wait_time() == 0
+                ]
+                if not ready:
+                    delay = min(
+                        self.bucket(phone_number).wait_time()
+                        for phone_number in self.pending
+                    )
+            if not ready:
+                time.sleep(delay)
+                continue
+
+            for phone_number in ready:
+                with self.condition:
+                    messages = self.pending.pop(phone_number)
+                leftover = self.send_batch(phone_number, messages)
+                if leftover:
+                    with self.condition:
+                        leftover.extend(self.pending.pop(phone_number, []))
+                        self.pending[phone_number] = leftover
+
+    def send_batch(self, phone_number, messages):
+
+        # Returns the messages left for later when the bucket runs dry
+        messages = [
+            (message, future) for message, future in messages
+            if not future.cancelled()
+        ]
+        if not messages:
+            return []
+
+        with self.driver.ui_lock:
+            try:
+                self.driver.ensure_conversation(phone_number)
+            except Exception as e:
+                for _, future in messages:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                return []
+
+            bucket = self.bucket(phone_number)
+            while messages and bucket.take():
+                message, future = messages.pop(0)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    self.driver.type_message(message)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(True)
+        return messages
+
+    def start(self):
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+
+        while self.running:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+            self.flush()
+
+    def stop(self):
+
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
@@ -0,0 +1,161 @@
+import time
+
+
+LOADING = 'loading'
+LOGGED_IN = 'logged_in'
+LOGGED_OUT = 'logged_out'
+
+
+class SessionState(object):
+
+    """Login state of the page, tracked by an observer inside it.
+
+    `state` is the last known value and costs nothing to read. `refresh`
+    asks the page with a single script call and `wait_for_change` blocks
+    in the page until the state differs from the known one, so waiting for
+    a login wakes as soon as the app renders instead of on the next poll.
+    """
+
+    # Installs the observer once per page load and returns the state
+    INSTALL_SCRIPT = '''
+        var mainSelector = arguments[0];
+        var logoSelector = arguments[1];
+        var session = window.wspdriverSession;
+        if (!session) {
+            session = window.wspdriverSession = {
+                state: null,
+                scheduled: false,
+                waiting: []
+            };
+            session.check = function () {
+                session.scheduled = false;
+                var state = document.querySelector(mainSelector) ?
+                    'logged_in' : document.querySelector(logoSelector) ?
+                    'logged_out' : 'loading';
+                if (state !== session.state) {
+                    session.state = state;
+                    var waiting = session.waiting;
+                    session.waiting = [];
+                    waiting.forEach(function (wake) { wake(state); });
+                }
+            };
+            // Chat traffic mutates the page constantly, so checks are
+            // batched instead of run per mutation
+            new MutationObserver(function () {
+                if (!session.scheduled) {
+                    session.scheduled = true;
+                    setTimeout(session.check, 50);
+                }
+            }).observe(document.documentElement, {
+                childList: true,
+                subtree: true
+            });
+        }
+        session.check();
+        return session.state;
+    '''
+
+    # Resolves with the state once it differs from arguments[0], with the
+    # unchanged state after arguments[1] ms, or with null if the observer
+    # is gone (the page was reloaded)
+    WAIT_SCRIPT = '''
+        var known = arguments[0];
+        var timeout = arguments[1];
+        var callback = arguments[arguments.length - 1];
+        var session = window.wspdriverSession;
+        if (!session) {
+            callback(null);
+            return;
+        }
+        session.check();
+        if (session.state !== known) {
+            callback(session.state);
+            return;
+        }
+        var timer;
+        var wake = function (state) {
+            clearTimeout(timer);
+            callback(state);
+        };
+        session.waiting.push(wake);
+        timer = setTimeout(function () {
+            var index = session.waiting.indexOf(wake);
+            if (index >= 0) {
+                session.waiting.splice(index, 1);
+            }
+            callback(session.state);
+        }, timeout);
+    '''
+
+    # Longest single wait in the page, well under the script timeout
+    WAIT_CHUNK = 10
+
+    def __init__(self, whatsapp_driver, max_age=5):
+
+        self.whatsapp_driver = whatsapp_driver
+        self.max_age = max_age
+        self.state = None
+        self.checked_at = None
+        self.listeners = []
+
+    def subscribe(self, callback):
+
+        # Called with (previous, state) on every change seen by the driver
+        self.listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+
+        self.listeners.remove(callback)
+
+    def update(self, state):
+
+        previous = self.state
+        self.state = state
+        self.checked_at = time.monotonic()
+        if state != previous:
+            for listener in list(self.listeners):
+                listener(previous, state)
+        return state
+
+    def refresh(self):
+
+        selectors = self.whatsapp_driver.selectors
+        return self.update(self.whatsapp_driver.web_driver.execute_script(
+            self.INSTALL_SCRIPT,
+            selectors.APP_MAIN_SELECTOR,
+            selectors.LOGO_SELECTOR
+        ))
+
+    def wait_for_change(self, timeout):
+
+        state = self.whatsapp_driver.web_driver.execute_async_script(
+            self.WAIT_SCRIPT,
+            self.state,
+            int(timeout * 1000)
+        )
+        if state is None:
+            return self.refresh()
+        return self.update(state)
+
+    def current(self):
+
+        # The cached state, asking the page again once it is `max_age`
+        # seconds old or still loading
+        if self.state in (None, LOADING) or \
+                time.monotonic() - self.checked_at > self.max_age:
+            return self.refresh()
+        return self.state
+
+    def wait_for(self, states, timeout=None):
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        state = self.refresh()
+        while state not in states and self.whatsapp_driver.running:
+            remaining = self.WAIT_CHUNK
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.monotonic())
+                if remaining <= 0:
+                    break
+            state = self.wait_for_change(remaining)
+        return state
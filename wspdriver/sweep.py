@@ -0,0 +1,299 @@
+import time
+
+from selenium.common.exceptions import StaleElementReferenceException
+
+from wspdriver.chat import WrongConversationError
+from wspdriver.message import WhatsappMessage
+
+
+class UnreadSweep(object):
+
+    """One pass over every unread chat found by a single chat list query.
+
+    Chats are visited in `order`: 'most' unread first, 'oldest' (lowest in
+    the list) first, or in 'list' order. With `tail`, only the last
+    unread-count messages of a chat without a cursor are extracted, instead
+    of everything rendered in it. Iterating yields the new messages and
+    keeps count, so `rate` is the messages per second drained so far.
+    """
+
+    ORDERS = {
+        'most': lambda entry: (-entry.unread, entry.position),
+        'oldest': lambda entry: -entry.position,
+        'list': lambda entry: entry.position,
+    }
+
+    def __init__(self, whatsapp_driver, order='most', tail=True):
+
+        if order not in self.ORDERS:
+            raise ValueError('Unknown sweep order: {}'.format(order))
+        self.whatsapp_driver = whatsapp_driver
+        self.order = order
+        self.tail = tail
+        self.chats = 0
+        self.messages = 0
+        self.unread = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def __iter__(self):
+
+        driver = self.whatsapp_driver
+        self.started_at = time.perf_counter()
+        entries = sorted(
+            driver.unread_chat_entries(),
+            key=self.ORDERS[self.order]
+        )
+        self.unread = sum(entry.unread for entry in entries)
+
+        for entry in entries:
+            yield from self.read(entry)
+        self.finished_at = time.perf_counter()
+
+    def read(self, entry):
+
+        # Read under the driver's lock and in full before yielding, so a
+        # send can't switch chats in the middle
+        driver = self.whatsapp_driver
+        with driver.ui_lock:
+            try:
+                chat = self.select(entry)
+            except WrongConversationError:
+                # It didn't open; still unread, it is left for the next
+                # sweep
+                return
+            if chat is None:
+                return
+            driver.ensure_scroll_to_chat_bottom()
+            messages = list(driver.extract_messages(
+                chat=chat.name,
+                limit=self.limit(entry)
+            ))
+        yield from self.deliver(entry, messages)
+
+    def limit(self, entry):
+
+        # A cursor already bounds the read exactly; the unread count is for
+        # chats not read since the driver started
+        tail = self.tail and entry.title not in \
+            self.whatsapp_driver.chat_cursors
+        return entry.unread if tail else None
+
+    def deliver(self, entry, messages):
+
+        driver = self.whatsapp_driver
+        for message in driver.ensure_no_duplicates(messages, entry.title):
+            self.messages += 1
+            yield message
+        self.chats += 1
+
+    def select(self, entry):
+
+        index = self.whatsapp_driver.chat_index
+        try:
+            chat = index.chat(entry)
+            chat.select()
+            return chat
+        except StaleElementReferenceException:
+            # The list re-rendered the chat since the snapshot
+            index.refresh()
+            entry = index.entries.get(entry.key)
+            if entry is None:
+                return None
+            chat = index.chat(entry)
+            chat.select()
+            return chat
+
+    @property
+    def seconds(self):
+
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def rate(self):
+
+        seconds = self.seconds
+        return self.messages / seconds if seconds else 0.0
+
+    def summary(self):
+
+        return {
+            'chats': self.chats,
+            'unread': self.unread,
+            'messages': self.messages,
+            'seconds': self.seconds,
+            'messages_per_second': self.rate,
+        }
+
+
+class BatchedSweep(UnreadSweep):
+
+    """An UnreadSweep that reads up to `batch` chats per round-trip.
+
+    WhatsApp Web serves one conversation view per session (opening it in a
+    second tab takes the session over), so chats can't be read side by
+    side. What a sweep can avoid is the WebDriver round-trips around each
+    chat: here the page itself opens every chat of a batch in turn, waits
+    for it to render and extracts its new messages. Batches are filled in
+    sweep order until `batch` chats or `batch_messages` unread ones; a chat
+    the page couldn't open is read the one round-trip at a time way.
+    """
+
+    # Resolves to one {title, messages} or {title, error} per job, in order.
+    # arguments[1] is [{element, title, cursor, limit}], arguments[2] the
+    # milliseconds each chat gets to open.
+    READ_SCRIPT = '''
+        var s = arguments[0];
+        var jobs = arguments[1];
+        var timeout = arguments[2];
+        var done = arguments[arguments.length - 1];
+        var extract = ''' + WhatsappMessage.DATA_JS + ''';
+        var results = [];
+        var click = function (element) {
+            ['mousedown', 'mouseup', 'click'].forEach(function (type) {
+                element.dispatchEvent(new MouseEvent(type, {
+                    bubbles: true,
+                    cancelable: true,
+                    view: window
+                }));
+            });
+        };
+        var headerTitle = function () {
+            var title = document.querySelector(s.header);
+            return title ? title.innerText : null;
+        };
+        var read = function (job) {
+            var messages = document.querySelectorAll(s.messages);
+            var result = [];
+            for (var i = messages.length - 1; i >= 0; i--) {
+                if (job.limit && result.length >= job.limit) {
+                    break;
+                }
+                var data = extract(messages[i], s.parts);
+                if (job.cursor && data.key === job.cursor) {
+                    break;
+                }
+                result.push(data);
+            }
+            return result.reverse();
+        };
+        var next = function (index) {
+            if (index >= jobs.length) {
+                done(results);
+                return;
+            }
+            var job = jobs[index];
+            if (!document.contains(job.element)) {
+                results.push({title: job.title, error: 'stale'});
+                next(index + 1);
+                return;
+            }
+            job.element.scrollIntoView();
+            click(job.element);
+            var started = Date.now();
+            var count = -1;
+            var poll = function () {
+                var opened = headerTitle() === job.title;
+                var current = document.querySelectorAll(s.messages).length;
+                var incoming = opened && document.querySelector(s.incoming);
+                if (incoming) {
+                    click(incoming);
+                    count = -1;
+                } else if (opened && current === count) {
+                    // Open, and nothing rendered since the previous poll
+                    results.push({title: job.title, messages: read(job)});
+                    next(index + 1);
+                    return;
+                } else {
+                    count = opened ? current : -1;
+                }
+                if (Date.now() - started > timeout) {
+                    results.push({title: job.title, error: 'timeout'});
+                    next(index + 1);
+                    return;
+                }
+                setTimeout(poll, 50);
+            };
+            poll();
+        };
+        next(0);
+    '''
+
+    def __init__(self, whatsapp_driver, order='most', tail=True, batch=8,
+                 batch_messages=500):
+
+        super(BatchedSweep, self).__init__(whatsapp_driver, order, tail)
+        # The whole batch has to fit in the driver's script timeout
+        self.chat_timeout = whatsapp_driver.waits.timeout
+        self.batch = max(1, min(
+            batch,
+            int(whatsapp_driver.SCRIPT_TIMEOUT // self.chat_timeout) - 1
+        ))
+        self.batch_messages = batch_messages
+        self.batches = 0
+
+    def schedule(self, entries):
+
+        batch, messages = [], 0
+        for entry in entries:
+            if batch and (len(batch) >= self.batch or
+                          messages + entry.unread > self.batch_messages):
+                yield batch
+                batch, messages = [], 0
+            batch.append(entry)
+            messages += entry.unread
+        if batch:
+            yield batch
+
+    def __iter__(self):
+
+        driver = self.whatsapp_driver
+        selectors = driver.selectors
+        script_selectors = {
+            'header': selectors.CHAT_HEADER_TITLE_SELECTOR,
+            'messages': selectors.MESSAGES_SELECTOR,
+            'incoming': selectors.INCOMING_MESSAGES_SELECTOR,
+            'parts': selectors.message_parts(),
+        }
+        self.started_at = time.perf_counter()
+        entries = sorted(
+            driver.unread_chat_entries(),
+            key=self.ORDERS[self.order]
+        )
+        self.unread = sum(entry.unread for entry in entries)
+
+        for batch in self.schedule(entries):
+            with driver.ui_lock:
+                driver.active_conversation = None
+                results = driver.web_driver.execute_async_script(
+                    self.READ_SCRIPT,
+                    script_selectors,
+                    [{
+                        'element': entry.element,
+                        'title': entry.title,
+                        'cursor': driver.chat_cursors.get(entry.title),
+                        'limit': self.limit(entry),
+                    } for entry in batch],
+                    int(self.chat_timeout * 1000)
+                )
+            self.batches += 1
+            for entry, result in zip(batch, results):
+                if 'error' in result:
+                    yield from self.read(entry)
+                    continue
+                messages = [
+                    WhatsappMessage.build_from_data(data, driver, entry.title)
+                    for data in result['messages']
+                ]
+                if messages:
+                    driver.chat_cursors[entry.title] = messages[-1].key
+                yield from self.deliver(entry, messages)
+        self.finished_at = time.perf_counter()
+
+    def summary(self):
+
+        summary = super(BatchedSweep, self).summary()
+        summary['batches'] = self.batches
+        return summary
@@ -1,10 +1,11 @@
 class User(object):
 
-    def __init__(self, phone_number, name, avatar):
+    def __init__(self, phone_number, name, avatar, avatar_bytes=None):
 
         self.phone_number = phone_number
         self.name = name
         self.avatar = avatar
+        self.avatar_bytes = avatar_bytes
 
     def save_avatar(self, filename):
 
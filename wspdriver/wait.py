@@ -0,0 +1,155 @@
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+class Settled(object):
+
+    """Met once a page-side probe returns the same value on two consecutive
+    polls, e.g. a scroll offset or a list of titles that stopped changing."""
+
+    def __init__(self, script, *args):
+        self.script = script
+        self.args = args
+        self.last_value = self
+
+    def __call__(self, web_driver):
+        value = web_driver.execute_script(self.script, *self.args)
+        settled = value is not None and value == self.last_value
+        self.last_value = value
+        return settled
+
+
+class AnimationsFinished(Settled):
+
+    # Two consecutive idle polls, so a transition triggered by the previous
+    # click has had a frame to start
+    SCRIPT = '''
+        if (!document.getAnimations) {
+            return true;
+        }
+        return document.getAnimations().every(function (animation) {
+            return animation.playState !== 'running';
+        });
+    '''
+
+    def __init__(self):
+        super(AnimationsFinished, self).__init__(self.SCRIPT)
+
+    def __call__(self, web_driver):
+        return super(AnimationsFinished, self).__call__(web_driver) and \
+            self.last_value
+
+
+class ScrollSettled(Settled):
+
+    # Scroll offset of the closest scrollable ancestor of the element
+    SCRIPT = '''
+        var element = arguments[0];
+        if (typeof element === 'string') {
+            element = document.querySelector(element);
+        }
+        while (element && element.scrollHeight <= element.clientHeight) {
+            element = element.parentElement;
+        }
+        return element ? element.scrollTop : 0;
+    '''
+
+    def __init__(self, element_or_selector):
+        super(ScrollSettled, self).__init__(self.SCRIPT, element_or_selector)
+
+
+class ChatHeaderMatches(object):
+
+    SCRIPT = '''
+        var title = document.querySelector(arguments[0]);
+        return title ? title.innerText : null;
+    '''
+
+    def __init__(self, title, header_selector, exact=False):
+        self.title = title
+        self.header_selector = header_selector
+        self.exact = exact
+
+    def __call__(self, web_driver):
+        header = web_driver.execute_script(self.SCRIPT, self.header_selector)
+        if header is None:
+            return False
+        if self.exact:
+            return header.strip() == self.title.strip()
+        return self.title in header
+
+
+class ElementCountAbove(object):
+
+    SCRIPT = 'return document.querySelectorAll(arguments[0]).length;'
+
+    def __init__(self, selector, count):
+        self.selector = selector
+        self.count = count
+
+    def __call__(self, web_driver):
+        return web_driver.execute_script(self.SCRIPT, self.selector) > \
+            self.count
+
+
+class WaitStrategy(object):
+
+    """Condition based waits with a fallback timeout.
+
+    Every wait is timed under its name in `timings` (and reported to
+    `hooks`), so slow animations or missing conditions show up instead of
+    hiding behind fixed sleeps.
+    """
+
+    def __init__(
+            self,
+            web_driver,
+            timeout=2,
+            poll_frequency=0.05,
+            hooks=None
+    ):
+
+        self.web_driver = web_driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.hooks = hooks
+        self.timings = {}
+
+    def until(self, condition, name, timeout=None, required=True):
+
+        start = time.perf_counter()
+        try:
+            return WebDriverWait(
+                self.web_driver,
+                self.timeout if timeout is None else timeout,
+                poll_frequency=self.poll_frequency
+            ).until(condition)
+        except TimeoutException:
+            if required:
+                raise
+            return False
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def settle(self, condition, name, timeout=None):
+
+        return self.until(condition, name, timeout=timeout, required=False)
+
+    def record(self, name, seconds):
+
+        self.timings.setdefault(name, []).append(seconds)
+        if self.hooks is not None:
+            self.hooks.finished('wait', name, seconds, None, None)
+
+    def summary(self):
+
+        return {
+            name: {
+                'count': len(seconds),
+                'total': sum(seconds),
+                'max': max(seconds),
+            }
+            for name, seconds in self.timings.items()
+        }